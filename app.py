@@ -1,16 +1,26 @@
 #!/usr/bin/env python3.11
 
+import json
 import os
 from aws_cdk import (
     aws_s3 as s3,
     aws_lambda as _lambda,
     aws_s3_notifications as s3_notif,
     aws_iam as iam,
+    aws_sns as sns,
+    aws_sqs as sqs,
 )
 import aws_cdk as cdk
 from constructs import Construct
 import boto3
 
+from pipeline import bundles
+
+# Overridable per function, see function_settings. More memory also means more CPU,
+# which shortens cold starts; arm64 costs less per GB-second than x86_64
+DEFAULT_FUNCTION_SETTINGS = {"memory_size": 512, "architecture": "arm64", "provisioned_concurrency": 0}
+ARCHITECTURES = {"arm64": _lambda.Architecture.ARM_64, "x86_64": _lambda.Architecture.X86_64}
+
 
 class TeluguToEnglishTranscriptionStack(cdk.Stack):
     def __init__(self, scope: Construct, id: str, **kwargs) -> None:
@@ -18,6 +28,8 @@ class TeluguToEnglishTranscriptionStack(cdk.Stack):
 
         # S1. Create an S3 bucket to store the audio file
         audio_bucket = s3.Bucket(self, "transcribeBucket")
+        # Published next to the function names so the driver finds the bucket without listing buckets
+        self.create_output_parameter("myapplication", "AudioBucketName", audio_bucket.bucket_name)
 
         transcribe_role = iam.Role(
             self,
@@ -35,12 +47,9 @@ class TeluguToEnglishTranscriptionStack(cdk.Stack):
          b. With 'lambda' directory create a file called 'transcribe_audio.py'
          c. In 'transcription_lambda.py' use boto3 to AWS transcribe
         """
-        transcription_lambda = _lambda.Function(
-            self,
+        transcription_lambda = self.create_function(
             "TranscriptionLambda",
-            runtime=_lambda.Runtime.PYTHON_3_8,
-            handler="transcribe_audio.handler",
-            code=_lambda.Code.from_asset("lambda"),
+            handler="handler",
             environment={
                 "AUDIO_BUCKET_NAME": audio_bucket.bucket_name,
                 "LANGUAGE_CODE": "te-IN",  # Telugu language code
@@ -48,8 +57,6 @@ class TeluguToEnglishTranscriptionStack(cdk.Stack):
                 "TRANSCRIBE_ROLE_ARN": transcribe_role.role_arn
             }
         )
-        function_id = "TranscriptionLambda"
-        self.create_parameter("myapplication", function_id, transcription_lambda.function_name)
 
         audio_bucket.grant_read(transcribe_role)
         audio_bucket.grant_read_write(transcription_lambda.role)
@@ -72,20 +79,27 @@ class TeluguToEnglishTranscriptionStack(cdk.Stack):
         # Grant the Lambda function permission to access the S3 bucket
         audio_bucket.grant_read(transcription_lambda)
 
-        translate_lambda = _lambda.Function(
-            self,
+        translate_lambda = self.create_function(
             "TranslateLambda",
-            runtime=_lambda.Runtime.PYTHON_3_8,
-            handler="translate_text.handler",
-            code=_lambda.Code.from_asset("lambda"),
+            handler="handler",
+            # Batches are translated in parallel, but long speeches still need more than the default 3s
+            timeout=cdk.Duration.minutes(5),
             environment={
                 "AUDIO_BUCKET_NAME": audio_bucket.bucket_name,
                 "LANGUAGE_CODE": "te-IN",  # Telugu language code
-                "TARGET_LANGUAGE_CODE": "en-US"  # English language code
+                "TARGET_LANGUAGE_CODE": "en-US",  # English language code
+                "TRANSLATE_CONCURRENCY": "8",  # parallel TranslateText requests per invocation
+                # Reuse the translation of a sentence whose trigrams are 90% the same
+                "TRANSLATION_MEMORY_THRESHOLD": "0.9",
             }
         )
-        function_id = "TranslateLambda"
-        self.create_parameter("myapplication", function_id, translate_lambda.function_name)
+
+        # Translations are cached (and mirrored) under cache/ in the audio bucket,
+        # the translation memory under translation-memory/
+        audio_bucket.grant_read_write(translate_lambda)
+        translate_lambda.add_to_role_policy(iam.PolicyStatement(
+            actions=["translate:TranslateText"],
+            resources=["*"]))
 
         # Set up an S3 event trigger for the Lambda function
         audio_bucket.add_event_notification(
@@ -100,24 +114,32 @@ class TeluguToEnglishTranscriptionStack(cdk.Stack):
          b. With 'lambda' directory create a file called 'synthesize_speech.py'
          c. In 'synthesize_speech.py' use boto3 to AWS polly
         """
-        SynthesizeLambda = _lambda.Function(
-            self,
+        # Polly notifies this topic when a speech synthesis task (text too long for
+        # one SynthesizeSpeech request) has written its audio or failed
+        synthesis_topic = sns.Topic(self, "SynthesisTopic")
+        SynthesizeLambda = self.create_function(
             "SynthesizeLambda",
-            runtime=_lambda.Runtime.PYTHON_3_8,
-            handler="synthesize_speech.synthesize_speech",
-            code=_lambda.Code.from_asset("lambda"),
+            handler="synthesize_speech",
+            # Audio is streamed to S3 as Polly produces it; long text only starts a task
+            timeout=cdk.Duration.minutes(1),
             environment={
                 "AUDIO_BUCKET_NAME": audio_bucket.bucket_name,
                 "LANGUAGE_CODE": "te-IN",  # Telugu language code
-                "TARGET_LANGUAGE_CODE": "en-US"  # English language code
+                "TARGET_LANGUAGE_CODE": "en-US",  # English language code
+                "SYNTHESIS_TOPIC_ARN": synthesis_topic.topic_arn,
             }
         )
-        function_id = "SynthesizeLambda"
-        self.create_parameter("myapplication", function_id, SynthesizeLambda.function_name)
 
 
         # Grant the Lambda function permission to access the S3 bucket
-        audio_bucket.grant_read(SynthesizeLambda)
+        # (read/write: speech is written under speech/, by the function or by Polly
+        # with the function's permissions)
+        audio_bucket.grant_read_write(SynthesizeLambda)
+        SynthesizeLambda.add_to_role_policy(iam.PolicyStatement(
+            actions=["polly:SynthesizeSpeech", "polly:StartSpeechSynthesisTask", "polly:GetSpeechSynthesisTask"],
+            resources=["*"]))
+        synthesis_topic.grant_publish(SynthesizeLambda)
+        self.create_output_parameter("myapplication", "SynthesisTopicArn", synthesis_topic.topic_arn)
 
         # Set up an S3 event trigger for the Lambda function
         audio_bucket.add_event_notification(
@@ -126,18 +148,92 @@ class TeluguToEnglishTranscriptionStack(cdk.Stack):
             s3.NotificationKeyFilter(prefix="audio/")
         )
 
+        # S4. Work queue for the worker fleet (pipeline/workers.py): videos uploaded
+        # to incoming/ arrive as S3 notifications, workers enqueue their next stages.
+        # The visibility timeout matches the longest stage; a message received
+        # 5 times without being deleted moves to the dead letter queue.
+        dead_letter_queue = sqs.Queue(
+            self,
+            "WorkDeadLetterQueue",
+            retention_period=cdk.Duration.days(14),
+        )
+        work_queue = sqs.Queue(
+            self,
+            "WorkQueue",
+            visibility_timeout=cdk.Duration.minutes(15),
+            dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=5, queue=dead_letter_queue),
+        )
+        audio_bucket.add_event_notification(
+            s3.EventType.OBJECT_CREATED,
+            s3_notif.SqsDestination(work_queue),
+            s3.NotificationKeyFilter(prefix="incoming/")
+        )
+        self.create_output_parameter("myapplication", "WorkQueueUrl", work_queue.queue_url)
+
+        # S5. Transcribe writes transcripts/<job name>.json when a job completes; the
+        # notifications wake the drivers' TranscriptionWaiter before its next poll.
+        # Every waiting process reads this queue and hands back what is not its own,
+        # so nothing is dead-lettered and notifications expire after an hour.
+        transcript_queue = sqs.Queue(
+            self,
+            "TranscriptQueue",
+            visibility_timeout=cdk.Duration.seconds(30),
+            retention_period=cdk.Duration.hours(1),
+        )
+        audio_bucket.add_event_notification(
+            s3.EventType.OBJECT_CREATED,
+            s3_notif.SqsDestination(transcript_queue),
+            s3.NotificationKeyFilter(prefix="transcripts/", suffix=".json")
+        )
+        self.create_output_parameter("myapplication", "TranscriptQueueUrl", transcript_queue.queue_url)
+
+    def function_settings(self, function_id):
+        # cdk.json "lambdaFunctions": "default" applies to every function, a function id
+        # overrides it; -c lambdaFunctions='{"TranslateLambda": {"memory_size": 1024}}' works too
+        settings = self.node.try_get_context("lambdaFunctions") or {}
+        if isinstance(settings, str):
+            settings = json.loads(settings)
+        return dict(DEFAULT_FUNCTION_SETTINGS, **settings.get("default", {}), **settings.get(function_id, {}))
+
+    def create_function(self, function_id, handler, environment, timeout=None):
+        # Each function gets its own asset: the handler module and the lambda/ modules it imports
+        module = bundles.FUNCTIONS[function_id]
+        settings = self.function_settings(function_id)
+        function = _lambda.Function(
+            self,
+            function_id,
+            # The driver's Python; 3.8 is past end of life on Lambda
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler=f"{module}.{handler}",
+            code=_lambda.Code.from_asset("lambda", exclude=bundles.excludes(module)),
+            architecture=ARCHITECTURES[settings["architecture"]],
+            memory_size=settings["memory_size"],
+            timeout=timeout,
+            environment=environment,
+        )
+        # Provisioned concurrency belongs to a version; the driver invokes the alias then,
+        # since unqualified invocations of $LATEST never use the initialized environments
+        target = function
+        if settings["provisioned_concurrency"]:
+            target = function.add_alias("live", provisioned_concurrent_executions=settings["provisioned_concurrency"])
+        self.create_parameter("myapplication", function_id, target.function_name)
+        return function
+
     def create_parameter(self, app_name, function_id, function_name):
+        return self.create_output_parameter(app_name, f"{function_id}FunctionName", function_name)
+
+    def create_output_parameter(self, app_name, name, value):
         from aws_cdk import aws_ssm as ssm
-    
-        param_name = f"/{app_name}/{function_id}FunctionName"
-    
+
+        param_name = f"/{app_name}/{name}"
+
         ssm.StringParameter(
             self,
-            f"{function_id}FunctionNameParam",
+            f"{name}Param",
             parameter_name=param_name,
-            string_value=function_name
+            string_value=value
         )
-    
+
         return param_name
 
 
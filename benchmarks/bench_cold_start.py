@@ -0,0 +1,182 @@
+"""Cold-start benchmark of the Lambda handlers, each run from its own bundle.
+
+The bundle of every function (``pipeline.bundles``) is built into a
+temporary directory, and each measurement runs in fresh interpreters that see
+only that bundle:
+
+    import   import of the handler module alone: seconds and modules loaded
+    init     import in a simulated Lambda container, with the client prewarm
+             (``aws_clients.prewarm``); the simulation has loaded the shared
+             modules (aws_clients, tracing, ratelimit) already
+    first    the first invocation
+    warm     a second invocation in the same container
+
+AWS calls are answered by ``benchmarks.simulated_aws`` without latency, but
+every client is still built with boto3 first, as in Lambda. Loading boto3 and
+the service models is most of a Python cold start, so the timings leave out
+only the network. Each figure is the best of --repeat processes. With
+--no-prewarm the clients are built on first use, to compare:
+
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --functions TranslateLambda --repeat 5 --output cold_start.json
+    python -m benchmarks.bench_cold_start --compare cold_start.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import pipeline  # noqa: F401  (puts lambda/ on sys.path)
+from pipeline import bundles
+
+REPO_DIR = os.path.dirname(pipeline.LAMBDA_DIR)
+BUCKET = "cold-start-bench"
+SOURCE_TEXT = "00:00:00: నమస్కారం, ఈ రోజు మనం మాట్లాడుకుందాం\n00:00:05: ఇది చాలా ముఖ్యమైన విషయం\n"
+
+# Imports only the handler: nothing but the interpreter's own startup is loaded before
+IMPORT_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+before = len(sys.modules)
+started = time.perf_counter()
+__import__(sys.argv[2])
+print(json.dumps({'import': time.perf_counter() - started, 'modules': len(sys.modules) - before}))
+"""
+
+
+def events(aws):
+    # Event factories per function, with the objects they read in the simulated bucket
+    aws.put_object(BUCKET, 'audio/bench.mp3', b'\0' * 4096)
+    aws.put_object(BUCKET, 'text/bench.txt', SOURCE_TEXT.encode('utf-8'))
+    for n in range(2):
+        # Distinct text per invocation: the synthesized speech of a text is reused
+        aws.put_object(BUCKET, f'text/speech-{n}.txt', f"Hello, and welcome to part {n} of the news.".encode('utf-8'))
+    return {
+        "TranscriptionLambda": lambda n: {'bucket': BUCKET, 'media': 'audio/bench.mp3', 'job_name': f"bench-{n}"},
+        "TranslateLambda": lambda n: {'bucket': BUCKET, 'src_text': 'text/bench.txt',
+                                      'dst_text': f"text/bench-{n}.en.txt"},
+        "SynthesizeLambda": lambda n: {'bucket': BUCKET, 'synth_file': f'text/speech-{n}.txt'},
+    }
+
+
+def run_child(function_id, bundle, prewarm):
+    """Measure init, first and warm invocation of one handler in this (fresh) process."""
+    sys.path.insert(0, bundle)
+    os.environ.update({'AWS_LAMBDA_FUNCTION_NAME': f"bench-{function_id}", 'LAMBDA_PREWARM': '1' if prewarm else '0',
+                       'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', 'us-west-1'),
+                       'STAGE_CACHE_DISABLED': '1', 'TRANSLATION_MEMORY_DISABLED': '1'})
+    import aws_clients
+    from benchmarks import simulated_aws
+
+    aws = simulated_aws.SimulatedAWS({name: simulated_aws.Latency(0.0) for name in simulated_aws.DEFAULT_LATENCIES})
+    aws.install()
+    session = []
+
+    def factory(service, region_name):
+        # Pay for the real client, answer from the simulation
+        if not session:
+            import boto3
+            session.append(boto3.session.Session())
+        session[0].client(service, region_name=region_name, config=aws_clients.client_config(service))
+        return aws.client(service)
+
+    aws_clients.set_factory(factory)
+    make_event = events(aws)[function_id]
+    module_name, handler_name = simulated_aws.LAMBDA_HANDLERS[function_id]
+
+    started = time.perf_counter()
+    handler = getattr(__import__(module_name), handler_name)
+    timings = {'init': time.perf_counter() - started}
+    for n, phase in enumerate(('first', 'warm')):
+        started = time.perf_counter()
+        handler(make_event(n), None)
+        timings[phase] = time.perf_counter() - started
+    return timings
+
+
+def measure(function_id, bundle, prewarm):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    module_name = bundles.FUNCTIONS[function_id]
+    imported = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT, bundle, module_name], env=env,
+                              capture_output=True, text=True, check=True)
+    with tempfile.NamedTemporaryFile('r', suffix='.json') as result:
+        command = [sys.executable, '-m', 'benchmarks.bench_cold_start', '--child', function_id,
+                   '--bundle', bundle, '--result', result.name]
+        if not prewarm:
+            command.append('--no-prewarm')
+        subprocess.run(command, cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True)
+        return dict(json.loads(imported.stdout.splitlines()[-1]), **json.load(result))
+
+
+def bench_function(function_id, workdir, repeat, prewarm):
+    bundle = os.path.join(workdir, function_id)
+    bundle_bytes = bundles.build(bundles.FUNCTIONS[function_id], bundle)
+    runs = [measure(function_id, bundle, prewarm) for _ in range(repeat)]
+    best = {phase: round(min(run[phase] for run in runs), 6) for phase in ('import', 'init', 'first', 'warm')}
+    return dict(best, name=function_id, prewarm=prewarm, cold=round(best['init'] + best['first'], 6),
+                modules=runs[0]['modules'], bundle_files=len(bundles.modules(bundles.FUNCTIONS[function_id])),
+                bundle_bytes=bundle_bytes)
+
+
+def compare(results, baseline, tolerance):
+    # Cold starts slower than baseline by more than tolerance (a fraction), as messages
+    previous = {(r['name'], r['prewarm']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['name'], result['prewarm']))
+        if before and before['cold'] and result['cold'] > before['cold'] * (1 + tolerance):
+            regressions.append(f"{result['name']} (prewarm={result['prewarm']}): "
+                               f"{before['cold']:.4f}s -> {result['cold']:.4f}s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--functions', nargs='+', default=list(bundles.FUNCTIONS), choices=list(bundles.FUNCTIONS))
+    parser.add_argument('--repeat', type=int, default=3, help="fresh processes per measurement (best is kept)")
+    parser.add_argument('--no-prewarm', action='store_true', help="build clients on first use instead of at init")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--compare', help="baseline JSON from an earlier --output")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown against the baseline")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--bundle', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        timings = run_child(args.child, args.bundle, not args.no_prewarm)
+        with open(args.result, 'w') as f:
+            json.dump(timings, f)
+        return 0
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [bench_function(function_id, workdir, args.repeat, not args.no_prewarm)
+                   for function_id in args.functions]
+
+    print(f"{'function':<22}{'files':>6}{'KiB':>7}{'modules':>9}{'import s':>10}{'init s':>9}"
+          f"{'first s':>9}{'warm s':>9}{'cold s':>9}")
+    for r in results:
+        print(f"{r['name']:<22}{r['bundle_files']:>6}{r['bundle_bytes'] / 1024:>7.1f}{r['modules']:>9}"
+              f"{r['import']:>10.4f}{r['init']:>9.4f}{r['first']:>9.4f}{r['warm']:>9.4f}{r['cold']:>9.4f}")
+
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
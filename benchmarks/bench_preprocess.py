@@ -0,0 +1,79 @@
+"""Compare transcription audio from split_video_audio against the preprocessing stage.
+
+For each input video this runs the current extraction (stereo libmp3lame -q:a 2)
+and every preprocessing variant (mp3/flac/ogg, with and without VAD), and
+reports the bytes that would be uploaded, the audio duration that would be
+billed, and the wall time of the extraction.
+
+    python -m benchmarks.bench_preprocess mediadir/2_20.mp4 --output bench_preprocess.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import transcribe_video_tel2eng as driver
+from pipeline import preprocess
+
+
+def measure(label, run, audio_path):
+    started = time.perf_counter()
+    time_map = run()
+    elapsed = time.perf_counter() - started
+    return {
+        'variant': label,
+        'bytes': os.path.getsize(audio_path),
+        'duration': driver.get_media_duration(audio_path),
+        'seconds': round(elapsed, 3),
+        'removed_intervals': len(time_map.removed) if time_map else 0,
+    }
+
+
+def bench_video(video, workdir):
+    duration = driver.get_media_duration(video)
+    baseline_audio = os.path.join(workdir, 'baseline.mp3')
+    results = [measure('split_video_audio', lambda: driver.split_video_audio(
+        video, os.path.join(workdir, 'video_only.mp4'), baseline_audio), baseline_audio)]
+
+    for codec, (_, media_format) in preprocess.CODECS.items():
+        for vad in (False, True):
+            audio = os.path.join(workdir, f'speech_{codec}_{int(vad)}.{media_format}')
+            results.append(measure(
+                f"{codec}{'+vad' if vad else ''}",
+                lambda: preprocess.split_for_transcription(video, None, audio, codec, vad, duration=duration),
+                audio))
+
+    baseline = results[0]
+    for result in results:
+        result['bytes_ratio'] = round(result['bytes'] / baseline['bytes'], 4)
+        if result['duration'] and baseline['duration']:
+            result['duration_ratio'] = round(result['duration'] / baseline['duration'], 4)
+    return {'video': video, 'source_duration': duration, 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('videos', nargs='+')
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    report = []
+    for video in args.videos:
+        with tempfile.TemporaryDirectory() as workdir:
+            report.append(bench_video(video, workdir))
+
+    for entry in report:
+        print(entry['video'])
+        print(f"  {'variant':<18}{'bytes':>12}{'ratio':>8}{'duration':>10}{'ratio':>8}{'time':>8}")
+        for r in entry['results']:
+            print(f"  {r['variant']:<18}{r['bytes']:>12}{r['bytes_ratio']:>8.3f}"
+                  f"{r['duration'] or 0:>10.1f}{r.get('duration_ratio', 0):>8.3f}{r['seconds']:>8.2f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,170 @@
+"""Offline micro-benchmarks for the transcript and text-processing hot paths.
+
+Synthetic Transcribe result JSONs (words with punctuation and low-confidence
+items mixed in, plus speaker labels) are generated for each size, then each
+path is timed (best of --repeat runs) and run once more under tracemalloc for
+its peak Python memory:
+
+    align_sentences         on the parsed item dicts
+    align_table             on an ItemTable built from them
+    convert_time_to_hh_mm_ss once per item
+    transcribe_job_write    stream-parse the JSON file and write the transcript,
+                            as transcribe_job does after download
+    remove_timecode         on the written transcript
+
+    python -m benchmarks.bench_transcript --output bench_transcript.json
+    python -m benchmarks.bench_transcript --sizes 1000 100000 --compare bench_transcript.json
+
+With --compare, any timing more than --tolerance slower than the baseline run
+is reported and the exit status is 1.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+
+import transcribe_video_tel2eng as driver
+from pipeline import alignment
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+WORDS = ["నమస్కారం", "ఈ", "రోజు", "మనం", "తెలుగు", "వీడియో", "గురించి", "మాట్లాడుకుందాం",
+         "ఇది", "చాలా", "ముఖ్యమైన", "విషయం", "AWS", "2023"]
+
+
+def synthetic_transcript(n_items, seed=0):
+    # Transcribe-shaped result with about 10% punctuation and 5% low-confidence words
+    rng = random.Random(seed)
+    items, speaker_items = [], []
+    t = 0.0
+    for i in range(n_items):
+        if i and rng.random() < 0.1:
+            items.append({"id": i, "type": "punctuation",
+                          "alternatives": [{"confidence": "0.0", "content": rng.choice(".,?")}]})
+            continue
+        t += 7.0 if rng.random() < 0.005 else rng.uniform(0.15, 0.6)
+        start, end = f"{t:.3f}", f"{t + 0.25:.3f}"
+        confidence = f"{rng.uniform(0.0, 0.05):.4f}" if rng.random() < 0.05 else f"{rng.uniform(0.6, 1.0):.4f}"
+        items.append({"id": i, "start_time": start, "end_time": end, "type": "pronunciation",
+                      "alternatives": [{"confidence": confidence, "content": rng.choice(WORDS)}],
+                      "speaker_label": "spk_0"})
+        speaker_items.append({"speaker_label": "spk_0", "start_time": start, "end_time": end})
+    return {
+        "jobName": f"bench-{n_items}",
+        "status": "COMPLETED",
+        "results": {
+            "transcripts": [{"transcript": "synthetic"}],
+            "speaker_labels": {"speakers": 1, "segments": [
+                {"speaker_label": "spk_0", "start_time": "0.0", "end_time": f"{t:.3f}", "items": speaker_items}]},
+            "items": items,
+        },
+    }
+
+
+def measure(name, n_items, run, repeat):
+    # Best wall time of `repeat` runs, then one run under tracemalloc for peak memory
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    best = min(timings)
+    return {
+        'name': name,
+        'items': n_items,
+        'seconds': round(best, 6),
+        'items_per_second': round(n_items / best) if best else None,
+        'peak_bytes': peak,
+    }
+
+
+def bench_size(n_items, workdir, repeat):
+    document = synthetic_transcript(n_items)
+    json_path = os.path.join(workdir, f'transcript_{n_items}.json')
+    with open(json_path, 'w') as f:
+        json.dump(document, f, ensure_ascii=False)
+    items = document['results']['items']
+    table = alignment.ItemTable.from_items(items)
+    del document
+    text_path = os.path.join(workdir, f'telugu_text_{n_items}.txt')
+    seconds = [int(float(item['start_time'])) for item in items if 'start_time' in item]
+
+    def transcribe_job_write():
+        table = alignment.ItemTable.from_chunks(alignment.iter_file_chunks(json_path))
+        driver.write_transcript(table, text_path)
+
+    results = [
+        measure('align_sentences', n_items, lambda: driver.align_sentences(items, driver.STEP_SIZE), repeat),
+        measure('align_table', n_items,
+                lambda: alignment.align_table(table, driver.STEP_SIZE, driver.MAXLINE_LEN, driver.CONFIDENCE),
+                repeat),
+        measure('convert_time_to_hh_mm_ss', len(seconds),
+                lambda: [driver.convert_time_to_hh_mm_ss(s) for s in seconds], repeat),
+        measure('transcribe_job_write', n_items, transcribe_job_write, repeat),
+        measure('remove_timecode', n_items, lambda: driver.remove_timecode(text_path), repeat),
+    ]
+    for result in results:
+        result['json_bytes'] = os.path.getsize(json_path)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Timings slower than baseline by more than tolerance (a fraction), as messages
+    previous = {(r['name'], r['items']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['name'], result['items']))
+        if before and before['seconds'] and result['seconds'] > before['seconds'] * (1 + tolerance):
+            regressions.append(f"{result['name']} @ {result['items']} items: "
+                               f"{before['seconds']:.4f}s -> {result['seconds']:.4f}s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="items per transcript")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per measurement (best is kept)")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--compare', help="baseline JSON from an earlier --output")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_items in args.sizes:
+            results.extend(bench_size(n_items, workdir, args.repeat))
+
+    print(f"{'benchmark':<26}{'items':>9}{'seconds':>11}{'items/s':>13}{'peak MiB':>10}")
+    for r in results:
+        print(f"{r['name']:<26}{r['items']:>9}{r['seconds']:>11.4f}{r['items_per_second'] or 0:>13}"
+              f"{r['peak_bytes'] / 2 ** 20:>10.1f}")
+
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+"""Replay a synthetic video through live mode at real-time speed, against simulated AWS services.
+
+``pipeline.live.ReplaySource`` releases each window once the simulated clock
+has passed its end, as a live input would. ``LivePipeline`` runs the windows
+through the stages, with AWS and ffmpeg replaced by the fakes in
+``benchmarks.simulated_aws``. The report gives the lag from the end of each
+window to its segment (p50/p95/max), how many windows were dubbed, late or
+failed, per-stage p50/p95, and throughput: media seconds per simulated second
+of the run, the lag of the last window included. The lag stays bounded
+only while the stages keep up with --speed:
+
+    python -m benchmarks.live_replay --duration 600 --window 20 --max-lag 60
+    python -m benchmarks.live_replay --window 10 --speed 2 --workers 8 --output live.json
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+
+import pipeline  # noqa: F401  (puts lambda/ on sys.path)
+import aws_clients
+import transcribe_video_tel2eng as driver
+from benchmarks import simulated_aws
+from benchmarks.loadtest import BUCKET, make_videos, summarize
+from pipeline import live
+from pipeline.discovery import StackDiscovery
+from pipeline.transcribe_waiter import TranscriptionWaiter
+from pipeline.workspace import job_id_for
+
+
+def run_replay(video, workdir, aws, window, max_lag, speed=1.0, workers=live.DEFAULT_WORKERS,
+               ffmpeg_workers=live.DEFAULT_FFMPEG_WORKERS):
+    job_id = job_id_for(video)
+    source = live.ReplaySource(video, window, os.path.join(workdir, job_id, 'windows'), speed=speed,
+                               clock=aws.clock, sleep=aws.sleep)
+    runner = live.LivePipeline(BUCKET, job_id, workdir, os.path.join(workdir, 'output'), max_lag=max_lag,
+                               workers=workers, ffmpeg_workers=ffmpeg_workers, clock=aws.clock, sleep=aws.sleep)
+    result = runner.run(source)
+    windows = result['windows']
+    counts = {status: sum(1 for w in windows if w['status'] == status) for status in ('dubbed', 'late', 'failed')}
+    return dict(counts, **{
+        'windows': len(windows),
+        'window': window,
+        'max_lag': max_lag,
+        'speed': speed,
+        'media_seconds': result['media_seconds'],
+        'simulated_seconds': result['elapsed'],
+        'throughput': round(result['media_seconds'] / result['elapsed'], 3) if result['elapsed'] else None,
+        'lag': summarize([w['lag'] for w in windows]),
+        'stages': {stage: summarize([w['stages'][stage] for w in windows if stage in w['stages']])
+                   for stage in live.STAGES},
+        'segments': windows,
+        'aws': aws.stats(),
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=300.0, help="seconds of video to replay")
+    parser.add_argument('--window', type=float, default=live.DEFAULT_WINDOW)
+    parser.add_argument('--max-lag', type=float, default=live.DEFAULT_MAX_LAG)
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed (1 = real time)")
+    parser.add_argument('--workers', type=int, default=live.DEFAULT_WORKERS)
+    parser.add_argument('--ffmpeg-workers', type=int, default=live.DEFAULT_FFMPEG_WORKERS)
+    parser.add_argument('--time-scale', type=float, default=0.01, help="real seconds per simulated second")
+    parser.add_argument('--profile', help="JSON latency/throttle overrides, as for benchmarks.loadtest")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    latencies, throttle = simulated_aws.load_profile(args.profile) if args.profile else ({}, {})
+    aws = simulated_aws.SimulatedAWS(latencies, throttle, time_scale=args.time_scale, seed=args.seed)
+    os.environ['STAGE_CACHE_DISABLED'] = '1'
+    os.environ['TRANSLATION_MEMORY_DISABLED'] = '1'
+    os.environ['TRANSCRIPT_INDEX_DISABLED'] = '1'
+    aws.install()
+    media = simulated_aws.SimulatedMedia(aws).install(driver)
+    driver.set_transcription_waiter(TranscriptionWaiter(aws_clients.get_client('transcribe'),
+                                                        max_delay=live.TRANSCRIBE_MAX_DELAY,
+                                                        clock=aws.clock, sleep=aws.sleep))
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            driver.set_discovery(StackDiscovery(driver.myapp, workdir))
+            video, = make_videos(workdir, 1, args.duration, args.duration, seed=args.seed)
+            report = run_replay(video, workdir, aws, args.window, args.max_lag, args.speed, args.workers,
+                                args.ffmpeg_workers)
+    finally:
+        driver.set_transcription_waiter(None)
+        driver.set_discovery(None)
+        media.uninstall()
+        aws.uninstall()
+
+    print(f"{report['windows']} windows of {report['window']:g}s at {report['speed']:g}x: {report['dubbed']} dubbed, "
+          f"{report['late']} late, {report['failed']} failed; throughput {report['throughput']} media s/s")
+    lag = report['lag']
+    if lag['count']:
+        print(f"  lag (max {report['max_lag']:g}s)  p50 {lag['p50']:.1f}  p95 {lag['p95']:.1f}  max {lag['max']:.1f}")
+    print(f"  {'stage':<12}{'p50':>9}{'p95':>9}")
+    for stage, summary in report['stages'].items():
+        if summary['count']:
+            print(f"  {stage:<12}{summary['p50']:>9.1f}{summary['p95']:>9.1f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0 if report['dubbed'] == report['windows'] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,200 @@
+"""Push N synthetic videos through the full pipeline against simulated AWS services.
+
+Every video runs the same stages as ``process_audio_bucket``: extract,
+transcribe, translate, synthesize and mux. The driver code and the Lambda
+handlers run unchanged; AWS and ffmpeg are replaced by the fakes in
+``benchmarks.simulated_aws``. Up to --concurrency videos are in flight at
+once, and at most --ffmpeg-workers of them are in an ffmpeg stage, as in
+batch mode. The report gives throughput and p50/p95/p99 latency per stage in
+simulated seconds, plus API call, throttle and cold-start counts:
+
+    python -m benchmarks.loadtest --videos 200 --concurrency 16 --time-scale 0.002
+    python -m benchmarks.loadtest --videos 50 --profile throttled.json --output loadtest.json
+
+--profile is a JSON file overriding latencies and throttle rates, see
+``simulated_aws.load_profile``.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pipeline  # noqa: F401  (puts lambda/ on sys.path)
+import aws_clients
+import transcribe_video_tel2eng as driver
+from benchmarks import simulated_aws
+from pipeline.discovery import StackDiscovery
+from pipeline.transcribe_waiter import TranscriptionWaiter
+from pipeline.workspace import Workspace
+
+STAGES = driver.STAGES
+BUCKET = "simulated-audio-bucket"
+
+
+def percentile(values, q):
+    # Nearest-rank percentile of a non-empty list
+    ordered = sorted(values)
+    rank = max(1, int(-(-q * len(ordered) // 100)))
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 3),
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'p99': round(percentile(values, 99), 3),
+        'max': round(max(values), 3),
+    }
+
+
+def make_videos(workdir, count, min_duration, max_duration, seed=0):
+    rng = random.Random(seed)
+    videos = []
+    for i in range(count):
+        path = os.path.join(workdir, 'input', f'video{i:05d}.mp4')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        simulated_aws.write_media(path, round(rng.uniform(min_duration, max_duration), 1), f"source{i}")
+        videos.append(path)
+    return videos
+
+
+def run_video(ws, aws, ffmpeg_slots):
+    # (stage timings in simulated seconds, error or None) for one video
+    timings = {}
+
+    def timed(stage, fn, *args, ffmpeg=False):
+        if ffmpeg:
+            ffmpeg_slots.acquire()
+        try:
+            started = aws.clock()
+            result = fn(*args)
+            timings[stage] = aws.clock() - started
+            return result
+        finally:
+            if ffmpeg:
+                ffmpeg_slots.release()
+
+    started = aws.clock()
+    try:
+        timed('extract', driver.extract_stage, ws, ffmpeg=True)
+        transcript_file = timed('transcribe', driver.transcribe_stage, BUCKET, ws)
+        if driver.target_languages_spec:
+            timed('localize', driver.localize_stage, BUCKET, ws)
+        elif driver.output_mode == 'subtitles':
+            timed('translate', driver.translate_stage, BUCKET, ws, transcript_file)
+            timed('subtitles', driver.subtitles_stage, ws)
+        else:
+            timed('translate', driver.translate_stage, BUCKET, ws, transcript_file)
+            timed('synthesize', driver.synthesize_stage, BUCKET, ws)
+        timed('mux', driver.mux_stage, ws, ffmpeg=True)
+    except Exception as error:
+        return timings, None, f"{type(error).__name__}: {error}"
+    return timings, aws.clock() - started, None
+
+
+def run_load(videos, workdir, aws, concurrency, ffmpeg_workers):
+    workspaces = [Workspace.for_video(video, os.path.join(workdir, 'jobs')) for video in videos]
+    ffmpeg_slots = threading.BoundedSemaphore(ffmpeg_workers)
+    started_real, started = time.monotonic(), aws.clock()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda ws: run_video(ws, aws, ffmpeg_slots), workspaces))
+    elapsed, elapsed_real = aws.clock() - started, time.monotonic() - started_real
+
+    stage_times = {stage: [t[stage] for t, _, _ in results if stage in t] for stage in driver.active_stages()}
+    totals = [total for _, total, error in results if error is None]
+    errors = [f"{ws.job_id}: {error}" for ws, (_, _, error) in zip(workspaces, results) if error]
+    media_seconds = sum(driver.get_media_duration(video) for video in videos)
+    return {
+        'videos': len(videos),
+        'succeeded': len(totals),
+        'failed': len(errors),
+        'errors': errors[:20],
+        'concurrency': concurrency,
+        'ffmpeg_workers': ffmpeg_workers,
+        'simulated_seconds': round(elapsed, 1),
+        'real_seconds': round(elapsed_real, 1),
+        'videos_per_hour': round(len(totals) / elapsed * 3600, 2) if elapsed else None,
+        'media_hours_per_hour': round(media_seconds / elapsed, 2) if elapsed else None,
+        'stages': {stage: summarize(values) for stage, values in stage_times.items()},
+        'end_to_end': summarize(totals),
+        'aws': aws.stats(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--videos', type=int, default=20)
+    parser.add_argument('--duration', type=float, nargs=2, default=(60.0, 600.0), metavar=('MIN', 'MAX'),
+                        help="video length range in seconds")
+    parser.add_argument('--concurrency', type=int, default=8, help="videos in flight")
+    parser.add_argument('--ffmpeg-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--synthesis-workers', type=int, default=driver.synthesis_workers)
+    parser.add_argument('--time-scale', type=float, default=0.005,
+                        help="real seconds per simulated second")
+    parser.add_argument('--profile', help="JSON latency/throttle overrides")
+    parser.add_argument('--transcribe-quota', type=int, default=250, help="concurrent Transcribe jobs")
+    parser.add_argument('--subtitles', action='store_true', help="subtitle-only output (no synthesis)")
+    parser.add_argument('--languages', help="comma-separated target languages for a multi-language run")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    latencies, throttle = simulated_aws.load_profile(args.profile) if args.profile else ({}, {})
+    aws = simulated_aws.SimulatedAWS(latencies, throttle, time_scale=args.time_scale, seed=args.seed,
+                                     transcribe_quota=args.transcribe_quota)
+    # Every simulated video is new: measure the services, not the caches
+    os.environ['STAGE_CACHE_DISABLED'] = '1'
+    os.environ['TRANSLATION_MEMORY_DISABLED'] = '1'
+    os.environ['TRANSCRIPT_INDEX_DISABLED'] = '1'
+    driver.synthesis_workers = args.synthesis_workers
+    if args.subtitles:
+        driver.output_mode = 'subtitles'
+    if args.languages:
+        driver.target_languages_spec = args.languages
+    aws.install()
+    media = simulated_aws.SimulatedMedia(aws).install(driver)
+    driver.set_transcription_waiter(TranscriptionWaiter(aws_clients.get_client('transcribe'),
+                                                        clock=aws.clock, sleep=aws.sleep))
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            driver.set_discovery(StackDiscovery(driver.myapp, workdir))
+            videos = make_videos(workdir, args.videos, *args.duration, seed=args.seed)
+            report = run_load(videos, workdir, aws, args.concurrency, args.ffmpeg_workers)
+    finally:
+        driver.set_transcription_waiter(None)
+        driver.set_discovery(None)
+        media.uninstall()
+        aws.uninstall()
+
+    print(f"{report['succeeded']}/{report['videos']} videos in {report['simulated_seconds']}s simulated "
+          f"({report['real_seconds']}s real): {report['videos_per_hour']} videos/h, "
+          f"{report['media_hours_per_hour']} media hours/h")
+    print(f"  {'stage':<12}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for stage, summary in list(report['stages'].items()) + [('end_to_end', report['end_to_end'])]:
+        if summary['count']:
+            print(f"  {stage:<12}{summary['p50']:>9.1f}{summary['p95']:>9.1f}{summary['p99']:>9.1f}"
+                  f"{summary['max']:>9.1f}")
+    print(f"  throttled: {report['aws']['throttled']}  cold starts: {report['aws']['lambda_cold_starts']}")
+    for service, limits in report['aws']['rate_limits'].items():
+        print(f"  {service} allowed rate: {limits['allowed_rate']}  concurrency limit: {limits['concurrency_limit']}"
+              f"  retries: {limits['retries']}")
+    for error in report['errors']:
+        print(f"  FAILED {error}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0 if not report['failed'] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
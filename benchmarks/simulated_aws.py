@@ -0,0 +1,590 @@
+"""In-process stand-ins for the AWS services (and ffmpeg) used by the pipeline.
+
+``SimulatedAWS`` hands out fake S3, SSM, Lambda, Transcribe, Translate, Polly
+and SNS clients through ``aws_clients.set_factory``, so the driver and the
+three Lambda handlers run unchanged against it. Lambda invocations run the
+real handlers in-process. Every call sleeps for a latency drawn from a
+configurable distribution, and calls can be throttled at a configurable rate.
+A throttled call is retried with backoff inside the fake client as often as
+``aws_clients`` would let botocore retry it. For the rate-limited services
+that is not at all, so ``ratelimit`` sees every throttle and runs on the
+simulated clock. Transcribe jobs take time proportional
+to the audio duration, and their results are synthetic Transcribe JSONs.
+
+Time is virtual: ``time_scale`` real seconds pass per simulated second, so
+a large batch of hour-long videos can be simulated in minutes.
+``SimulatedMedia`` replaces the ffmpeg steps with placeholder files and the
+same kind of latency model. Media files carry their duration in a one-line
+JSON header, which is how the fake Transcribe knows how long the audio is.
+"""
+import importlib
+import io
+import json
+import math
+import os
+import random
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+import pipeline  # noqa: F401  (puts lambda/ on sys.path)
+import aws_clients
+import ratelimit
+import tracing
+from benchmarks.bench_transcript import synthetic_transcript
+from pipeline import multitrack, subtitles, synthesis
+
+APP_NAME = "myapplication"
+# SSM parameter name -> handler, as deployed by app.py
+LAMBDA_HANDLERS = {
+    "TranscriptionLambda": ("transcribe_audio", "handler"),
+    "TranslateLambda": ("translate_text", "handler"),
+    "SynthesizeLambda": ("synthesize_speech", "synthesize_speech"),
+}
+LAMBDA_ENV = {
+    "LANGUAGE_CODE": "te",
+    "TARGET_LANGUAGE_CODE": "en",
+    "TRANSCRIBE_ROLE_ARN": "arn:aws:iam::000000000000:role/simulated-transcribe",
+}
+THROTTLE_CODES = {
+    'translate': 'ThrottlingException',
+    'polly': 'ThrottlingException',
+    'transcribe': 'LimitExceededException',
+    's3': 'SlowDown',
+    'lambda': 'TooManyRequestsException',
+    'ssm': 'ThrottlingException',
+}
+MEDIA_BYTES_PER_SECOND = 1000  # size of placeholder audio/video per second of media
+SPEECH_CHARS_PER_SECOND = 18.0
+
+
+class Latency:
+    """Log-normal latency (seconds) with the given median and 95th percentile,
+    plus per_unit seconds for each unit of work (bytes, characters, media seconds)."""
+
+    def __init__(self, median, p95=None, per_unit=0.0):
+        self.median = median
+        self.p95 = p95
+        self.per_unit = per_unit
+
+    def sample(self, rng, units=0):
+        base = self.median
+        if self.p95 and self.p95 > self.median > 0:
+            sigma = math.log(self.p95 / self.median) / 1.645
+            base = self.median * math.exp(rng.gauss(0.0, sigma))
+        return base + self.per_unit * units
+
+    @classmethod
+    def from_dict(cls, spec):
+        return cls(spec['median'], spec.get('p95'), spec.get('per_unit', 0.0))
+
+
+DEFAULT_LATENCIES = {
+    's3.get': Latency(0.02, 0.06, per_unit=1 / 80e6),
+    's3.put': Latency(0.03, 0.10, per_unit=1 / 50e6),
+    's3.head': Latency(0.01, 0.03),
+    'ssm.get_parameter': Latency(0.01, 0.03),
+    'lambda.invoke': Latency(0.015, 0.04),
+    'lambda.cold_start': Latency(0.6, 1.5),
+    'transcribe.start_transcription_job': Latency(0.12, 0.35),
+    'transcribe.get_transcription_job': Latency(0.05, 0.15),
+    'transcribe.job': Latency(20.0, 60.0, per_unit=0.3),        # queueing + 0.3 s per audio second
+    'translate.translate_text': Latency(0.15, 0.45, per_unit=1 / 25000),  # per UTF-8 byte
+    'polly.synthesize_speech': Latency(0.12, 0.30, per_unit=0.0015),       # per character
+    'polly.start_speech_synthesis_task': Latency(0.1, 0.3),
+    'polly.get_speech_synthesis_task': Latency(0.03, 0.08),
+    'polly.synthesis_task': Latency(5.0, 15.0, per_unit=0.002),           # queueing + per character
+    'sns.publish': Latency(0.02, 0.05),
+    'ffmpeg.split': Latency(0.3, 0.6, per_unit=0.02),              # per media second
+    'ffmpeg.combine': Latency(0.3, 0.6, per_unit=0.01),
+    'ffmpeg.atempo': Latency(0.05, 0.1),
+    'ffmpeg.remux': Latency(0.1, 0.3, per_unit=0.001),              # stream copy, subtitle mux
+}
+
+
+def load_profile(path):
+    # {"latency": {"translate.translate_text": {"median": .., "p95": .., "per_unit": ..}},
+    #  "throttle": {"translate": 0.05}} -> (latencies, throttle rates)
+    with open(path, 'r') as f:
+        profile = json.load(f)
+    latencies = {name: Latency.from_dict(spec) for name, spec in profile.get('latency', {}).items()}
+    return latencies, profile.get('throttle', {})
+
+
+def _client_error(code, operation, message=''):
+    return ClientError({'Error': {'Code': code, 'Message': message or code},
+                        'ResponseMetadata': {'HTTPStatusCode': 400}}, operation)
+
+
+def _body(data):
+    return StreamingBody(io.BytesIO(data), len(data))
+
+
+def media_header_duration(data):
+    # Duration stored in the first line of a simulated media file, None for anything else
+    try:
+        return float(json.loads(data.split(b'\n', 1)[0])['duration'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def write_media(path, duration, tag):
+    with open(path, 'wb') as f:
+        f.write(json.dumps({'duration': duration, 'tag': tag}).encode() + b'\n')
+        f.write(b'\0' * int(duration * MEDIA_BYTES_PER_SECOND))
+    return path
+
+
+class SimulatedAWS:
+    def __init__(self, latencies=None, throttle=None, time_scale=1.0, seed=0, transcribe_quota=250,
+                 max_attempts=None, items_per_second=2.5):
+        self.latencies = dict(DEFAULT_LATENCIES, **(latencies or {}))
+        self.throttle = dict(throttle or {})
+        self.time_scale = time_scale
+        self.transcribe_quota = transcribe_quota
+        self.max_attempts = max_attempts  # default: what aws_clients configures per service
+        self.items_per_second = items_per_second
+        self.calls = Counter()
+        self.throttled = Counter()
+        self.failures = Counter()
+        self.cold_starts = Counter()
+        self.objects = defaultdict(dict)  # bucket -> key -> bytes
+        self.jobs = {}
+        self.speech_tasks = {}
+        self.uploads = {}  # multipart upload id -> {part number: bytes}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._warm = Counter()
+        self._active = Counter()
+
+    # virtual time
+    def clock(self):
+        return (time.monotonic() - self._started) / self.time_scale
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def _random(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    def latency(self, name, units=0):
+        latency = self.latencies[name]
+        return self._random(latency.sample, self._rng, units)
+
+    def call(self, service, operation, units=0, latency=None):
+        """Account for one API call: throttle (with retries) and sleep its latency."""
+        name = latency or f'{service}.{operation}'
+        rate = self.throttle.get(service, 0.0)
+        for attempt in range(self.max_attempts or aws_clients.max_attempts(service)):
+            with self._lock:
+                self.calls[name] += 1
+                throttled = rate and self._rng.random() < rate
+            if not throttled:
+                self.sleep(self.latency(name, units))
+                tracing.record_api_call()
+                return
+            with self._lock:
+                self.throttled[service] += 1
+            # botocore standard mode: full jitter, base 2 ** attempt, capped at 20 s
+            self.sleep(self._random(self._rng.uniform, 0, min(20.0, 2 ** attempt)))
+        with self._lock:
+            self.failures[service] += 1
+        raise _client_error(THROTTLE_CODES.get(service, 'ThrottlingException'), operation, "Rate exceeded")
+
+    def client(self, service, region_name=None):
+        return _CLIENTS[service](self)
+
+    def install(self):
+        for name, value in LAMBDA_ENV.items():
+            os.environ.setdefault(name, value)
+        aws_clients.set_factory(self.client)
+        ratelimit.set_clock(self.clock, self.sleep)
+        return self
+
+    def uninstall(self):
+        aws_clients.set_factory(None)
+        ratelimit.reset()
+
+    def stats(self):
+        return {
+            'calls': dict(self.calls),
+            'throttled': dict(self.throttled),
+            'failed_after_retries': dict(self.failures),
+            'lambda_cold_starts': dict(self.cold_starts),
+            'transcription_jobs': len(self.jobs),
+            'rate_limits': ratelimit.stats(),
+        }
+
+    # S3 state
+    def put_object(self, bucket, key, data):
+        with self._lock:
+            self.objects[bucket][key] = bytes(data)
+
+    def get_object(self, bucket, key, operation='GetObject'):
+        with self._lock:
+            data = self.objects[bucket].get(key)
+        if data is None:
+            raise _client_error('NoSuchKey', operation)
+        return data
+
+
+class _S3:
+    def __init__(self, aws):
+        self.aws = aws
+
+    def list_buckets(self):
+        self.aws.call('s3', 'list_buckets', latency='s3.get')
+        return {'Buckets': [{'Name': name} for name in sorted(self.aws.objects)]}
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        with open(Filename, 'rb') as f:
+            data = f.read()
+        self.aws.call('s3', 'upload_file', len(data), latency='s3.put')
+        self.aws.put_object(Bucket, Key, data)
+
+    def download_file(self, Bucket, Key, Filename):
+        data = self.aws.get_object(Bucket, Key, 'HeadObject')
+        self.aws.call('s3', 'download_file', len(data), latency='s3.get')
+        with open(Filename, 'wb') as f:
+            f.write(data)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        data = Body if isinstance(Body, (bytes, bytearray)) else Body.read()
+        self.aws.call('s3', 'put_object', len(data), latency='s3.put')
+        self.aws.put_object(Bucket, Key, data)
+        return {'ETag': '"simulated"'}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        data = self.aws.get_object(Bucket, Key)
+        self.aws.call('s3', 'get_object', len(data), latency='s3.get')
+        return {'Body': _body(data), 'ContentLength': len(data)}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self.aws.call('s3', 'head_object', latency='s3.head')
+        data = self.aws.get_object(Bucket, Key, 'HeadObject')
+        return {'ContentLength': len(data)}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.aws.call('s3', 'create_multipart_upload', latency='s3.head')
+        with self.aws._lock:
+            upload_id = f"upload-{len(self.aws.uploads)}"
+            self.aws.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self.aws.call('s3', 'upload_part', len(Body), latency='s3.put')
+        with self.aws._lock:
+            self.aws.uploads[UploadId][PartNumber] = bytes(Body)
+        return {'ETag': f'"part-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self.aws.call('s3', 'complete_multipart_upload', latency='s3.head')
+        with self.aws._lock:
+            parts = self.aws.uploads.pop(UploadId)
+        self.aws.put_object(Bucket, Key, b''.join(parts[part['PartNumber']] for part in MultipartUpload['Parts']))
+        return {'ETag': '"simulated"'}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self.aws.call('s3', 'abort_multipart_upload', latency='s3.head')
+        with self.aws._lock:
+            self.aws.uploads.pop(UploadId, None)
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self.aws.call('s3', 'delete_object', latency='s3.head')
+        with self.aws._lock:
+            self.aws.objects[Bucket].pop(Key, None)
+
+
+class _SSM:
+    def __init__(self, aws):
+        self.aws = aws
+
+    def get_parameter(self, Name, WithDecryption=False):
+        self.aws.call('ssm', 'get_parameter')
+        function_id = Name.rsplit('/', 1)[-1][:-len('FunctionName')]
+        if function_id not in LAMBDA_HANDLERS:
+            raise _client_error('ParameterNotFound', 'GetParameter')
+        return {'Parameter': {'Name': Name, 'Value': f"simulated-{function_id}"}}
+
+    def get_parameters_by_path(self, Path, Recursive=False, WithDecryption=False, **kwargs):
+        self.aws.call('ssm', 'get_parameters_by_path', latency='ssm.get_parameter')
+        params = [{'Name': f"{Path}{function_id}FunctionName", 'Value': f"simulated-{function_id}"}
+                  for function_id in LAMBDA_HANDLERS]
+        return {'Parameters': params}
+
+    def get_paginator(self, operation):
+        return _SinglePage(getattr(self, operation))
+
+
+class _SinglePage:
+    def __init__(self, operation):
+        self.operation = operation
+
+    def paginate(self, **kwargs):
+        return [self.operation(**kwargs)]
+
+
+class _STS:
+    def __init__(self, aws):
+        self.aws = aws
+
+    def get_caller_identity(self):
+        self.aws.call('sts', 'get_caller_identity', latency='ssm.get_parameter')
+        return {'Account': '000000000000'}
+
+
+class _Lambda:
+    def __init__(self, aws):
+        self.aws = aws
+
+    def invoke(self, FunctionName, InvocationType='RequestResponse', Payload=b'{}'):
+        self.aws.call('lambda', 'invoke')
+        function_id = FunctionName[len('simulated-'):]
+        if InvocationType == 'Event':
+            # Queued: the handler runs later and its return value is dropped
+            threading.Thread(target=self._run, args=(function_id, Payload), daemon=True).start()
+            return {'StatusCode': 202, 'Payload': _body(b'')}
+        return self._run(function_id, Payload)
+
+    def _run(self, function_id, Payload):
+        module_name, handler_name = LAMBDA_HANDLERS[function_id]
+        aws = self.aws
+        with aws._lock:
+            # one container per concurrent invocation; new containers start cold
+            aws._active[function_id] += 1
+            cold = aws._active[function_id] > aws._warm[function_id]
+            if cold:
+                aws._warm[function_id] += 1
+                aws.cold_starts[function_id] += 1
+        try:
+            if cold:
+                aws.sleep(aws.latency('lambda.cold_start'))
+            handler = getattr(importlib.import_module(module_name), handler_name)
+            try:
+                result = handler(json.loads(Payload), None)
+            except Exception as error:
+                payload = {'errorMessage': str(error), 'errorType': type(error).__name__}
+                return {'StatusCode': 200, 'FunctionError': 'Unhandled',
+                        'Payload': _body(json.dumps(payload).encode())}
+            return {'StatusCode': 200, 'Payload': _body(json.dumps(result).encode())}
+        finally:
+            with aws._lock:
+                aws._active[function_id] -= 1
+
+
+class _Transcribe:
+    def __init__(self, aws):
+        self.aws = aws
+
+    def start_transcription_job(self, TranscriptionJobName, Media, MediaFormat, LanguageCode,
+                                OutputBucketName, OutputKey=None, **kwargs):
+        aws = self.aws
+        aws.call('transcribe', 'start_transcription_job')
+        bucket, _, key = Media['MediaFileUri'][len('s3://'):].partition('/')
+        duration = media_header_duration(aws.get_object(bucket, key, 'StartTranscriptionJob')) or 60.0
+        with aws._lock:
+            running = sum(1 for job in aws.jobs.values() if job['status'] != 'COMPLETED')
+            if TranscriptionJobName in aws.jobs:
+                raise _client_error('ConflictException', 'StartTranscriptionJob')
+        if running >= aws.transcribe_quota:
+            raise _client_error('LimitExceededException', 'StartTranscriptionJob',
+                                "Concurrent job limit reached")
+        job = {'name': TranscriptionJobName, 'media': Media['MediaFileUri'], 'status': 'IN_PROGRESS',
+               'duration': duration, 'bucket': OutputBucketName, 'key': OutputKey or f"{TranscriptionJobName}.json",
+               'done_at': aws.clock() + aws.latency('transcribe.job', duration)}
+        with aws._lock:
+            aws.jobs[TranscriptionJobName] = job
+        return {'TranscriptionJob': self._describe(job)}
+
+    def get_transcription_job(self, TranscriptionJobName):
+        aws = self.aws
+        aws.call('transcribe', 'get_transcription_job')
+        with aws._lock:
+            job = aws.jobs.get(TranscriptionJobName)
+        if job is None:
+            raise _client_error('BadRequestException', 'GetTranscriptionJob', "Job not found")
+        with aws._lock:
+            finishing = job['status'] == 'IN_PROGRESS' and aws.clock() >= job['done_at']
+            if finishing:
+                job['status'] = 'WRITING'
+        if finishing:
+            n_items = max(1, int(job['duration'] * aws.items_per_second))
+            # Seeded by the media, not the job name: names carry the wall-clock time
+            seed = zlib.crc32(job['media'].encode())
+            document = synthetic_transcript(n_items, seed=seed)
+            document['jobName'] = job['name']
+            aws.put_object(job['bucket'], job['key'],
+                           json.dumps(document, ensure_ascii=False).encode('utf-8'))
+            job['status'] = 'COMPLETED'
+        return {'TranscriptionJob': self._describe(job)}
+
+    def _describe(self, job):
+        status = 'IN_PROGRESS' if job['status'] == 'WRITING' else job['status']
+        described = {'TranscriptionJobName': job['name'], 'TranscriptionJobStatus': status}
+        if job['status'] == 'COMPLETED':
+            described['Transcript'] = {
+                'TranscriptFileUri': f"https://s3.us-west-1.amazonaws.com/{job['bucket']}/{job['key']}"}
+        else:
+            described['Transcript'] = {}
+        return described
+
+
+class _Translate:
+    def __init__(self, aws):
+        self.aws = aws
+
+    def translate_text(self, Text, SourceLanguageCode, TargetLanguageCode, **kwargs):
+        size = len(Text.encode('utf-8'))
+        if size > 10000:
+            raise _client_error('TextSizeLimitExceededException', 'TranslateText')
+        self.aws.call('translate', 'translate_text', size)
+        return {'TranslatedText': Text, 'SourceLanguageCode': SourceLanguageCode,
+                'TargetLanguageCode': TargetLanguageCode}
+
+
+class _Polly:
+    def __init__(self, aws):
+        self.aws = aws
+
+    def synthesize_speech(self, Text, VoiceId, OutputFormat, SampleRate=None, **kwargs):
+        if len(Text) > 3000:
+            raise _client_error('TextLengthExceededException', 'SynthesizeSpeech')
+        self.aws.call('polly', 'synthesize_speech', len(Text))
+        seconds = len(Text) / SPEECH_CHARS_PER_SECOND
+        if OutputFormat == 'pcm':
+            data = b'\0' * (int(seconds * int(SampleRate or synthesis.SAMPLE_RATE)) * synthesis.SAMPLE_WIDTH)
+        else:
+            data = b'\0' * int(seconds * 4000)  # ~32 kbit/s
+        return {'AudioStream': _body(data), 'ContentType': f'audio/{OutputFormat}',
+                'RequestCharacters': len(Text)}
+
+    def start_speech_synthesis_task(self, Text, VoiceId, OutputFormat, OutputS3BucketName, OutputS3KeyPrefix='',
+                                    SnsTopicArn=None, **kwargs):
+        aws = self.aws
+        if len(Text) > 100000:
+            raise _client_error('TextLengthExceededException', 'StartSpeechSynthesisTask')
+        aws.call('polly', 'start_speech_synthesis_task')
+        done_at = aws.clock() + aws.latency('polly.synthesis_task', len(Text))
+        with aws._lock:
+            task_id = f"task-{len(aws.speech_tasks):05d}"
+            task = {'id': task_id, 'status': 'inProgress', 'characters': len(Text), 'topic': SnsTopicArn,
+                    'bucket': OutputS3BucketName, 'key': f"{OutputS3KeyPrefix}{task_id}.{OutputFormat}",
+                    'done_at': done_at}
+            aws.speech_tasks[task_id] = task
+        return {'SynthesisTask': self._describe(task)}
+
+    def get_speech_synthesis_task(self, TaskId):
+        aws = self.aws
+        aws.call('polly', 'get_speech_synthesis_task')
+        with aws._lock:
+            task = aws.speech_tasks.get(TaskId)
+            finishing = task is not None and task['status'] == 'inProgress' and aws.clock() >= task['done_at']
+            if finishing:
+                task['status'] = 'writing'
+        if task is None:
+            raise _client_error('SynthesisTaskNotFoundException', 'GetSpeechSynthesisTask')
+        if finishing:
+            seconds = task['characters'] / SPEECH_CHARS_PER_SECOND
+            aws.put_object(task['bucket'], task['key'], b'\0' * int(seconds * 4000))
+            if task['topic']:
+                aws.call('sns', 'publish')
+            task['status'] = 'completed'
+        return {'SynthesisTask': self._describe(task)}
+
+    def _describe(self, task):
+        return {'TaskId': task['id'], 'TaskStatus': 'inProgress' if task['status'] == 'writing' else task['status'],
+                'OutputUri': f"https://s3.us-west-1.amazonaws.com/{task['bucket']}/{task['key']}",
+                'RequestCharacters': task['characters']}
+
+
+class _SNS:
+    def __init__(self, aws):
+        self.aws = aws
+
+    def publish(self, TopicArn, Message, **kwargs):
+        self.aws.call('sns', 'publish')
+        return {'MessageId': 'simulated'}
+
+
+_CLIENTS = {'s3': _S3, 'ssm': _SSM, 'lambda': _Lambda, 'transcribe': _Transcribe,
+            'translate': _Translate, 'polly': _Polly, 'sns': _SNS, 'sts': _STS}
+
+
+class SimulatedMedia:
+    """Replaces the driver's ffmpeg/ffprobe steps with placeholder files and latencies."""
+
+    def __init__(self, aws):
+        self.aws = aws
+        self._saved = []
+
+    def _patch(self, module, name, replacement):
+        self._saved.append((module, name, getattr(module, name)))
+        setattr(module, name, replacement)
+
+    def install(self, driver):
+        self._patch(driver, 'split_video_audio', self.split_video_audio)
+        self._patch(driver, 'combine_video_audio', self.combine_video_audio)
+        self._patch(driver, 'cut_media', self.cut_media)
+        self._patch(driver, 'get_media_duration', self.get_media_duration)
+        self._patch(synthesis, 'fit_tempo', self.fit_tempo)
+        self._patch(subtitles, 'mux_subtitles', self.mux_subtitles)
+        self._patch(multitrack, 'mux', self.mux_multitrack)
+        return self
+
+    def uninstall(self):
+        while self._saved:
+            module, name, original = self._saved.pop()
+            setattr(module, name, original)
+
+    def get_media_duration(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return media_header_duration(f.readline())
+        except OSError:
+            return None
+
+    def split_video_audio(self, input_path, video_path, audio_path):
+        duration = self.get_media_duration(input_path) or 0.0
+        self.aws.sleep(self.aws.latency('ffmpeg.split', duration))
+        if video_path:
+            write_media(video_path, duration, f"video:{input_path}")
+        write_media(audio_path, duration, f"audio:{input_path}")
+
+    def combine_video_audio(self, video_path, audio_path, output_path, offset=None):
+        duration = self.get_media_duration(video_path) or 0.0
+        self.aws.sleep(self.aws.latency('ffmpeg.combine', duration))
+        write_media(output_path, duration, f"dubbed:{video_path}")
+
+    def cut_media(self, input_path, start, duration, output_path):
+        self.aws.sleep(self.aws.latency('ffmpeg.remux', duration))
+        write_media(output_path, duration, f"window:{input_path}@{start}")
+
+    def mux_subtitles(self, video_path, srt_path, output_path, language='eng'):
+        duration = self.get_media_duration(video_path) or 0.0
+        self.aws.sleep(self.aws.latency('ffmpeg.remux', duration))
+        write_media(output_path, duration, f"subtitled:{video_path}")
+        return output_path
+
+    def mux_multitrack(self, video_path, audio_tracks, subtitle_tracks, output_path, original_audio_language=None):
+        duration = self.get_media_duration(video_path) or 0.0
+        # Only the dubbed tracks are encoded; video, original audio and subtitles are copied
+        self.aws.sleep(self.aws.latency('ffmpeg.remux', duration)
+                       + len(audio_tracks) * self.aws.latency('ffmpeg.combine', duration))
+        write_media(output_path, duration, f"multilingual:{video_path}")
+        return output_path
+
+    def fit_tempo(self, pcm, slot, sample_rate=synthesis.SAMPLE_RATE, max_tempo=synthesis.MAX_TEMPO):
+        duration = synthesis.pcm_duration(pcm, sample_rate)
+        if slot <= 0 or duration <= slot:
+            return pcm
+        self.aws.sleep(self.aws.latency('ffmpeg.atempo'))
+        factor = min(duration / slot, max_tempo)
+        frames = int(len(pcm) / synthesis.SAMPLE_WIDTH / factor)
+        return pcm[:frames * synthesis.SAMPLE_WIDTH]
@@ -0,0 +1,39 @@
+"""Results of asynchronously invoked handlers, written to S3.
+
+With InvocationType='Event' Lambda accepts the event and returns 202 before
+the handler runs, so the handler's return value is lost. When the event
+names a result_key, a handler wrapped with ``writes_result`` writes
+{"status": "ok", "result": ...} or {"status": "error", "error": ...} to
+s3://<event bucket>/<result_key>, and the driver reads completion from
+there. Events without a result_key (synchronous calls) are not affected.
+
+Errors are recorded rather than raised. Lambda would otherwise retry the
+event twice more, and the driver decides itself whether a stage is retried.
+"""
+import functools
+import json
+import logging
+
+import aws_clients
+
+
+def write_result(bucket, key, record):
+    aws_clients.get_client('s3').put_object(Bucket=bucket, Key=key, Body=json.dumps(record).encode('utf-8'),
+                                            ContentType='application/json')
+
+
+def writes_result(fn):
+    @functools.wraps(fn)
+    def wrapper(event, context):
+        result_key = event.get('result_key')
+        if not result_key:
+            return fn(event, context)
+        try:
+            result = fn(event, context)
+        except Exception as error:
+            logging.exception(f"L: {fn.__name__} failed")
+            write_result(event['bucket'], result_key, {'status': 'error', 'error': f"{type(error).__name__}: {error}"})
+            return None
+        write_result(event['bucket'], result_key, {'status': 'ok', 'result': result})
+        return result
+    return wrapper
@@ -0,0 +1,110 @@
+"""Process-wide boto3 clients, created on first use and then reused.
+
+Creating a client costs tens of milliseconds (loading the service model,
+resolving endpoints and credentials) and each one opens its own connection
+pool, so every caller goes through ``get_client`` instead of
+``boto3.client``. In a Lambda the module stays loaded between invocations of
+a warm container, so the clients, their pools and their kept-alive
+connections are reused across invocations too.
+
+Clients are cached per (service, region). boto3 clients are thread-safe once
+built; building them from a shared Session is not, so construction happens
+under a lock. Every client counts its calls against the current tracing span,
+and the clients of quota-bound services go through ``ratelimit``.
+"""
+import os
+import threading
+from collections import Counter
+
+import ratelimit
+import tracing
+
+# Parallel S3 part uploads and per-sentence Polly calls exceed botocore's default pool of 10
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 32))
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 60
+# 'standard' retries throttling and transient errors with exponential backoff and jitter
+RETRIES = {'max_attempts': int(os.environ.get('AWS_MAX_ATTEMPTS', 5)), 'mode': 'standard'}
+
+_clients = {}
+_lock = threading.Lock()
+_session = None
+_factory = None
+
+# Clients built so far, by service; tests use it to check reuse
+constructions = Counter()
+
+
+def max_attempts(service=None):
+    # Rate-limited services are retried by ratelimit, which must see every throttle
+    return 1 if service and ratelimit.limited(service) else RETRIES['max_attempts']
+
+
+def client_config(service=None):
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        retries=dict(RETRIES, max_attempts=max_attempts(service)),
+        tcp_keepalive=True,
+    )
+
+
+def _new_client(service, region_name):
+    global _session
+    if _session is None:
+        import boto3
+        _session = boto3.session.Session()
+    return _session.client(service, region_name=region_name, config=client_config(service))
+
+
+def default_region():
+    return os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION')
+
+
+def get_client(service, region_name=None):
+    """The shared client for service in region_name (default: the environment's region)."""
+    key = (service, region_name or default_region())
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = ratelimit.wrap(tracing.instrument((_factory or _new_client)(service, key[1])), service)
+                _clients[key] = client
+                constructions[service] += 1
+    return client
+
+
+def prewarm(services, region_name=None):
+    """Build the clients a handler uses while its Lambda container initializes.
+
+    Handler modules call this at module scope. Lambda runs that code once per
+    container, before the first invocation and, with provisioned concurrency,
+    before any request arrives, so the first request no longer pays for
+    importing boto3 and loading the service models. Outside Lambda (driver,
+    tests) nothing is built; LAMBDA_PREWARM=0 turns it off, LAMBDA_PREWARM=1
+    forces it.
+    """
+    setting = os.environ.get('LAMBDA_PREWARM')
+    if setting == '0' or (setting != '1' and not os.environ.get('AWS_LAMBDA_FUNCTION_NAME')):
+        return []
+    return [get_client(service, region_name) for service in services]
+
+
+def set_factory(factory):
+    """Build clients with factory(service, region_name) instead of boto3, e.g. a
+    simulated backend for load tests; None restores boto3. Cached clients are dropped."""
+    global _factory
+    reset()
+    _factory = factory
+
+
+def reset():
+    # Drop every cached client (tests, or after changing credentials)
+    global _session
+    with _lock:
+        _clients.clear()
+        constructions.clear()
+        _session = None
@@ -0,0 +1,313 @@
+"""Client-side rate limiting for the quota-bound services: Transcribe, Translate, Polly.
+
+Every call on a limited client passes two gates:
+
+    token bucket   one per (service, operation), refilled at the allowed rate
+    concurrency    one per service, at most the current limit of calls in flight
+
+Both adapt AIMD-style. A throttling error halves the operation's rate and the
+service's concurrency limit. Every success adds a little back, about one
+token per second and one concurrent call per round of successes, up to the
+configured quota. Throttled and transient failures are retried here with
+full-jitter backoff. Start and create operations are not idempotent: a
+transient failure may have come after the service acted, so they are only
+retried when the request never left (connection errors). botocore's own retries are turned off for these
+services (see ``aws_clients.max_attempts``) so that every throttle reaches
+the limiter instead of being absorbed by botocore.
+
+Quotas default to the AWS defaults and can be overridden with RATE_LIMITS,
+e.g. ``{"polly": 8, "translate.translate_text": 20, "translate.concurrency": 16}``.
+RATE_LIMITS_DISABLED=1 leaves every client unwrapped. Whenever a rate
+changes, the allowed rates and concurrency limits are published as metrics
+(see ``tracing.emit_metrics``), at most once per PUBLISH_INTERVAL.
+
+A Transcribe account quota on concurrent jobs shows up as LimitExceededException
+from start_transcription_job. It is handled like any other throttle.
+"""
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import tracing
+
+# Requests per second per operation, and concurrent calls per service
+DEFAULT_RATES = {'transcribe': 5.0, 'translate': 20.0, 'polly': 8.0}
+DEFAULT_CONCURRENCY = {'transcribe': 8, 'translate': 16, 'polly': 16}
+MIN_RATE = 0.2
+MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', 5))
+# Throttles get more patience than transient errors: the limiter is slowing down meanwhile
+THROTTLE_ATTEMPTS = int(os.environ.get('RATE_LIMIT_ATTEMPTS', 10))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+PUBLISH_INTERVAL = 10.0
+# Throttles of calls that were in flight together are one signal: halve once per cooldown
+DECREASE_COOLDOWN = 1.0
+
+THROTTLE_CODES = {'ThrottlingException', 'Throttling', 'TooManyRequestsException', 'LimitExceededException',
+                  'RequestLimitExceeded', 'ProvisionedThroughputExceededException', 'SlowDown'}
+TRANSIENT_CODES = {'InternalFailure', 'InternalServerException', 'InternalServerError', 'ServiceUnavailable',
+                   'ServiceUnavailableException', 'ServiceFailureException', 'RequestTimeout'}
+TRANSIENT_ERRORS = {'EndpointConnectionError', 'ConnectionClosedError', 'ReadTimeoutError', 'ConnectTimeoutError'}
+# Raised before the request was sent, so retrying cannot run an operation twice
+UNSENT_ERRORS = {'EndpointConnectionError', 'ConnectTimeoutError'}
+# Operations (start_transcription_job, ...) a transient failure may have carried out all the same
+NON_IDEMPOTENT_PREFIXES = ('start_', 'create_')
+# Client attributes that are not single API calls
+PASSTHROUGH = {'get_paginator', 'get_waiter', 'can_paginate', 'close', 'generate_presigned_url'}
+
+
+def error_code(error):
+    # botocore's connection errors carry response=None
+    return (getattr(error, 'response', None) or {}).get('Error', {}).get('Code')
+
+
+def backoff(attempt, rng=random):
+    # Full jitter: uniform between 0 and the capped exponential
+    return rng.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.max_burst = self.burst
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate):
+        # The burst follows the rate: after a throttle, a full burst at the old quota is
+        # the overload that caused it. It grows back with the rate, up to the initial one
+        with self._lock:
+            self._refill(self.clock())
+            self.rate = rate
+            self.burst = min(self.max_burst, max(1.0, rate))
+            self._tokens = min(self._tokens, self.burst)
+
+    def acquire(self):
+        # Take one token, sleeping until there is one; returns the seconds waited
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(self.clock())
+                # Tolerance: a refill that lands a rounding error short of a token would
+                # otherwise ask for a wait too small to move the clock, forever
+                if self._tokens >= 1 - 1e-9:
+                    self._tokens = max(0.0, self._tokens - 1)
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            self.sleep(wait)
+            waited += wait
+
+
+class AIMD:
+    """A value that grows additively and shrinks multiplicatively, within [floor, ceiling]."""
+
+    def __init__(self, ceiling, floor, decrease=0.5):
+        self.ceiling = ceiling
+        self.floor = floor
+        self.decrease = decrease
+        self.value = ceiling
+
+    def increase(self, step):
+        old, self.value = self.value, min(self.ceiling, self.value + step)
+        return self.value != old
+
+    def throttled(self):
+        old, self.value = self.value, max(self.floor, self.value * self.decrease)
+        return self.value != old
+
+
+class ServiceLimiter:
+    def __init__(self, service, rate, concurrency, rates=None, clock=time.monotonic, sleep=time.sleep, rng=None):
+        self.service = service
+        self.default_rate = rate
+        self.rates = dict(rates or {})  # operation -> quota
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.concurrency = AIMD(concurrency, 1)
+        self._buckets = {}
+        self._allowed = {}  # operation -> AIMD rate
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self.calls = 0
+        self.throttles = 0
+        self.retries = 0
+        self.waited = 0.0
+        self._published = None
+        self._decreased = None
+
+    def _operation(self, operation):
+        if operation not in self._buckets:
+            quota = self.rates.get(operation, self.default_rate)
+            self._allowed[operation] = AIMD(quota, min(MIN_RATE, quota))
+            self._buckets[operation] = TokenBucket(quota, clock=self.clock, sleep=self.sleep)
+        return self._buckets[operation], self._allowed[operation]
+
+    def _enter(self, operation):
+        with self._cond:
+            bucket, _ = self._operation(operation)
+        waited = bucket.acquire()
+        with self._cond:
+            while self._in_flight >= int(self.concurrency.value):
+                self._cond.wait()
+            self._in_flight += 1
+            self.calls += 1
+            self.waited += waited
+
+    def _exit(self, operation, throttled=False):
+        with self._cond:
+            self._in_flight -= 1
+            bucket, allowed = self._operation(operation)
+            if throttled:
+                self.throttles += 1
+                now = self.clock()
+                changed = self._decreased is None or now - self._decreased >= DECREASE_COOLDOWN
+                if changed:
+                    self._decreased = now
+                    allowed.throttled()
+                    self.concurrency.throttled()
+            else:
+                changed = allowed.increase(1.0 / max(allowed.value, 1.0))
+                changed |= self.concurrency.increase(1.0 / self.concurrency.value)
+            bucket.set_rate(allowed.value)
+            self._cond.notify_all()
+        if changed:
+            self._publish()
+
+    def call(self, operation, fn, *args, **kwargs):
+        attempt = 0
+        while True:
+            self._enter(operation)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as error:
+                code = error_code(error)
+                throttled = code in THROTTLE_CODES
+                self._exit(operation, throttled=throttled)
+                transient = code in TRANSIENT_CODES or type(error).__name__ in TRANSIENT_ERRORS
+                if operation.startswith(NON_IDEMPOTENT_PREFIXES) and type(error).__name__ not in UNSENT_ERRORS:
+                    transient = False
+                attempts = THROTTLE_ATTEMPTS if throttled else MAX_ATTEMPTS
+                if not (throttled or transient) or attempt + 1 >= attempts:
+                    raise
+                with self._cond:
+                    self.retries += 1
+                delay = backoff(attempt, self.rng)
+                attempt += 1
+                logging.info(f"{self.service}.{operation}: {code or type(error).__name__}, "
+                             f"retrying in {delay:.2f}s (attempt {attempt + 1}/{attempts})")
+                self.sleep(delay)
+                continue
+            self._exit(operation)
+            return result
+
+    def stats(self):
+        with self._cond:
+            return {
+                'concurrency_limit': round(self.concurrency.value, 2),
+                'in_flight': self._in_flight,
+                'calls': self.calls,
+                'throttles': self.throttles,
+                'retries': self.retries,
+                'waited_seconds': round(self.waited, 3),
+                'allowed_rate': {op: round(allowed.value, 2) for op, allowed in sorted(self._allowed.items())},
+            }
+
+    def _publish(self):
+        # Gauge of the allowed rates, rate-limited itself so a throttling storm logs a few lines
+        now = self.clock()
+        with self._cond:
+            if self._published is not None and now - self._published < PUBLISH_INTERVAL:
+                return
+            self._published = now
+            rates = {op: allowed.value for op, allowed in self._allowed.items()}
+            concurrency = self.concurrency.value
+        for operation, rate in rates.items():
+            tracing.emit_metrics({'Service': self.service, 'Operation': operation},
+                                 {'AllowedRate': round(rate, 3), 'ConcurrencyLimit': round(concurrency, 2)},
+                                 {'AllowedRate': 'Count/Second', 'ConcurrencyLimit': 'Count'})
+
+
+class LimitedClient:
+    """A client whose API calls go through a ServiceLimiter; anything else passes through."""
+
+    def __init__(self, client, limiter):
+        self._client = client
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_') or name in PASSTHROUGH or not callable(attr):
+            return attr
+        return functools.partial(self._limiter.call, name, attr)
+
+
+def _quotas():
+    # RATE_LIMITS overrides, as {service: {'rate', 'concurrency', 'operations'}}
+    overrides = json.loads(os.environ.get('RATE_LIMITS') or '{}')
+    quotas = {service: {'rate': rate, 'concurrency': DEFAULT_CONCURRENCY[service], 'operations': {}}
+              for service, rate in DEFAULT_RATES.items()}
+    for name, value in overrides.items():
+        service, _, operation = name.partition('.')
+        quota = quotas.setdefault(service, {'rate': value, 'concurrency': 8, 'operations': {}})
+        if not operation:
+            quota['rate'] = float(value)
+        elif operation == 'concurrency':
+            quota['concurrency'] = int(value)
+        else:
+            quota['operations'][operation] = float(value)
+    return quotas
+
+
+_limiters = {}
+_lock = threading.Lock()
+_clock = (time.monotonic, time.sleep)
+
+
+def limited(service):
+    return os.environ.get('RATE_LIMITS_DISABLED') != '1' and service in _quotas()
+
+
+def limiter(service):
+    # The process-wide limiter of service, shared by every client of it
+    with _lock:
+        if service not in _limiters:
+            quota = _quotas()[service]
+            clock, sleep = _clock
+            _limiters[service] = ServiceLimiter(service, quota['rate'], quota['concurrency'], quota['operations'],
+                                                 clock=clock, sleep=sleep)
+        return _limiters[service]
+
+
+def wrap(client, service):
+    return LimitedClient(client, limiter(service)) if limited(service) else client
+
+
+def stats():
+    with _lock:
+        limiters = dict(_limiters)
+    return {service: limiter.stats() for service, limiter in sorted(limiters.items())}
+
+
+def set_clock(clock, sleep):
+    """Measure and wait in another time base (the load test's simulated seconds); drops the limiters."""
+    global _clock
+    with _lock:
+        _clock = (clock, sleep)
+        _limiters.clear()
+
+
+def reset():
+    set_clock(time.monotonic, time.sleep)
@@ -0,0 +1,127 @@
+"""Upload a byte stream of unknown length to S3 with bounded memory.
+
+Data written to ``MultipartStreamUploader`` is cut into ``part_size`` parts
+that are uploaded concurrently; at most ``max_workers * 2`` parts are held in
+memory at once, ``write`` blocks when that many are in flight. Streams that
+end before the first part fills are sent with a single PutObject. Every part
+carries a SHA-256 checksum that S3 verifies on arrival.
+"""
+import base64
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part but the last
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_WORKERS = 4
+READ_SIZE = 256 * 1024
+
+
+def _b64_sha256(data):
+    return base64.b64encode(hashlib.sha256(data).digest()).decode('ascii')
+
+
+class MultipartStreamUploader:
+    def __init__(self, s3, bucket, key, part_size=DEFAULT_PART_SIZE, max_workers=DEFAULT_WORKERS,
+                 extra_args=None):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.extra_args = extra_args or {}
+        self.sha256 = hashlib.sha256()
+        self.bytes_written = 0
+        self.parts_uploaded = 0
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._futures = []
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max_workers * 2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.bytes_written += len(data)
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._submit(part)
+
+    def _submit(self, part):
+        if self._upload_id is None:
+            response = self.s3.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ChecksumAlgorithm='SHA256', **self.extra_args)
+            self._upload_id = response['UploadId']
+        self._slots.acquire()  # bounded memory: wait for a free in-flight slot
+        number = len(self._futures) + 1
+        future = self._pool.submit(self._upload_part, number, part)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def _upload_part(self, number, data):
+        checksum = _b64_sha256(data)
+        response = self.s3.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=number,
+            Body=data, ChecksumAlgorithm='SHA256', ChecksumSHA256=checksum)
+        self.parts_uploaded += 1
+        return {'PartNumber': number, 'ETag': response['ETag'],
+                'ChecksumSHA256': response.get('ChecksumSHA256', checksum)}
+
+    def close(self):
+        # Flush what is left and finish the object; returns the total bytes written
+        try:
+            if self._upload_id is None:
+                data = bytes(self._buffer)
+                self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=data,
+                                   ChecksumAlgorithm='SHA256', ChecksumSHA256=_b64_sha256(data),
+                                   **self.extra_args)
+            else:
+                if self._buffer:
+                    self._submit(bytes(self._buffer))
+                parts = [future.result() for future in self._futures]
+                self.s3.complete_multipart_upload(
+                    Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                    MultipartUpload={'Parts': parts})
+            self._buffer = bytearray()
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._pool.shutdown(wait=True)
+        return self.bytes_written
+
+    def abort(self):
+        self._pool.shutdown(wait=True)
+        if self._upload_id is not None:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            self._upload_id = None
+
+
+def upload_stream(fileobj, s3, bucket, key, read_size=READ_SIZE, **kwargs):
+    # Copy a readable binary stream (pipe, HTTP body, ...) to S3; returns the uploader
+    with MultipartStreamUploader(s3, bucket, key, **kwargs) as uploader:
+        for chunk in iter(lambda: fileobj.read(read_size), b''):
+            uploader.write(chunk)
+    return uploader
+
+
+def object_exists(s3, bucket, key):
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+        return True
+    except Exception as error:
+        if getattr(error, 'response', {}).get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
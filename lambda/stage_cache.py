@@ -0,0 +1,227 @@
+"""Content-addressed cache for pipeline stage outputs.
+
+Entries live under ``<root>/<namespace>/<key[:2]>/<key>`` and are evicted
+least-recently-used once the directory grows past ``max_bytes``. When an S3
+bucket is configured every put is mirrored to ``<prefix><namespace>/<key>``
+and local misses fall back to S3, so a warm Lambda container, a fresh
+container and the driver all see each other's results.
+
+Keys are hex SHA-256 digests built with the helpers at the bottom:
+    audio digest                        -> Transcribe JSON
+    (source text digest, language pair) -> translation
+    (sentence, voice, format)           -> Polly audio
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+
+TRANSCRIPTS = 'transcript'
+TRANSCRIPTION_JOBS = 'transcription-job'
+TRANSLATIONS = 'translation'
+SPEECH = 'speech'
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+DEFAULT_S3_PREFIX = 'cache/'
+
+
+class StageCache:
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES, s3_bucket=None, s3_prefix=DEFAULT_S3_PREFIX,
+                 s3_client=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.s3_bucket = s3_bucket
+        self.s3_prefix = s3_prefix
+        self._s3_client = s3_client
+        self.hits = Counter()
+        self.misses = Counter()
+        self.s3_hits = Counter()
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # relative path -> size, least recently used first
+        self._size = 0
+        self._load_index()
+
+    def _load_index(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.startswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, os.path.relpath(path, self.root), st.st_size))
+        for _, rel, size in sorted(entries):
+            self._index[rel] = size
+            self._size += size
+
+    @property
+    def s3(self):
+        if self._s3_client is None:
+            import aws_clients
+            self._s3_client = aws_clients.get_client('s3')
+        return self._s3_client
+
+    def _rel(self, namespace, key):
+        return os.path.join(namespace, key[:2], key)
+
+    def _s3_key(self, namespace, key):
+        return f"{self.s3_prefix}{namespace}/{key}"
+
+    def uri(self, namespace, key):
+        if self.s3_bucket:
+            return f"s3://{self.s3_bucket}/{self._s3_key(namespace, key)}"
+        return os.path.join(self.root, self._rel(namespace, key))
+
+    def get(self, namespace, key):
+        rel = self._rel(namespace, key)
+        path = os.path.join(self.root, rel)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = self._get_s3(namespace, key)
+            if data is None:
+                with self._lock:
+                    self.misses[namespace] += 1
+                return None
+            self._store_local(rel, data)
+            with self._lock:
+                self.s3_hits[namespace] += 1
+                self.hits[namespace] += 1
+            return data
+
+        with self._lock:
+            self.hits[namespace] += 1
+            if rel in self._index:
+                self._index.move_to_end(rel)
+        try:
+            os.utime(path)  # keep recency across processes and restarts
+        except FileNotFoundError:
+            pass
+        return data
+
+    def put(self, namespace, key, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._store_local(self._rel(namespace, key), data)
+        if self.s3_bucket:
+            try:
+                self.s3.put_object(Bucket=self.s3_bucket, Key=self._s3_key(namespace, key), Body=data)
+            except Exception as error:
+                logging.warning(f"Cache mirror to s3://{self.s3_bucket} failed: {error}")
+
+    def _get_s3(self, namespace, key):
+        if not self.s3_bucket:
+            return None
+        try:
+            response = self.s3.get_object(Bucket=self.s3_bucket, Key=self._s3_key(namespace, key))
+            return response['Body'].read()
+        except Exception as error:
+            if getattr(error, 'response', {}).get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+                logging.warning(f"Cache lookup in s3://{self.s3_bucket} failed: {error}")
+            return None
+
+    def _store_local(self, rel, data):
+        if len(data) > self.max_bytes:
+            return
+        path = os.path.join(self.root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix='.tmp', dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._size -= self._index.pop(rel, 0)
+            self._index[rel] = len(data)
+            self._size += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._index:
+            rel, size = self._index.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.root, rel))
+            except FileNotFoundError:
+                pass
+
+    @property
+    def size(self):
+        return self._size
+
+    def stats(self):
+        with self._lock:
+            namespaces = set(self.hits) | set(self.misses)
+            return {
+                'bytes': self._size,
+                'entries': len(self._index),
+                'evictions': self.evictions,
+                'namespaces': {ns: {'hits': self.hits[ns], 'misses': self.misses[ns],
+                                    's3_hits': self.s3_hits[ns]} for ns in sorted(namespaces)},
+            }
+
+
+def from_env(default_root, default_bucket=None):
+    # STAGE_CACHE_DIR / STAGE_CACHE_MAX_BYTES / STAGE_CACHE_BUCKET override the defaults,
+    # STAGE_CACHE_DISABLED=1 turns caching off (returns None).
+    if os.environ.get('STAGE_CACHE_DISABLED') == '1':
+        return None
+    return StageCache(
+        os.environ.get('STAGE_CACHE_DIR', default_root),
+        max_bytes=int(os.environ.get('STAGE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+        s3_bucket=os.environ.get('STAGE_CACHE_BUCKET', default_bucket),
+    )
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared(default_root, default_bucket=None):
+    # from_env(), memoized so a warm Lambda container (or a long-lived driver)
+    # keeps its index and counters between invocations
+    with _shared_lock:
+        key = (default_root, default_bucket)
+        if key not in _shared:
+            _shared[key] = from_env(default_root, default_bucket)
+        return _shared[key]
+
+
+####################################
+# Key helpers
+####################################
+
+def digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def transcript_key(audio_digest):
+    return audio_digest
+
+
+def translation_key(src_text, src_lang, dst_lang):
+    return digest(digest(src_text), src_lang, dst_lang)
+
+
+def speech_key(text, voice, output_format):
+    return digest(text, voice, output_format)
@@ -1,78 +1,102 @@
+"""Synthesize the text of an S3 object with Polly, writing the speech to S3.
+
+The driver uploads the English text (SYNTHESIS_MODE=lambda) and invokes this
+function with {"bucket", "synth_file"}. It returns [output key, None], or
+[None, error]; the driver downloads the output key.
+
+Text that fits one SynthesizeSpeech request is streamed from Polly's
+AudioStream into an S3 multipart upload (``s3_stream``), so memory stays at a
+few parts however long the audio is. Such outputs are content-addressed
+(speech/<speech_key>.mp3): text synthesized before is not sent again. Longer
+text becomes a speech synthesis task. Polly writes the audio into the bucket
+itself and notifies SYNTHESIS_TOPIC_ARN when the task ends, and the result
+carries the task id as a third item for the driver to wait on.
+
+Text uploaded under audio/ triggers the function through an S3
+notification; that event gets one result per object.
+"""
 import logging
-import boto3
-import json
 import os
-
-def synthesize_speech(event, context):
-    # Extract bucket and english text from the event payload
-    bucket = event['bucket']
-    english_text = event['synth_file']
-
-    # Create an Amazon polly client
-    polly = boto3.client('polly')
-
-    # Set the voice to a 60-year old man
-    voiceId = 'Mathew'
-
-    logging.info(f"received {english_text} for synthesis")
-
+from urllib.parse import unquote, unquote_plus, urlparse
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+import async_results
+import aws_clients
+import s3_stream
+import stage_cache
+import tracing
+
+VOICE_ID = 'Matthew'  # the driver's synth_voice, so that its cache keys line up
+OUTPUT_FORMAT = 'mp3'
+# SynthesizeSpeech takes up to 3,000 characters, a synthesis task up to 100,000
+SYNC_TEXT_LIMIT = int(os.environ.get('SYNTHESIS_SYNC_LIMIT', 3000))
+TASK_TEXT_LIMIT = 100000
+# Outputs stay away from audio/, whose uploads trigger this function
+S3_SPEECH_PREFIX = "speech/"
+
+# Built once per container, before the first invocation (no-op outside Lambda)
+aws_clients.prewarm(['polly', 's3'])
+
+
+def speech_object_key(text, voice_id):
+    return f"{S3_SPEECH_PREFIX}{stage_cache.speech_key(text, voice_id, OUTPUT_FORMAT)}.{OUTPUT_FORMAT}"
+
+
+def uri_key(output_uri):
+    # Object key of a task's OutputUri (https://s3.<region>.amazonaws.com/<bucket>/<key>)
+    return unquote(urlparse(output_uri).path).lstrip('/').split('/', 1)[1]
+
+
+def synthesize_to_s3(polly, s3, bucket, text, voice_id=VOICE_ID):
+    """Stream the speech of text into the bucket; returns the output key."""
+    key = speech_object_key(text, voice_id)
+    if s3_stream.object_exists(s3, bucket, key):
+        logging.info(f"L: s3://{bucket}/{key} was synthesized before")
+        return key
+    response = polly.synthesize_speech(Text=text, VoiceId=voice_id, OutputFormat=OUTPUT_FORMAT)
+    with tracing.span('speech_upload', key=key) as span:
+        uploader = s3_stream.upload_stream(response['AudioStream'], s3, bucket, key,
+                                           extra_args={'ContentType': response.get('ContentType', 'audio/mpeg')})
+        span.add(bytes=uploader.bytes_written)
+    return key
+
+
+def start_synthesis_task(polly, bucket, text, voice_id=VOICE_ID):
+    # Polly writes the audio to the bucket and notifies the topic; returns (output key, task id)
+    if len(text) > TASK_TEXT_LIMIT:
+        raise ValueError(f"{len(text)} characters is more than a synthesis task takes ({TASK_TEXT_LIMIT})")
+    options = {}
+    if os.environ.get('SYNTHESIS_TOPIC_ARN'):
+        options['SnsTopicArn'] = os.environ['SYNTHESIS_TOPIC_ARN']
+    task = polly.start_speech_synthesis_task(Text=text, VoiceId=voice_id, OutputFormat=OUTPUT_FORMAT,
+                                             OutputS3BucketName=bucket, OutputS3KeyPrefix=S3_SPEECH_PREFIX,
+                                             **options)['SynthesisTask']
+    logging.info(f"L: {len(text)} characters, started synthesis task {task['TaskId']}")
+    return uri_key(task['OutputUri']), task['TaskId']
+
+
+def synthesize_object(bucket, text_key, voice_id=VOICE_ID):
+    # [output key, None], plus the task id while Polly is still writing it; [None, error] on failure
+    logging.info(f"L: Received {text_key} for synthesis")
+    s3 = aws_clients.get_client('s3')
+    polly = aws_clients.get_client('polly')
     try:
-        response = polly.synthesize_speech(
-            Text=english_text,
-            OutputFormat='mp3',
-            VoiceId=voiceId
-        )
-
-        # Get the audio stream from the response
-        audio_stream = response['AudioStream'].read()
-        # Save the audio stream to a file with the same name as input-text
-        # but with .mp3 extension
-        output_filename = os.path.splitext(input_text)[0] + '.mp3'
-        with open(output_filename, 'wb') as file:
-            file.write(audio_stream)
-
-        logging.info(f"Audio stream saved as '{output_filename}'")
-
-        # Return the name of the audio stream
-        return output_filename, None
-
-    except Exception as e:
-        error = f"Error occurred during speech synthesis: {str(e)}"
-        logging.info(error)
-        return None, error
-
-
-
+        text = s3.get_object(Bucket=bucket, Key=text_key)['Body'].read().decode('utf-8')
+        if len(text) <= SYNC_TEXT_LIMIT:
+            return [synthesize_to_s3(polly, s3, bucket, text, voice_id), None]
+        output_key, task_id = start_synthesis_task(polly, bucket, text, voice_id)
+        return [output_key, None, task_id]
+    except (BotoCoreError, ClientError, ValueError) as e:
+        error = f"Error occurred during speech synthesis: {e}"
+        logging.error(error)
+        return [None, error]
+
+
+@async_results.writes_result
+@tracing.handler('synthesize_speech')
 def synthesize_speech(event, context):
-    # Extract the input text from the event payload
-    input_text = event['input_text']
-
-    # Create an Amazon Polly client
-    polly_client = boto3.client('polly')
-
-    # Set the voice ID and output format
-    voice_id = 'Matthew'
-    output_format = 'mp3'
-
-    try:
-        # Synthesize speech
-        response = polly_client.synthesize_speech(
-            Text=input_text,
-            VoiceId=voice_id,
-            OutputFormat=output_format
-        )
-
-        # Get the output URI of the synthesized audio
-        output_uri = response['AudioStream'].name
-
-        # Publish a message to an SNS topic with the output URI
-        sns_client = boto3.client('sns')
-        topic_arn = 'your-sns-topic-arn'
-        message = json.dumps({'output_uri': output_uri})
-        sns_client.publish(TopicArn=topic_arn, Message=message)
-
-        return None
-
-    except Exception as e:
-        error_message = f"Error occurred during speech synthesis: {str(e)}"
-        return error_message
+    if 'Records' in event:
+        return [synthesize_object(record['s3']['bucket']['name'], unquote_plus(record['s3']['object']['key']))
+                for record in event['Records']]
+    return synthesize_object(event['bucket'], event['synth_file'], event.get('voice_id', VOICE_ID))
@@ -0,0 +1,321 @@
+"""Nested timing spans for the driver and the Lambda handlers.
+
+    with tracing.span('upload', job=ws.job_id) as s:
+        s3.upload_file(path, bucket, key)
+        s.add(bytes=os.path.getsize(path))
+
+Every span records its wall time, the bytes its code reported, and the AWS
+API calls made while it was current. API calls are counted by a botocore
+event hook that ``aws_clients`` installs on every client. The bytes sent
+and received are taken from the HTTP bodies. A span's counts include those of
+its children. The current span lives in a ContextVar; worker threads start
+without one, so functions submitted to a pool are wrapped with
+``propagate``.
+
+Finished spans are written as one record each:
+    TRACE_FORMAT=json  JSON lines, appended to TRACE_FILE (or stderr)
+    TRACE_FORMAT=emf   CloudWatch embedded metric format on stdout, so
+                       CloudWatch aggregates Duration/ApiCalls/Bytes per span
+    TRACE_FORMAT=off   nothing
+The default is emf inside Lambda, json when TRACE_FILE is set, and off
+otherwise.
+"""
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+NAMESPACE = os.environ.get('TRACE_NAMESPACE', 'CrossLangVideoTranslator')
+
+_current = contextvars.ContextVar('tracing_span', default=None)
+_write_lock = threading.Lock()
+
+
+def _default_format():
+    if os.environ.get('TRACE_FORMAT'):
+        return os.environ['TRACE_FORMAT']
+    if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+        return 'emf'
+    return 'json' if os.environ.get('TRACE_FILE') else 'off'
+
+
+class Span:
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.attributes = dict(attributes or {})
+        self.bytes = 0
+        self.api_calls = 0
+        self.api_bytes_sent = 0
+        self.api_bytes_received = 0
+        self.error = None
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self._lock = threading.Lock()
+
+    def add(self, bytes=0, **attributes):
+        # Bytes moved by this span's own code (file sizes, payloads) and extra attributes
+        with self._lock:
+            self.bytes += bytes
+            self.attributes.update(attributes)
+
+    def _count_api_call(self, sent, received):
+        span = self
+        while span is not None:
+            with span._lock:
+                span.api_calls += 1
+                span.api_bytes_sent += sent
+                span.api_bytes_received += received
+            span = span.parent
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+        if self.parent is not None and self.bytes:
+            self.parent.add(bytes=self.bytes)
+
+    def record(self):
+        record = {
+            'span': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent.span_id if self.parent else None,
+            'start': round(self.start, 6),
+            'duration_ms': round(self.duration * 1000, 3),
+            'bytes': self.bytes,
+            'api_calls': self.api_calls,
+            'api_bytes_sent': self.api_bytes_sent,
+            'api_bytes_received': self.api_bytes_received,
+        }
+        if self.error:
+            record['error'] = self.error
+        record.update(self.attributes)
+        return record
+
+
+def emf_record(record):
+    # CloudWatch embedded metric format: metrics per span name, the rest as properties
+    emf = dict(record)
+    emf.update({
+        '_aws': {
+            'Timestamp': int(record['start'] * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': NAMESPACE,
+                'Dimensions': [['Span']],
+                'Metrics': [
+                    {'Name': 'Duration', 'Unit': 'Milliseconds'},
+                    {'Name': 'ApiCalls', 'Unit': 'Count'},
+                    {'Name': 'Bytes', 'Unit': 'Bytes'},
+                ],
+            }],
+        },
+        'Span': record['span'],
+        'Duration': record['duration_ms'],
+        'ApiCalls': record['api_calls'],
+        'Bytes': record['bytes'] + record['api_bytes_sent'] + record['api_bytes_received'],
+    })
+    return emf
+
+
+def _write(record, output_format):
+    line = json.dumps(record, default=str)
+    with _write_lock:
+        if output_format == 'emf':
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+            return
+        path = os.environ.get('TRACE_FILE')
+        if path:
+            with open(path, 'a') as f:
+                f.write(line + '\n')
+        else:
+            sys.stderr.write(line + '\n')
+
+
+def emit(record):
+    output_format = _default_format()
+    if output_format != 'off':
+        _write(emf_record(record) if output_format == 'emf' else record, output_format)
+
+
+def emit_metrics(dimensions, metrics, units=None):
+    """Write gauge values that belong to no span, e.g. the rate limiter's allowed rates.
+
+    EMF output makes them CloudWatch metrics with these dimensions. JSON output
+    writes them as a record of type "metrics", which read_records skips.
+    """
+    output_format = _default_format()
+    if output_format == 'off':
+        return
+    record = dict(dimensions, **metrics)
+    record.update({'type': 'metrics', 'time': time.time()})
+    if output_format == 'emf':
+        record['_aws'] = {
+            'Timestamp': int(record['time'] * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': NAMESPACE,
+                'Dimensions': [sorted(dimensions)],
+                'Metrics': [{'Name': name, 'Unit': (units or {}).get(name, 'None')} for name in metrics],
+            }],
+        }
+    _write(record, output_format)
+
+
+class span:
+    """Context manager (and decorator) timing a block as a child of the current span."""
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self._span = Span(self.name, _current.get(), self.attributes)
+        self._token = _current.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        if exc is not None:
+            self._span.error = f"{exc_type.__name__}: {exc}"
+        self._span.finish()
+        emit(self._span.record())
+        return False
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(self.name, **self.attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def current():
+    return _current.get()
+
+
+def propagate(fn):
+    # Run fn (in another thread) as a child of the span current at wrapping time
+    parent = _current.get()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+
+def record_api_call(sent=0, received=0):
+    active = _current.get()
+    if active is not None:
+        active._count_api_call(sent, received)
+
+
+def _body_size(body):
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, bytearray, str)):
+        return len(body)
+    try:
+        return len(body)
+    except TypeError:
+        return 0
+
+
+def _before_call(params=None, **kwargs):
+    # Request bodies are counted here; the response size is added in _after_call
+    context = kwargs.get('context')
+    if context is not None:
+        context['tracing_sent'] = _body_size((params or {}).get('body'))
+
+
+def _after_call(http_response=None, context=None, **kwargs):
+    received = 0
+    if http_response is not None:
+        try:
+            received = int(http_response.headers.get('content-length') or 0)
+        except (TypeError, ValueError):
+            received = 0
+    record_api_call((context or {}).get('tracing_sent', 0), received)
+
+
+def instrument(client):
+    # Count every API call of a botocore client against the current span
+    events = getattr(getattr(client, 'meta', None), 'events', None)
+    if events is not None:
+        events.register('before-call', _before_call)
+        events.register('after-call', _after_call)
+    return client
+
+
+def handler(name):
+    """Decorator for a Lambda handler: one root span per invocation."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(event, context):
+            request_id = getattr(context, 'aws_request_id', None)
+            with span(name, request_id=request_id, cold_start=_cold_start()):
+                return fn(event, context)
+        return wrapper
+    return decorate
+
+
+_invocations = 0
+
+
+def _cold_start():
+    global _invocations
+    _invocations += 1
+    return _invocations == 1
+
+
+def read_records(path):
+    # Span records only; metrics records are skipped
+    with open(path, 'r') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [record for record in records if record.get('type') != 'metrics']
+
+
+def percentile(values, q):
+    # Nearest-rank percentile of a non-empty list
+    ordered = sorted(values)
+    rank = max(1, -(-q * len(ordered) // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(records):
+    """{span name: count, p50/p95/p99/max duration (ms), mean api calls and bytes}."""
+    by_name = defaultdict(list)
+    for record in records:
+        by_name[record['span']].append(record)
+    summary = {}
+    for name, group in sorted(by_name.items()):
+        durations = [r['duration_ms'] for r in group]
+        summary[name] = {
+            'count': len(group),
+            'p50_ms': percentile(durations, 50),
+            'p95_ms': percentile(durations, 95),
+            'p99_ms': percentile(durations, 99),
+            'max_ms': max(durations),
+            'api_calls': round(sum(r['api_calls'] for r in group) / len(group), 2),
+            'bytes': round(sum(r['bytes'] + r['api_bytes_sent'] + r['api_bytes_received']
+                               for r in group) / len(group)),
+            'errors': sum(1 for r in group if r.get('error')),
+        }
+    return summary
+
+
+if __name__ == "__main__":
+    # python lambda/tracing.py trace.jsonl: per-span latency percentiles
+    for span_name, stats in summarize(read_records(sys.argv[1])).items():
+        print(f"{span_name:<32}{stats['count']:>7}  p50 {stats['p50_ms']:>10.1f}ms  "
+              f"p95 {stats['p95_ms']:>10.1f}ms  p99 {stats['p99_ms']:>10.1f}ms  "
+              f"calls {stats['api_calls']:>6}  bytes {stats['bytes']:>10}")
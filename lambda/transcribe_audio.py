@@ -1,24 +1,33 @@
 import os
 import time
-import sys
-import json
-import boto3
 import logging
-import botocore
+from botocore.exceptions import BotoCoreError, ClientError
+
+import async_results
+import aws_clients
+import stage_cache
+import tracing
+
+# Transcripts are written under this prefix, whose S3 notifications go to the stack's TranscriptQueue
+TRANSCRIPTS_PREFIX = "transcripts/"
 
 # Configure logging settings
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def start_transcription_job(bucket, job_name, job_uri, language, service_role_arn):
-    transcribe = boto3.client('transcribe')
+# Built once per container, before the first invocation (no-op outside Lambda)
+aws_clients.prewarm(['transcribe', 's3'])
+
+def start_transcription_job(bucket, job_name, job_uri, language, service_role_arn, media_format='mp3'):
+    transcribe = aws_clients.get_client('transcribe')
 
     try:
         response = transcribe.start_transcription_job(
             TranscriptionJobName=job_name,
             Media={'MediaFileUri': job_uri},
-            MediaFormat='mp3',
+            MediaFormat=media_format,
             LanguageCode=language,
             OutputBucketName=bucket,
+            OutputKey=f"{TRANSCRIPTS_PREFIX}{job_name}.json",
             Settings={
                 "ShowSpeakerLabels": True,
                 "MaxSpeakerLabels": 2
@@ -26,27 +35,61 @@ def start_transcription_job(bucket, job_name, job_uri, language, service_role_ar
             ServiceRoleArn=service_role_arn,
         )
         return response['TranscriptionJob']['TranscriptionJobName']
-    except botocore.exceptions.BotoCoreError as error:
-        print(f"Error starting transcription job: {error}")
+    except (BotoCoreError, ClientError) as error:
+        # ratelimit already retried throttles (and the concurrent-job quota) with backoff;
+        # the driver fails the stage with this error rather than waiting on no job
+        logging.error(f"Error starting transcription job {job_name}: {error}")
+        raise
+
+def cached_transcription_job(cache, audio_digest):
+    # A previous job for the same audio is as good as a new one while Transcribe
+    # still has it (completed jobs are kept for 90 days)
+    job_name = cache.get(stage_cache.TRANSCRIPTION_JOBS, audio_digest)
+    if job_name is None:
         return None
+    job_name = job_name.decode('utf-8')
+    transcribe = aws_clients.get_client('transcribe')
+    try:
+        response = transcribe.get_transcription_job(TranscriptionJobName=job_name)
+    except (BotoCoreError, ClientError):
+        return None
+    if response['TranscriptionJob']['TranscriptionJobStatus'] != 'COMPLETED':
+        return None
+    return job_name
 
 
+@async_results.writes_result
+@tracing.handler('transcribe_audio')
 def handler(event, context):
     # Extract bucket and video key from the event payload
     bucket = event['bucket']
     media = event['media']
 
-    region_name = 'us-west-1'
     logging.info(f"L: Received {media} for transcription")
 
     # Use Amazon Transcribe to transcribe the audio
     language_code = os.environ["LANGUAGE_CODE"]  # Source lang code
     target_language_code = os.environ["TARGET_LANGUAGE_CODE"]  # Dst lang code
 
-    job_name = "tel2engTranscription".format(int(time.time()))
+    # Concurrent jobs need distinct names; the driver passes one per workspace
+    job_name = event.get('job_name') or "tel2engTranscription-{}".format(int(time.time()))
     job_uri  = f"s3://{bucket}/{media}"
     # Transcribe the audio from Telugu to English
     service_role_arn = os.environ.get('TRANSCRIBE_ROLE_ARN')
-    jobName = start_transcription_job(bucket, job_name, job_uri, language_code, service_role_arn)
+
+    cache = stage_cache.shared('/tmp/stage-cache', bucket)
+    audio_digest = event.get('audio_sha256')
+    if cache and audio_digest:
+        jobName = cached_transcription_job(cache, audio_digest)
+        if jobName:
+            logging.info(f"L: Reusing transcription job {jobName} for identical audio")
+            return jobName
+
+    # mp3 unless the driver stream-copied another Transcribe-compatible codec
+    media_format = event.get('media_format', 'mp3')
+    jobName = start_transcription_job(bucket, job_name, job_uri, language_code, service_role_arn,
+                                      media_format)
+    if cache and audio_digest and jobName:
+        cache.put(stage_cache.TRANSCRIPTION_JOBS, audio_digest, jobName)
     logging.info(f"L: Transcription started: {jobName}")
     return  jobName
@@ -0,0 +1,30 @@
+"""Read and write the timecoded transcript lines (``HH:MM:SS: text``).
+
+transcribe_job in the driver writes one aligned sentence per line in this
+format; the Lambdas and later stages parse it back with ``parse_lines``.
+"""
+import re
+
+TIMECODE_RE = re.compile(r'^(\d{2,}:\d{2}:\d{2}): ?(.*)$')
+
+
+def parse_lines(text):
+    # [(timecode or None, text)] for every line of a transcript
+    lines = []
+    for line in text.splitlines():
+        match = TIMECODE_RE.match(line)
+        if match:
+            lines.append((match.group(1), match.group(2)))
+        else:
+            lines.append((None, line))
+    return lines
+
+
+def format_lines(lines):
+    return ''.join(f"{timecode}: {text}\n" if timecode is not None else f"{text}\n"
+                   for timecode, text in lines)
+
+
+def timecode_to_seconds(timecode):
+    hours, minutes, seconds = timecode.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
@@ -1,46 +1,173 @@
 import os
-import time
-import sys
-import json
-import boto3
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import async_results
+import aws_clients
+import stage_cache
+import tracing
+import translation_memory
+from transcript_lines import format_lines, parse_lines
 
 # Configure logging settings
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# TranslateText accepts at most 10,000 bytes of UTF-8 per request; keep some headroom
+MAX_REQUEST_BYTES = int(os.environ.get('TRANSLATE_MAX_BYTES', 9000))
+MAX_WORKERS = int(os.environ.get('TRANSLATE_CONCURRENCY', 8))
+TRANSLATE_REGION = "us-west-1"
+
+# Built once per container, before the first invocation (no-op outside Lambda)
+aws_clients.prewarm(['s3'])
+aws_clients.prewarm(['translate'], region_name=TRANSLATE_REGION)
+
+
+def split_oversized(text, max_bytes):
+    # Break a single line that is too long for one request at word boundaries
+    pieces, current = [], ''
+    for word in text.split():
+        candidate = f"{current} {word}" if current else word
+        if len(candidate.encode('utf-8')) <= max_bytes:
+            current = candidate
+            continue
+        if current:
+            pieces.append(current)
+        while len(word.encode('utf-8')) > max_bytes:
+            cut = max_bytes
+            while len(word[:cut].encode('utf-8')) > max_bytes:
+                cut -= 1
+            pieces.append(word[:cut])
+            word = word[cut:]
+        current = word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def pack_batches(texts, max_bytes=MAX_REQUEST_BYTES):
+    """Group segment texts into newline-joined requests under max_bytes.
 
+    Returns [[(segment index, text), ...], ...]; an oversized segment is
+    split into several pieces that share its index. Empty segments are
+    skipped, there is nothing to translate.
+    """
+    batches, batch, batch_bytes = [], [], 0
+    for index, text in enumerate(texts):
+        if not text.strip():
+            continue
+        for piece in split_oversized(text, max_bytes):
+            size = len(piece.encode('utf-8')) + 1  # joining newline
+            if batch and batch_bytes + size > max_bytes:
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append((index, piece))
+            batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def translate_batch(translate, texts, language_code, target_language_code, cache=None):
+    # Translate newline-joined segments in one request, one result per input text
+    joined = '\n'.join(texts)
+    key = stage_cache.translation_key(joined, language_code, target_language_code)
+    cached = cache.get(stage_cache.TRANSLATIONS, key) if cache else None
+    if cached is not None:
+        translated = cached.decode('utf-8').split('\n')
+        if len(translated) == len(texts):
+            return translated
+
+    response = translate.translate_text(
+        Text = joined,
+        SourceLanguageCode=language_code,
+        TargetLanguageCode=target_language_code
+    )
+    translated = response.get('TranslatedText').split('\n')
+    if len(translated) != len(texts):
+        if len(texts) == 1:
+            translated = [' '.join(translated)]
+        else:
+            # Translate merged or split lines; fall back to one request per segment
+            logging.info(f"L: Batch of {len(texts)} came back as {len(translated)} lines, retrying per line")
+            translated = [translate_batch(translate, [text], language_code, target_language_code, cache)[0]
+                          for text in texts]
+    if cache:
+        cache.put(stage_cache.TRANSLATIONS, key, '\n'.join(translated))
+    return translated
+
+
+def translate_segments(translate, texts, language_code, target_language_code,
+                       max_bytes=MAX_REQUEST_BYTES, max_workers=MAX_WORKERS, cache=None, memory=None,
+                       exact_memory=False):
+    # Translate every segment text, batches in parallel; output aligns with texts.
+    # Segments found in the translation memory are not sent to Translate.
+    translated = [''] * len(texts)
+    remembered = [memory.lookup(text, exact_memory) if memory is not None and text.strip() else None
+                  for text in texts]
+    for index, result in enumerate(remembered):
+        if result is not None:
+            translated[index] = result
+    batches = pack_batches([text if result is None else '' for text, result in zip(texts, remembered)],
+                           max_bytes)
+    if not batches:
+        return translated
+
+    def run(batch):
+        return translate_batch(translate, [piece for _, piece in batch],
+                               language_code, target_language_code, cache)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as pool:
+        for batch, results in zip(batches, pool.map(tracing.propagate(run), batches)):
+            for (index, _), result in zip(batch, results):
+                translated[index] = f"{translated[index]} {result}" if translated[index] else result
+    if memory is not None:
+        for text, result, new in zip(texts, remembered, translated):
+            if result is None and text.strip():
+                memory.add(text, new)
+    return translated
+
+
+@async_results.writes_result
+@tracing.handler('translate_text')
 def handler(event, context):
     # Extract bucket and video key from the event payload
     bucket = event['bucket']
     src_text = event['src_text']
     dst_text = event['dst_text']
 
-    region_name = 'us-west-1'
-    logging.info(f"L: Received {media} for transcription")
+    logging.info(f"L: Received {src_text} for translation")
 
-    # Use Amazon Transcribe to transcribe the audio
+    # Use Amazon Translate to translate the timecoded transcript
     language_code = os.environ["LANGUAGE_CODE"]  # Source lang code
-    target_language_code = os.environ["TARGET_LANGUAGE_CODE"]  # Dst lang code
+    # Dst lang code; a multi-language run names the target in the event
+    target_language_code = event.get("target_language_code") or os.environ["TARGET_LANGUAGE_CODE"]
 
-    s3 = boto3.client('s3')
-    translate = boto3.client("translate", region_name = "us-west-1")
+    # Shared clients: a warm container reuses them and their open connections
+    s3 = aws_clients.get_client('s3')
+    translate = aws_clients.get_client("translate", region_name=TRANSLATE_REGION)
 
     # Get Telugu text from the file in S3
     response = s3.get_object(Bucket=bucket, Key=src_text)
     src_content = response["Body"].read().decode('utf-8')
 
-    # Translate the text from src to dst lang
-    response = translate.translate_text(
-        Text = src_content,
-        SourceLanguageCode=language_code,
-        TargetLanguageCode=target_language_code
-    )
-    dst_content = result.get('TranslatedText')
+    # Translate only the text of each "HH:MM:SS: text" line, keeping the timecodes
+    lines = parse_lines(src_content)
+    cache = stage_cache.shared('/tmp/stage-cache', bucket)
+    memory = translation_memory.shared(s3, bucket, language_code, target_language_code)
+    # Edited lines are corrections: a near-identical sentence's translation is the one being corrected
+    translated = translate_segments(translate, [text for _, text in lines],
+                                    language_code, target_language_code, cache=cache, memory=memory,
+                                    exact_memory=event.get("translation_memory") == "exact")
+    if memory is not None:
+        with tracing.span('translation_memory_save') as span:
+            span.add(added=memory.save(), **memory.stats())
+        logging.info(f"L: Translation memory: {memory.stats()}")
+    dst_content = format_lines((timecode, text) for (timecode, _), text in zip(lines, translated))
 
     # Save the English text to a new file in S3
     s3.put_object(Bucket=bucket, Key=dst_text, Body=dst_content.encode('utf-8'))
 
-    logging.info(f"L: Translation done: {dst_text}")
+    logging.info(f"L: Translation done: {dst_text} ({len(lines)} lines)")
 
     # Return the name of the English text file
     return dst_text
@@ -0,0 +1,235 @@
+"""Translation memory: source sentences already translated, per language pair.
+
+News and political videos repeat the same slogans and phrases, so most
+sentences of a new video were translated before. A lookup tries two indexes:
+
+    exact    normalized sentence (case, spacing and punctuation removed, except
+             a final "?" or "!": "Yes." and "Yes?" translate differently)
+    similar  MinHash signatures of character trigrams, banded for LSH. Only
+             sentences sharing a band are compared, and a candidate is used
+             when its trigram Jaccard similarity is at least ``threshold``.
+
+Each language pair is one JSON-lines object in the audio bucket
+(``translation-memory/te-IN-en.jsonl``). A warm container keeps it in
+memory. New entries are merged into the object at the end of an invocation.
+The write is conditional on the ETag that was merged into, so when another
+invocation saved in between, the merge starts over instead of replacing its
+entries.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from collections import Counter, defaultdict
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_S3_PREFIX = 'translation-memory/'
+NUM_HASHES = 64
+BANDS = 16  # 4 rows per band: pairs with Jaccard 0.9 share a band with probability ~1
+SHINGLE = 3
+SAVE_ATTEMPTS = 5
+# A conditional write that lost to another one (or found the object gone)
+CONFLICT_CODES = ('PreconditionFailed', 'ConditionalRequestConflict', 'NoSuchKey', '412', '409', '404')
+
+_PRIME = (1 << 61) - 1
+# Fixed (a, b) pairs so signatures are the same in every process
+_COEFFICIENTS = [((i * 0x9E3779B97F4A7C15 + 1) % _PRIME, (i * 0xC2B2AE3D27D4EB4F + 7) % _PRIME)
+                 for i in range(1, NUM_HASHES + 1)]
+_PUNCTUATION = re.compile(r'[^\w\s]')
+# Sentence-final marks kept in the exact key, looked for after the last word
+_FINAL_MARKS = '?!'
+_TAIL = re.compile(r'\W*$')
+
+
+def error_code(error):
+    return (getattr(error, 'response', None) or {}).get('Error', {}).get('Code')
+
+
+def normalize(text):
+    # Same key for "Jai Hind!" and "jai  HIND !", another for "Jai Hind?"; works for any script
+    text = unicodedata.normalize('NFKC', text).casefold()
+    words = ' '.join(_PUNCTUATION.sub(' ', text).split())
+    if not words:
+        return words
+    tail = _TAIL.search(text).group()
+    return words + ''.join(mark for mark in _FINAL_MARKS if mark in tail)
+
+
+def shingles(normalized):
+    padded = f" {normalized} "
+    if len(padded) <= SHINGLE:
+        return {padded}
+    return {padded[i:i + SHINGLE] for i in range(len(padded) - SHINGLE + 1)}
+
+
+def signature(shingle_set):
+    hashes = [zlib.crc32(shingle.encode('utf-8')) for shingle in shingle_set]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _COEFFICIENTS]
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class TranslationMemory:
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.entries = {}  # normalized source -> (source, translation)
+        self._shingles = {}
+        self._bands = defaultdict(set)  # (band, band hash) -> normalized sources
+        self._new = {}
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _band_keys(self, shingle_set):
+        sig = signature(shingle_set)
+        rows = NUM_HASHES // BANDS
+        return [(band, hash(tuple(sig[band * rows:(band + 1) * rows]))) for band in range(BANDS)]
+
+    def add(self, source, translation, new=True):
+        key = normalize(source)
+        if not key:
+            return
+        with self._lock:
+            if key not in self.entries:
+                shingle_set = shingles(key)
+                self._shingles[key] = shingle_set
+                for band_key in self._band_keys(shingle_set):
+                    self._bands[band_key].add(key)
+            self.entries[key] = (source, translation)
+            if new:
+                self._new[key] = (source, translation)
+
+    def lookup(self, source, exact=False):
+        # Translation of source or (unless exact) of a near-identical sentence, None on a miss
+        key = normalize(source)
+        with self._lock:
+            if key in self.entries:
+                self.counts['exact'] += 1
+                return self.entries[key][1]
+            if not exact and self.threshold < 1.0 and key:
+                shingle_set = shingles(key)
+                candidates = set()
+                for band_key in self._band_keys(shingle_set):
+                    candidates |= self._bands.get(band_key, set())
+                best, score = None, self.threshold
+                for candidate in candidates:
+                    similarity = jaccard(shingle_set, self._shingles[candidate])
+                    if similarity >= score:
+                        best, score = candidate, similarity
+                if best is not None:
+                    self.counts['similar'] += 1
+                    return self.entries[best][1]
+            self.counts['miss'] += 1
+            return None
+
+    def stats(self):
+        with self._lock:
+            lookups = sum(self.counts.values())
+            hits = self.counts['exact'] + self.counts['similar']
+            return {
+                'entries': len(self.entries),
+                'lookups': lookups,
+                'exact_hits': self.counts['exact'],
+                'similar_hits': self.counts['similar'],
+                'misses': self.counts['miss'],
+                'hit_rate': round(hits / lookups, 3) if lookups else None,
+            }
+
+    # persistence
+    def load_lines(self, data):
+        for line in data.decode('utf-8').splitlines():
+            if line.strip():
+                source, translation = json.loads(line)
+                self.add(source, translation, new=False)
+
+    def dump_lines(self):
+        with self._lock:
+            entries = list(self.entries.values())
+        return ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries).encode('utf-8')
+
+    def take_new(self):
+        with self._lock:
+            new, self._new = self._new, {}
+            return new
+
+
+class S3TranslationMemory(TranslationMemory):
+    """A TranslationMemory backed by one object in the audio bucket."""
+
+    def __init__(self, s3, bucket, src_lang, dst_lang, threshold=DEFAULT_THRESHOLD, prefix=DEFAULT_S3_PREFIX):
+        super().__init__(threshold)
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = f"{prefix}{src_lang}-{dst_lang}.jsonl"
+        self.refresh()
+
+    def _read(self):
+        # (data, ETag) of the stored object, (None, None) if there is none or it cannot be read
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=self.key)
+            return response['Body'].read(), response.get('ETag')
+        except Exception as error:
+            if error_code(error) not in ('NoSuchKey', '404'):
+                logging.warning(f"Translation memory s3://{self.bucket}/{self.key} not loaded: {error}")
+            return None, None
+
+    def refresh(self):
+        # Returns the ETag of what was loaded
+        data, etag = self._read()
+        if data:
+            self.load_lines(data)
+        return etag
+
+    def save(self):
+        # Merge this invocation's entries into the stored object. Returns how many were
+        # written: 0 without new ones, and 0 when the write failed
+        new = self.take_new()
+        if not new:
+            return 0
+        for attempt in range(SAVE_ATTEMPTS):
+            etag = self.refresh()
+            for source, translation in new.values():
+                self.add(source, translation, new=False)
+            # Only over the version just merged, or only if there still is none
+            condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+            try:
+                self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=self.dump_lines(), **condition)
+                return len(new)
+            except Exception as error:
+                if error_code(error) in CONFLICT_CODES:
+                    logging.info(f"Translation memory s3://{self.bucket}/{self.key} changed meanwhile, merging again")
+                    continue
+                logging.warning(f"Translation memory s3://{self.bucket}/{self.key} not saved: {error}")
+                break
+        else:
+            logging.warning(f"Translation memory s3://{self.bucket}/{self.key} not saved: "
+                            f"{SAVE_ATTEMPTS} concurrent writes in a row")
+        # Kept for the next save of this container
+        with self._lock:
+            self._new.update(new)
+        return 0
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared(s3, bucket, src_lang, dst_lang):
+    # TRANSLATION_MEMORY_THRESHOLD sets the similarity (1.0: exact matches only),
+    # TRANSLATION_MEMORY_DISABLED=1 turns the memory off (returns None). Memoized
+    # so a warm container keeps its entries and counters.
+    if os.environ.get('TRANSLATION_MEMORY_DISABLED') == '1':
+        return None
+    with _shared_lock:
+        key = (bucket, src_lang, dst_lang)
+        if key not in _shared:
+            threshold = float(os.environ.get('TRANSLATION_MEMORY_THRESHOLD', DEFAULT_THRESHOLD))
+            _shared[key] = S3TranslationMemory(s3, bucket, src_lang, dst_lang, threshold,
+                                               os.environ.get('TRANSLATION_MEMORY_PREFIX', DEFAULT_S3_PREFIX))
+        return _shared[key]
@@ -0,0 +1,10 @@
+"""Helpers that let the Telugu-to-English driver run as a library and at scale."""
+import os
+import sys
+
+# Modules shared with the Lambda functions live in lambda/ (the Lambda asset
+# root, where they are top-level modules). Make them importable the same way
+# on the driver side.
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda")
+if LAMBDA_DIR not in sys.path:
+    sys.path.append(LAMBDA_DIR)
@@ -0,0 +1,371 @@
+"""Streaming transcript parsing and array-backed sentence alignment.
+
+``iter_transcript_items`` walks a Transcribe result document chunk by chunk
+and yields only the entries of ``results.items``; everything else (the full
+transcript string, speaker_labels, ...) is skipped without being built.
+``ItemTable`` packs the items into NumPy arrays: start/end times, numeric
+confidence, type codes, and offsets into one UTF-8 content buffer.
+
+``align_table`` reproduces ``align_sentences`` exactly. A line breaks at the
+first timed item that starts more than ``step_size`` after the line's start
+time, or that arrives once the line is longer than ``maxline_len``
+characters. Both conditions are monotonic in the item index, so each break is
+found with a binary search over prefix sums instead of a per-item loop.
+"""
+import bisect
+import codecs
+import json
+import math
+import re
+from array import array
+
+import numpy as np
+
+PRONUNCIATION = 0
+PUNCTUATION = 1
+OTHER = 2
+KIND_CODES = {'pronunciation': PRONUNCIATION, 'punctuation': PUNCTUATION}
+
+READ_SIZE = 1 << 16
+
+_WS_RE = re.compile(r'[ \t\n\r]*')
+_STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_SKIP_RE = re.compile(r'(?:[^"{}\[\]]+|"(?:[^"\\]|\\.)*")*', re.DOTALL)
+
+
+class _Scanner:
+    # Pull-based JSON tokenizer over an iterable of str/bytes chunks
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        for chunk in self._chunks:
+            if isinstance(chunk, (bytes, bytearray, memoryview)):
+                chunk = self._decoder.decode(bytes(chunk))
+            if chunk:
+                self.buf = self.buf[self.pos:] + chunk
+                self.pos = 0
+                return True
+        tail = self._decoder.decode(b'', final=True)
+        self.buf = self.buf[self.pos:] + tail
+        self.pos = 0
+        self.eof = True
+        return bool(tail)
+
+    def peek(self):
+        while True:
+            self.pos = _WS_RE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof or not self._fill():
+                if self.pos < len(self.buf):
+                    continue
+                raise ValueError("Unexpected end of transcript JSON")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos} of transcript JSON")
+        self.pos += 1
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buf, self.pos)
+                # a number cut at the buffer edge decodes too; only trust it with a following char
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def read_string(self):
+        if self.peek() != '"':
+            raise ValueError(f"Expected a string at offset {self.pos} of transcript JSON")
+        while True:
+            match = _STRING_RE.match(self.buf, self.pos)
+            if match:
+                self.pos = match.end()
+                return json.loads(match.group(0))
+            if self.eof or not self._fill():
+                raise ValueError("Unterminated string in transcript JSON")
+
+    def skip_value(self):
+        if self.peek() not in '{[':
+            self.read_value()
+            return
+        depth = 0
+        while True:
+            # everything up to the next bracket outside a string, in one regex step
+            end = _SKIP_RE.match(self.buf, self.pos).end()
+            if end == len(self.buf) or self.buf[end] == '"':
+                # the buffer ends inside the value or inside a string: read on
+                self.pos = end
+                if self.eof or not self._fill():
+                    raise ValueError("Unexpected end of transcript JSON")
+                continue
+            self.pos = end + 1
+            depth += 1 if self.buf[end] in '{[' else -1
+            if depth == 0:
+                return
+
+    def object_keys(self):
+        # Yields each key of the object starting here; the caller consumes the value
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.read_string()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+
+    def array_values(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.read_value()
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect(']')
+            return
+
+
+def iter_transcript_items(chunks):
+    """Yield the dicts of results.items from a Transcribe JSON given as chunks."""
+    scanner = _Scanner(chunks)
+    for key in scanner.object_keys():
+        if key != 'results':
+            scanner.skip_value()
+            continue
+        for result_key in scanner.object_keys():
+            if result_key == 'items':
+                yield from scanner.array_values()
+            else:
+                scanner.skip_value()
+
+
+def iter_file_chunks(path, read_size=READ_SIZE):
+    with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(read_size), b'')
+
+
+class ItemTable:
+    """Transcribe items as parallel arrays (NaN for a missing time/confidence)."""
+
+    def __init__(self, start, end, confidence, kind, content, offsets, char_len):
+        self.start = start
+        self.end = end
+        self.confidence = confidence
+        self.kind = kind
+        self.content = content      # uint8 UTF-8 buffer of every item's first alternative
+        self.offsets = offsets      # item i's content is content[offsets[i]:offsets[i + 1]]
+        self.char_len = char_len    # length in characters, as len() would count it
+
+    def __len__(self):
+        return len(self.kind)
+
+    @classmethod
+    def from_items(cls, items):
+        start, end, confidence = array('d'), array('d'), array('d')
+        kind = array('B')
+        offsets = array('q', [0])
+        char_len = array('q')
+        content = bytearray()
+        nan = math.nan
+        for item in items:
+            value = item.get('start_time')
+            start.append(float(value) if value is not None else nan)
+            value = item.get('end_time')
+            end.append(float(value) if value is not None else nan)
+            kind.append(KIND_CODES.get(item.get('type'), OTHER))
+            alternatives = item.get('alternatives')
+            if alternatives:
+                text = alternatives[0].get('content', '')
+                value = alternatives[0].get('confidence')
+                confidence.append(float(value) if value is not None else nan)
+            else:
+                text = ''
+                confidence.append(nan)
+            content += text.encode('utf-8')
+            offsets.append(len(content))
+            char_len.append(len(text))
+        return cls(np.frombuffer(start, dtype=np.float64), np.frombuffer(end, dtype=np.float64),
+                   np.frombuffer(confidence, dtype=np.float64), np.frombuffer(kind, dtype=np.uint8),
+                   np.frombuffer(bytes(content), dtype=np.uint8), np.frombuffer(offsets, dtype=np.int64),
+                   np.frombuffer(char_len, dtype=np.int64))
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        return cls.from_items(iter_transcript_items(chunks))
+
+    def item_content(self, i):
+        return self.content[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def remap(self, time_map):
+        # Copy with times mapped through a preprocess.TimeMap (processed -> original)
+        if not time_map or not time_map.segments:
+            return self
+        processed = np.array([segment[0] for segment in time_map.segments])
+        original = np.array([segment[1] for segment in time_map.segments])
+
+        def to_original(times):
+            index = np.clip(np.searchsorted(processed, times, side='right') - 1, 0, len(processed) - 1)
+            # round like TimeMap.remap_items, which writes times with 3 decimals
+            return np.round(original[index] + (times - processed[index]), 3)
+
+        return ItemTable(to_original(self.start), to_original(self.end), self.confidence, self.kind,
+                         self.content, self.offsets, self.char_len)
+
+
+def _render(table, accepted, pron):
+    # One buffer holding " word" for accepted words and "," for accepted punctuation,
+    # plus R, the offset of every item in it; a line is then a single slice.
+    byte_len = np.diff(table.offsets)
+    kept_len = np.where(accepted, byte_len, 0)
+    kept = table.content[np.repeat(accepted, byte_len)]
+    kept_offsets = np.concatenate(([0], np.cumsum(kept_len)[:-1]))
+    out = np.insert(kept, kept_offsets[pron], ord(' '))
+    R = np.zeros(len(table) + 1, dtype=np.int64)
+    np.cumsum(kept_len + pron, out=R[1:])
+    return out, R
+
+
+def _align_scalar(table, step_size, maxline_len, confidence):
+    # Item-by-item reference (used when start times are not sorted)
+    aligned, sentence = [], []
+    curline_len, start_time = 0, 0.0
+    for i in range(len(table)):
+        item_start = table.start[i]
+        if not math.isnan(item_start):
+            if item_start - start_time > step_size or curline_len > maxline_len:
+                aligned.append({"time": start_time, "line": " ".join(sentence)})
+                sentence, curline_len, start_time = [], 0, float(item_start)
+        accepted = table.confidence[i] > confidence
+        if table.kind[i] == PRONUNCIATION and accepted:
+            sentence.append(table.item_content(i))
+            curline_len += int(table.char_len[i]) + 1
+        elif table.kind[i] == PUNCTUATION and sentence and accepted:
+            sentence[-1] += table.item_content(i)
+            curline_len += int(table.char_len[i]) + 1
+    if sentence:
+        aligned.append({"time": start_time, "line": " ".join(sentence)})
+    return aligned
+
+
+def _first_later(times, line_start, step_size, lo):
+    # First k >= lo with times[k] - line_start > step_size. The search uses
+    # line_start + step_size, which can round differently from the subtraction
+    # align_sentences does, so the neighbours are checked with the exact test.
+    k = max(lo, bisect.bisect_right(times, line_start + step_size))
+    while k > lo and times[k - 1] - line_start > step_size:
+        k -= 1
+    while k < len(times) and not times[k] - line_start > step_size:
+        k += 1
+    return k
+
+
+def align_table(table, step_size, maxline_len, confidence=0.0):
+    """[{"time": start, "line": text}] exactly as align_sentences builds them."""
+    n = len(table)
+    if n == 0:
+        return []
+    timed_idx = np.flatnonzero(~np.isnan(table.start))
+    times = table.start[timed_idx]
+    if np.any(np.diff(times) < 0) or (len(times) and times[0] < 0):
+        return _align_scalar(table, step_size, maxline_len, confidence)
+
+    accepted = (table.confidence > confidence) & (table.kind != OTHER)
+    pron = accepted & (table.kind == PRONUNCIATION)
+    punct = accepted & (table.kind == PUNCTUATION)
+    pron_idx = np.flatnonzero(pron)
+
+    # C[j]: characters added by items before j; PC[j]: the punctuation share of it.
+    # Punctuation before a line's first word is dropped, so for a line starting at s
+    # whose first word is f, the length seen when item j > f arrives is
+    # C[j] - C[s] - (PC[f] - PC[s]), and 0 before that.
+    contrib = np.where(accepted, table.char_len + 1, 0)
+    C = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(contrib, out=C[1:])
+    PC = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.where(punct, contrib, 0), out=PC[1:])
+    C_timed = C[timed_idx]
+
+    # limit[s]: a line whose first item is s breaks at the first timed item with C above it
+    next_word = np.searchsorted(pron_idx, np.arange(n))
+    has_word = next_word < len(pron_idx)
+    f = pron_idx[np.minimum(next_word, len(pron_idx) - 1)] if len(pron_idx) else np.arange(n)
+    limit = np.where(has_word, C[:n] + (PC[f] - PC[:n]) + maxline_len, np.iinfo(np.int64).max)
+
+    # A gap longer than step_size between neighbouring timed items always breaks the
+    # line (the line started at or before the earlier item), so those breaks are found
+    # for the whole transcript at once. They cut it into runs; a run is one line
+    # unless its own span or length calls for more breaks inside it.
+    gap = np.empty(len(times), dtype=bool)
+    if len(times):
+        gap[0] = times[0] - 0.0 > step_size
+        gap[1:] = np.diff(times) > step_size
+    forced = np.flatnonzero(gap)
+    run_k = np.concatenate(([0], forced))                      # timed position that opened each run
+    run_s = np.concatenate(([0], timed_idx[forced]))           # first item of each run
+    run_time = np.concatenate(([0.0], times[forced]))          # line start time of each run
+    run_end_k = np.append(forced, len(times))                  # run ends before this timed position
+    run_lo = run_k + np.concatenate(([0], np.ones(len(forced), dtype=np.int64)))
+    last_k = run_end_k - 1                                     # last timed position inside the run
+    complex_run = np.zeros(len(run_s), dtype=bool)
+    if len(times):
+        last_k = np.maximum(last_k, 0)
+        complex_run = (run_end_k - 1 >= run_lo) & ((times[last_k] - run_time > step_size) |
+                                                   (C_timed[last_k] > limit[run_s]))
+
+    # Walk only the runs that need inner breaks, line by line, with bisect on plain lists
+    inner_starts, inner_times = [], []
+    complex_runs = np.flatnonzero(complex_run)
+    if len(complex_runs):
+        times_list, C_list = times.tolist(), C_timed.tolist()
+        timed_list, limit_list = timed_idx.tolist(), limit.tolist()
+    for r in complex_runs.tolist():
+        s, line_start, lo, end_k = int(run_s[r]), float(run_time[r]), int(run_lo[r]), int(run_end_k[r])
+        while True:
+            k = min(_first_later(times_list, line_start, step_size, lo),
+                    max(lo, bisect.bisect_right(C_list, limit_list[s])))
+            if k >= end_k:
+                break
+            s, line_start, lo = timed_list[k], times_list[k], k + 1
+            inner_starts.append(s)
+            inner_times.append(line_start)
+    starts = np.concatenate((run_s, np.array(inner_starts, dtype=np.int64)))
+    times_out = np.concatenate((run_time, np.array(inner_times, dtype=np.float64)))
+    order = np.argsort(starts, kind='stable')
+    starts, times_out = starts[order], times_out[order].tolist()
+
+    # Line i covers items [starts[i], starts[i + 1]) and begins at its first accepted word
+    text, R = _render(table, accepted, pron)
+    text = text.tobytes()
+    ends = np.append(starts[1:], n)
+    k = np.searchsorted(pron_idx, starts)
+    first = pron_idx[np.minimum(k, max(len(pron_idx) - 1, 0))] if len(pron_idx) else starts
+    non_empty = (k < len(pron_idx)) & (first < ends)
+    text_from = np.where(non_empty, R[first] + 1, 0).tolist()
+    text_to = np.where(non_empty, R[ends], 0).tolist()
+
+    aligned = [{"time": t, "line": text[a:b].decode('utf-8')}
+               for t, a, b in zip(times_out, text_from, text_to)]
+    if not non_empty[-1]:
+        aligned.pop()  # the last line is only written when it has words
+    return aligned
@@ -0,0 +1,132 @@
+"""Run many videos through the pipeline concurrently.
+
+Each video gets its own Workspace. The ffmpeg stages (split/combine) run in a
+process pool, the AWS stages (upload, Lambda invokes, Transcribe wait) run in
+a thread pool whose size is the concurrency limit.
+
+    python -m pipeline.batch --input-dir ./mediadir --concurrency 16
+    python -m pipeline.batch --manifest nightly.txt --workdir ./jobs
+"""
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import transcribe_video_tel2eng as driver
+from pipeline.workspace import Workspace
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.mkv', '.webm', '.avi', '.ts')
+DEFAULT_CONCURRENCY = 8
+
+
+def load_manifest(path):
+    # One video path per line; blank lines and '#' comments are ignored.
+    # Relative paths are resolved against the manifest's directory.
+    base = os.path.dirname(os.path.abspath(path))
+    videos = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            videos.append(line if os.path.isabs(line) else os.path.join(base, line))
+    return videos
+
+
+def discover_videos(input_dir, extensions=VIDEO_EXTENSIONS):
+    return sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir)
+        if name.lower().endswith(extensions) and name != os.path.basename(driver.video_only)
+    )
+
+
+def make_workspaces(videos, workdir):
+    workspaces = {}
+    for video in videos:
+        ws = Workspace.for_video(video, workdir)
+        if ws.job_id in workspaces:
+            logging.warning(f"Skipping duplicate manifest entry {video}")
+            continue
+        workspaces[ws.job_id] = ws
+    return list(workspaces.values())
+
+
+def run_batch(workspaces, bucket_name, concurrency=DEFAULT_CONCURRENCY, ffmpeg_workers=None):
+    """Run every workspace through extract -> AWS -> mux.
+
+    Returns (outputs, failures): job_id -> output video path, and
+    job_id -> exception for jobs that failed at any stage.
+    """
+    outputs = {}
+    failures = {}
+
+    with ProcessPoolExecutor(max_workers=ffmpeg_workers) as media_pool, \
+            ThreadPoolExecutor(max_workers=concurrency) as aws_pool:
+        pending = {media_pool.submit(driver.run_stages, bucket_name, ws, ("extract",)): (ws, "extract")
+                   for ws in workspaces}
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                ws, stage = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as error:
+                    logging.error(f"{ws.job_id}: {stage} failed: {error}")
+                    failures[ws.job_id] = error
+                    continue
+
+                if stage == "extract":
+                    pending[aws_pool.submit(driver.aws_stages, bucket_name, ws)] = (ws, "aws")
+                elif stage == "aws":
+                    pending[media_pool.submit(driver.run_stages, bucket_name, ws, ("mux",))] = (ws, "mux")
+                else:
+                    outputs[ws.job_id] = result
+                    logging.info(f"{ws.job_id}: done ({len(outputs)}/{len(workspaces)})")
+
+    return outputs, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Translate a batch of Telugu videos to English")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--manifest', help="text file with one video path per line")
+    source.add_argument('--input-dir', help="directory of videos to process")
+    parser.add_argument('--workdir', default="./jobs", help="root for per-job workspaces")
+    parser.add_argument('--bucket', help="audio bucket (discovered from the account if omitted)")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="max jobs in the AWS stages at once")
+    parser.add_argument('--ffmpeg-workers', type=int, default=None,
+                        help="ffmpeg processes (default: CPU count)")
+    parser.add_argument('--restart', action='store_true',
+                        help="ignore checkpoints of earlier runs and redo every stage")
+    args = parser.parse_args(argv)
+    driver.configure_logging()
+    if args.restart:
+        # The environment reaches the ffmpeg worker processes however they are started
+        os.environ['PIPELINE_RESUME'] = '0'
+        driver.resume_runs = False
+
+    videos = load_manifest(args.manifest) if args.manifest else discover_videos(args.input_dir)
+    workspaces = make_workspaces(videos, args.workdir)
+    if not workspaces:
+        logging.error("No videos to process")
+        return 1
+
+    try:
+        bucket_name = args.bucket or driver.retrieve_audio_bucket()
+    except driver.PipelineError as error:
+        logging.error(error)
+        return error.exit_code
+    logging.info(f"Processing {len(workspaces)} videos with concurrency {args.concurrency}")
+    outputs, failures = run_batch(workspaces, bucket_name, args.concurrency, args.ffmpeg_workers)
+
+    logging.info(f"Batch finished: {len(outputs)} succeeded, {len(failures)} failed")
+    for job_id, error in failures.items():
+        logging.error(f"  {job_id}: {error}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Per-function Lambda bundles.
+
+Every function used to be deployed with the whole lambda/ directory. A
+bundle holds one handler module plus the lambda/ modules it imports,
+directly or through other lambda/ modules. The imports are found by reading
+the sources, so a module added to lambda/ reaches exactly the functions that
+import it. botocore and boto3 come from the Lambda runtime and are not
+bundled.
+
+The stack deploys ``lambda/`` with ``excludes(module)`` (see app.py), and
+``benchmarks.bench_cold_start`` times the handlers from ``build(module, dest)``.
+"""
+import ast
+import os
+import shutil
+
+from pipeline import LAMBDA_DIR
+
+# Function id (as published in SSM) -> handler module
+FUNCTIONS = {
+    "TranscriptionLambda": "transcribe_audio",
+    "TranslateLambda": "translate_text",
+    "SynthesizeLambda": "synthesize_speech",
+}
+
+
+def local_imports(path, root=LAMBDA_DIR):
+    # Top-level names path imports that are modules in root, lazy imports included
+    with open(path, 'r') as f:
+        tree = ast.parse(f.read(), path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split('.')[0])
+    return {name for name in names if os.path.isfile(os.path.join(root, f"{name}.py"))}
+
+
+def modules(handler_module, root=LAMBDA_DIR):
+    """handler_module and every root module it needs, sorted."""
+    needed, pending = set(), [handler_module]
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(local_imports(os.path.join(root, f"{name}.py"), root))
+    return sorted(needed)
+
+
+def excludes(handler_module, root=LAMBDA_DIR):
+    # Asset exclude globs that leave only the bundle's files
+    keep = {f"{name}.py" for name in modules(handler_module, root)}
+    return sorted(name for name in os.listdir(root) if name not in keep) + ["*.pyc"]
+
+
+def build(handler_module, dest, root=LAMBDA_DIR):
+    """Copy the bundle of handler_module into dest; returns its size in bytes."""
+    os.makedirs(dest, exist_ok=True)
+    size = 0
+    for name in modules(handler_module, root):
+        shutil.copy2(os.path.join(root, f"{name}.py"), dest)
+        size += os.path.getsize(os.path.join(dest, f"{name}.py"))
+    return size
@@ -0,0 +1,142 @@
+"""Per-job progress record, so a failed run resumes at the stage that failed.
+
+The checkpoint is a JSON file in the job's output directory with two parts:
+
+    stages  extract/transcribe/... -> status, result and the files it produced.
+            A stage counts as done only while all of its files still exist.
+    steps   values a stage must not redo when it is retried: Transcribe job
+            names, results of Lambda calls, S3 result keys of asynchronous
+            invocations that are still running.
+
+The file records a fingerprint of the input video and of the settings that
+change stage outputs. A checkpoint with another fingerprint is ignored, and
+the job starts over. An input downloaded from S3 (see ``pipeline.workers``)
+is identified by the ETag of its object, kept next to it in ``<input>.etag``,
+so downloading the same object again keeps the checkpoint.
+"""
+import json
+import os
+import threading
+import time
+
+CHECKPOINT_FILE = "checkpoint.json"
+SOURCE_ETAG_SUFFIX = ".etag"
+
+
+def source_etag(input_path):
+    # ETag of the S3 object input_path was downloaded from, None for a local file
+    try:
+        with open(input_path + SOURCE_ETAG_SUFFIX, 'r') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def record_source_etag(input_path, etag):
+    tmp = f"{input_path}{SOURCE_ETAG_SUFFIX}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(etag)
+    os.replace(tmp, input_path + SOURCE_ETAG_SUFFIX)
+
+
+def fingerprint(input_path, settings):
+    # Input identity (path plus source ETag, or size and mtime) and every setting that changes the stage outputs
+    etag = source_etag(input_path)
+    if etag:
+        identity = ['etag', etag]
+    else:
+        stat = os.stat(input_path)
+        identity = [stat.st_size, stat.st_mtime_ns]
+    return json.dumps([os.path.abspath(input_path), *identity, settings], sort_keys=True)
+
+
+class Checkpoint:
+    def __init__(self, path, fingerprint):
+        self.path = path
+        self.fingerprint = fingerprint
+        self._lock = threading.RLock()
+        self.state = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = None
+        if not state or state.get('fingerprint') != self.fingerprint:
+            return {'fingerprint': self.fingerprint, 'stages': {}, 'steps': {}}
+        return state
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.path)
+
+    # stages
+    def started(self):
+        # True once any stage of the job ran or is running
+        return bool(self.state['stages'])
+
+    def done(self, stage):
+        entry = self.state['stages'].get(stage)
+        return bool(entry) and entry['status'] == 'done' and all(os.path.exists(path) for path in entry['files'])
+
+    def result(self, stage):
+        return self.state['stages'][stage].get('result')
+
+    def start(self, stage):
+        with self._lock:
+            self.state['stages'][stage] = {'status': 'running', 'started_at': time.time()}
+            self._save()
+
+    def complete(self, stage, result=None, files=None):
+        # files default to the result itself when it is a path
+        if files is None:
+            files = [result] if isinstance(result, str) else []
+        with self._lock:
+            entry = self.state['stages'].setdefault(stage, {})
+            entry.update({'status': 'done', 'finished_at': time.time(), 'result': result, 'files': list(files)})
+            self._save()
+
+    def invalidate(self, stages):
+        # Later stages consumed the outputs of a stage that is running again
+        with self._lock:
+            for stage in stages:
+                self.state['stages'].pop(stage, None)
+            self._save()
+
+    def fail(self, stage, error):
+        with self._lock:
+            entry = self.state['stages'].setdefault(stage, {})
+            entry.update({'status': 'failed', 'error': str(error)})
+            self._save()
+
+    # steps
+    def get(self, step, default=None):
+        return self.state['steps'].get(step, default)
+
+    def put(self, step, value):
+        with self._lock:
+            self.state['steps'][step] = value
+            self._save()
+
+    def discard(self, step):
+        with self._lock:
+            if self.state['steps'].pop(step, None) is not None:
+                self._save()
+
+    def memo(self, step, fn):
+        # fn() once per step; a retried stage gets the recorded value back
+        if step in self.state['steps']:
+            return self.state['steps'][step]
+        value = fn()
+        if value is not None:
+            self.put(step, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self.state = {'fingerprint': self.fingerprint, 'stages': {}, 'steps': {}}
+            self._save()
@@ -0,0 +1,109 @@
+"""Split long audio at silences so it can be transcribed by several jobs at once.
+
+``detect_silences`` runs ffmpeg's silencedetect filter, ``choose_cut_points``
+picks one silence near each of the N evenly spaced targets (never leaving a
+chunk shorter than ``min_chunk``), ``split_audio`` cuts the file with stream
+copy, and ``merge_chunk_items`` stitches the per-chunk Transcribe items back
+into one stream on the original timeline.
+"""
+import os
+import re
+import subprocess
+
+SILENCE_NOISE_DB = -30
+MIN_SILENCE = 0.5
+MIN_CHUNK = 120.0
+
+SILENCE_START_RE = re.compile(r'silence_start: (-?[\d.]+)')
+SILENCE_END_RE = re.compile(r'silence_end: (-?[\d.]+)')
+
+
+def parse_silences(ffmpeg_log, duration=None):
+    # [(start, end)] from silencedetect output; a trailing open silence ends at duration
+    silences = []
+    start = None
+    for line in ffmpeg_log.splitlines():
+        match = SILENCE_START_RE.search(line)
+        if match:
+            start = max(float(match.group(1)), 0.0)
+            continue
+        match = SILENCE_END_RE.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    if start is not None and duration is not None:
+        silences.append((start, duration))
+    return silences
+
+
+def detect_silences(path, noise_db=SILENCE_NOISE_DB, min_silence=MIN_SILENCE, duration=None):
+    ffmpeg_cmd = [
+        'ffmpeg', '-nostdin', '-hide_banner',
+        '-i', path,
+        '-af', f'silencedetect=noise={noise_db}dB:d={min_silence}',
+        '-f', 'null', '-'
+    ]
+    result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, check=True)
+    return parse_silences(result.stderr, duration)
+
+
+def choose_cut_points(silences, duration, chunks, min_chunk=MIN_CHUNK):
+    """Cut times (seconds) splitting [0, duration) into at most `chunks` pieces.
+
+    Each cut is the middle of the silence closest to an evenly spaced target;
+    cuts that would leave a chunk shorter than min_chunk are dropped.
+    """
+    if chunks < 2 or duration < 2 * min_chunk:
+        return []
+    chunks = min(chunks, int(duration // min_chunk))
+    midpoints = sorted((start + end) / 2.0 for start, end in silences)
+    cuts = []
+    previous = 0.0
+    for k in range(1, chunks):
+        target = duration * k / chunks
+        candidates = [t for t in midpoints if t - previous >= min_chunk and duration - t >= min_chunk]
+        if not candidates:
+            break
+        cut = min(candidates, key=lambda t: abs(t - target))
+        if cut <= previous:
+            continue
+        cuts.append(cut)
+        previous = cut
+    return cuts
+
+
+def split_audio(path, cuts, out_dir):
+    # [(offset, chunk path)] for the pieces between cuts, cut without re-encoding
+    base, ext = os.path.splitext(os.path.basename(path))
+    bounds = [0.0] + list(cuts) + [None]
+    pieces = []
+    for i, (start, end) in enumerate(zip(bounds, bounds[1:])):
+        chunk_path = os.path.join(out_dir, f"{base}_chunk{i:03d}{ext}")
+        ffmpeg_cmd = ['ffmpeg', '-y', '-nostdin', '-v', 'error', '-ss', f'{start:.3f}', '-i', path]
+        if end is not None:
+            ffmpeg_cmd += ['-t', f'{end - start:.3f}']
+        ffmpeg_cmd += ['-c', 'copy', chunk_path]
+        subprocess.run(ffmpeg_cmd, check=True)
+        pieces.append((start, chunk_path))
+    return pieces
+
+
+def shift_item(item, offset):
+    # Copy of a Transcribe item with its times moved by offset seconds
+    shifted = dict(item)
+    for field in ('start_time', 'end_time'):
+        if field in item:
+            shifted[field] = f"{float(item[field]) + offset:.3f}"
+    return shifted
+
+
+def merge_chunk_items(chunk_results):
+    """Merge [(offset, items)] from per-chunk jobs into one ordered item list."""
+    merged = []
+    for offset, items in sorted(chunk_results, key=lambda result: result[0]):
+        for item in items:
+            shifted = shift_item(item, offset)
+            if 'id' in item:
+                shifted['id'] = len(merged)  # ids restart at 0 in every chunk
+            merged.append(shifted)
+    return merged
@@ -0,0 +1,165 @@
+"""Stack outputs (Lambda function names, the audio bucket) from SSM, cached on disk.
+
+The stack publishes its outputs as SSM parameters under /<app>/. All of them
+are fetched with one paginated get_parameters_by_path call. The result is
+kept in <cache_dir>/discovery/<account>-<region>.json for DISCOVERY_TTL
+seconds (default one hour), so a run, and every job of a batch, skips S3 and
+SSM lookups entirely.
+A name that is missing from a cached result triggers one refresh. A name
+that is missing from a fresh result raises DiscoveryError, and its absence
+is cached for the TTL as well: optional outputs an older stack never
+published (TranscriptQueueUrl, say) cost one SSM call per TTL, not one per
+lookup.
+
+Stacks deployed before the AudioBucketName parameter existed fall back to one
+list_buckets scan. It must match exactly one bucket, and the match is cached
+like the parameters.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+
+import aws_clients
+
+TTL = float(os.environ.get('DISCOVERY_TTL', 3600))
+AUDIO_BUCKET_PARAM = "AudioBucketName"
+WORK_QUEUE_PARAM = "WorkQueueUrl"
+TRANSCRIPT_QUEUE_PARAM = "TranscriptQueueUrl"
+# Bucket names CDK generates for the stack's transcribeBucket
+AUDIO_BUCKET_PATTERN = re.compile(r'^telugutoenglishtranscrip-transcribebucket')
+
+
+class DiscoveryError(LookupError):
+    pass
+
+
+def function_param(function_id):
+    return f"{function_id}FunctionName"
+
+
+class StackDiscovery:
+    def __init__(self, app_name, cache_dir, ttl=TTL, region_name=None, clock=time.time):
+        self.app_name = app_name
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.region_name = region_name or aws_clients.default_region()
+        self.clock = clock
+        self._params = None
+        self._missing = {}  # name -> when a refresh did not find it
+        self._fetched_at = None
+        self._account = None
+        self._lock = threading.Lock()
+
+    def account_id(self):
+        if self._account is None:
+            self._account = os.environ.get('AWS_ACCOUNT_ID') or \
+                aws_clients.get_client('sts', self.region_name).get_caller_identity()['Account']
+        return self._account
+
+    def cache_path(self):
+        name = f"{self.account_id()}-{self.region_name or 'default'}.json"
+        return os.path.join(self.cache_dir, 'discovery', name)
+
+    def _load(self, path):
+        try:
+            with open(path, 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.clock() - cached.get('fetched_at', 0) > self.ttl or cached.get('app') != self.app_name:
+            return None
+        return cached['parameters'], cached.get('missing', {}), cached['fetched_at']
+
+    def _save(self, path, params, fetched_at, missing=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'app': self.app_name, 'fetched_at': fetched_at,
+                       'parameters': params, 'missing': missing or {}}, f, indent=2)
+        os.replace(tmp, path)
+
+    def _fetch(self):
+        # Every /<app>/ parameter, keyed by its name below the prefix
+        prefix = f"/{self.app_name}/"
+        ssm = aws_clients.get_client('ssm', self.region_name)
+        params = {}
+        for page in ssm.get_paginator('get_parameters_by_path').paginate(
+                Path=prefix, Recursive=True, WithDecryption=True):
+            for param in page['Parameters']:
+                params[param['Name'][len(prefix):]] = param['Value']
+        logging.info(f"Discovered {len(params)} parameters under {prefix}")
+        return params
+
+    def parameters(self, refresh=False):
+        with self._lock:
+            if self._params is None or refresh:
+                path = self.cache_path()
+                cached = None if refresh else self._load(path)
+                if cached is None:
+                    cached = self._fetch(), {}, self.clock()
+                    self._save(path, cached[0], cached[2])
+                self._params, self._missing, self._fetched_at = cached
+            return self._params
+
+    def _absent(self, name):
+        # A refresh within the TTL did not find name
+        return self.clock() - self._missing.get(name, -math.inf) <= self.ttl
+
+    def lookup(self, name):
+        # A name missing from a cached result may be newer than the cache: refresh once,
+        # unless a refresh within the TTL already missed it
+        value = self.parameters().get(name)
+        if value is None and not self._absent(name):
+            value = self.parameters(refresh=True).get(name)
+            if value is None:
+                with self._lock:
+                    self._missing[name] = self.clock()
+                    self._save(self.cache_path(), self._params, self._fetched_at, self._missing)
+        if value is None:
+            raise DiscoveryError(f"SSM parameter /{self.app_name}/{name} not found; is the stack deployed "
+                                 f"in {self.region_name}?")
+        return value
+
+    def function_name(self, function_id):
+        return self.lookup(function_param(function_id))
+
+    def audio_bucket(self):
+        try:
+            return self.lookup(AUDIO_BUCKET_PARAM)
+        except DiscoveryError:
+            bucket_name = self._scan_buckets()
+        with self._lock:
+            self._params[AUDIO_BUCKET_PARAM] = bucket_name
+            self._save(self.cache_path(), self._params, self._fetched_at, self._missing)
+        return bucket_name
+
+    def work_queue_url(self):
+        return self.lookup(WORK_QUEUE_PARAM)
+
+    def transcript_queue_url(self):
+        return self.lookup(TRANSCRIPT_QUEUE_PARAM)
+
+    def invalidate(self):
+        # Forget the cached outputs, e.g. after a function name turned out to be stale
+        with self._lock:
+            self._params = None
+            try:
+                os.remove(self.cache_path())
+            except FileNotFoundError:
+                pass
+
+    def _scan_buckets(self):
+        s3 = aws_clients.get_client('s3', self.region_name)
+        matches = [bucket['Name'] for bucket in s3.list_buckets()['Buckets']
+                   if AUDIO_BUCKET_PATTERN.match(bucket['Name'])]
+        if len(matches) > 1:
+            raise DiscoveryError(f"Several audio buckets match {AUDIO_BUCKET_PATTERN.pattern}: {matches}; "
+                                 f"pass one explicitly")
+        if not matches:
+            raise DiscoveryError(f"No /{self.app_name}/{AUDIO_BUCKET_PARAM} parameter and no bucket "
+                                 f"matching {AUDIO_BUCKET_PATTERN.pattern}")
+        return matches[0]
@@ -0,0 +1,88 @@
+"""Re-run only the transcript lines an editor changed.
+
+Every translation writes a line record next to the transcript: each
+``HH:MM:SS: text`` source line with the translation the track was built
+from. When the edited ``telugu_text.txt`` comes back, its lines are matched
+against the record by timecode and text. Only the unmatched lines are sent
+to Translate. Only the track slots whose line, text or extent changed are
+synthesized again and spliced into the existing track.
+"""
+import json
+import os
+from collections import namedtuple
+
+from pipeline.synthesis import timeline_slots
+from transcript_lines import parse_lines
+
+Diff = namedtuple('Diff', 'translations changed removed')
+
+
+def save_record(path, src_text, dst_text):
+    # Pair each source line with its translation; both files have the same timecoded lines
+    with open(src_text, 'r') as f:
+        src_lines = parse_lines(f.read())
+    with open(dst_text, 'r') as f:
+        dst_lines = parse_lines(f.read())
+    record = [{'timecode': tc, 'source': source, 'translation': translation}
+              for (tc, source), (_, translation) in zip(src_lines, dst_lines) if tc is not None]
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump({'lines': record}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    return record
+
+
+def load_record(path):
+    # [(timecode, source, translation)], None when no run recorded one
+    try:
+        with open(path, 'r') as f:
+            return [(line['timecode'], line['source'], line['translation']) for line in json.load(f)['lines']]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def diff(record, edited_lines):
+    """Match the edited transcript's lines to the record by (timecode, text).
+
+    Returns Diff(translations, changed, removed): translations has the
+    recorded translation of every matched line and None for the others,
+    aligned with edited_lines; changed lists the indexes to translate again;
+    removed counts recorded lines that no longer appear.
+    """
+    known = {}
+    for timecode, source, translation in record:
+        known.setdefault((timecode, source.strip()), []).append(translation)
+    translations, changed = [], []
+    for index, (timecode, text) in enumerate(edited_lines):
+        candidates = known.get((timecode, text.strip())) if timecode is not None else None
+        if candidates:
+            translations.append(candidates.pop(0))
+        elif timecode is None or not text.strip():
+            translations.append(text)
+        else:
+            translations.append(None)
+            changed.append(index)
+    return Diff(translations, changed, sum(len(left) for left in known.values()))
+
+
+def merge(edited_lines, translations, new_translations):
+    # The edited lines' timecodes with recorded or new translations
+    new = iter(new_translations)
+    return [(timecode, next(new) if translation is None else translation)
+            for (timecode, _), translation in zip(edited_lines, translations)]
+
+
+def slot_changes(old_lines, new_lines, total_duration):
+    """Track slots to rewrite between two translated transcripts.
+
+    Returns (silence, render): old slots that no longer exist as
+    [(start, end)], and new slots whose text or extent differs as
+    [(start, end, text)]. A line inserted or removed also changes the
+    extent of the slot before it.
+    """
+    old = set(timeline_slots(old_lines, total_duration))
+    new = timeline_slots(new_lines, total_duration)
+    render = [slot for slot in new if slot not in old]
+    kept = set(new)
+    silence = [(start, end) for start, end, text in sorted(old) if (start, end, text) not in kept]
+    return silence, render
@@ -0,0 +1,44 @@
+"""Output languages for multi-language runs (TARGET_LANGUAGES=en,hi,ta).
+
+Each target has the code Amazon Translate uses, a Polly voice, and the
+ISO 639-2 code written to the container's track metadata. Polly has no voice
+for many Indian languages. Those targets get subtitles but no dubbed track.
+"""
+from collections import namedtuple
+
+Target = namedtuple('Target', 'code translate_code voice iso639_2')
+
+TARGETS = {t.code: t for t in (
+    Target('en', 'en', 'Matthew', 'eng'),
+    Target('hi', 'hi', 'Aditi', 'hin'),
+    Target('ta', 'ta', None, 'tam'),
+    Target('te', 'te', None, 'tel'),
+    Target('kn', 'kn', None, 'kan'),
+    Target('ml', 'ml', None, 'mal'),
+    Target('mr', 'mr', None, 'mar'),
+    Target('bn', 'bn', None, 'ben'),
+    Target('gu', 'gu', None, 'guj'),
+    Target('ur', 'ur', None, 'urd'),
+    Target('es', 'es', 'Lucia', 'spa'),
+    Target('fr', 'fr', 'Celine', 'fra'),
+    Target('de', 'de', 'Vicki', 'deu'),
+    Target('pt', 'pt', 'Camila', 'por'),
+    Target('ar', 'ar', 'Zeina', 'ara'),
+    Target('ja', 'ja', 'Mizuki', 'jpn'),
+    Target('zh', 'zh', 'Zhiyu', 'zho'),
+)}
+
+
+def parse_targets(spec):
+    # "en, hi,ta" -> [Target]; unknown codes raise ValueError
+    codes = [code.strip().lower() for code in spec.split(',') if code.strip()]
+    unknown = [code for code in codes if code not in TARGETS]
+    if unknown:
+        raise ValueError(f"Unsupported target languages {unknown}; known: {sorted(TARGETS)}")
+    return [TARGETS[code] for code in dict.fromkeys(codes)]
+
+
+def iso639_2(language_code):
+    # 'te-IN' -> 'tel' ('und' when unknown)
+    target = TARGETS.get(language_code.split('-')[0].lower())
+    return target.iso639_2 if target else 'und'
@@ -0,0 +1,421 @@
+"""Near-real-time translation of a live stream or a file that is still being written.
+
+The batch pipeline needs a finished file, and nothing comes out until the whole
+video has been through every stage. Live mode cuts the input into fixed
+windows (--window seconds). Each window then goes through extract ->
+transcribe -> translate -> synthesize -> mux as a job of its own. Every stage
+has its own worker pool, so one window can be in transcription while the next
+is still being extracted. Windows are emitted in order, as the MPEG-TS
+segments of an HLS playlist (``live.m3u8``). The English lines are appended
+to a rolling transcript, with timecodes on the stream's clock.
+
+Lag is bounded. A window's segment is due --max-lag seconds after the
+window's input was complete. If the dub is not ready by then, the original
+window is emitted in its place and the late dub is dropped. A window that is
+already past its deadline does not start its next stage, which is how a
+backlog clears:
+
+    python -m pipeline.live --input rtmp://localhost/live/talk --output-dir ./live-out
+    python -m pipeline.live --input recording.ts --follow --window 15 --max-lag 45
+    python -m pipeline.live --input talk.mp4 --replay          # the file, at real-time speed
+
+``SegmenterSource`` runs one ffmpeg segment muxer over a stream or growing
+file. ``ReplaySource`` releases the windows of a finished file at the rate it
+was recorded; ``benchmarks.live_replay`` replays against the simulated services
+to measure lag and throughput.
+"""
+import argparse
+import csv
+import logging
+import math
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import transcribe_video_tel2eng as driver
+from pipeline.transcribe_waiter import TranscriptionWaiter
+from pipeline.workspace import Workspace, job_id_for
+from transcript_lines import format_lines, parse_lines, timecode_to_seconds
+
+DEFAULT_WINDOW = float(os.environ.get('LIVE_WINDOW', 20.0))
+DEFAULT_MAX_LAG = float(os.environ.get('LIVE_MAX_LAG', 60.0))
+DEFAULT_WORKERS = 4          # windows in each AWS stage at once
+DEFAULT_FFMPEG_WORKERS = 2   # windows in each ffmpeg stage at once
+DEFAULT_IDLE_TIMEOUT = 10.0  # --follow: end of input after this long without new data
+POLL_INTERVAL = 0.25
+# Transcribe polls back off to a minute for batch jobs; a window's job is short and waited on
+TRANSCRIBE_MAX_DELAY = 5.0
+
+STAGES = ('extract', 'transcribe', 'translate', 'synthesize', 'mux')
+FFMPEG_STAGES = ('extract', 'mux')
+SEGMENT_LIST = "windows.csv"
+DUBBED_SEGMENT = "dubbed.ts"
+PLAYLIST = "live.m3u8"
+
+# ready_at: clock time at which the window's input was complete
+Window = namedtuple('Window', ['index', 'start', 'duration', 'path', 'ready_at'])
+
+
+class WindowLate(RuntimeError):
+    pass
+
+
+def check_settings():
+    # Segments carry one dubbed track; subtitle and multi-language output need the whole video
+    if driver.output_mode != 'dub' or driver.target_languages_spec:
+        raise driver.PipelineError("Live mode only produces dubbed audio: unset OUTPUT_MODE and TARGET_LANGUAGES")
+
+
+####################################
+# Window sources
+####################################
+def segment_command(input_spec, window, window_dir, follow=False, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    # One ffmpeg that copies the input into window-NNNNN.ts files and lists each one once it is closed
+    ffmpeg_cmd = ['ffmpeg', '-y', '-nostdin', '-v', 'error']
+    if follow:
+        # Keep reading at the end of the file; the input has ended when nothing is appended for idle_timeout
+        ffmpeg_cmd += ['-follow', '1', '-rw_timeout', str(int(idle_timeout * 1e6))]
+        input_spec = f"file:{os.path.abspath(input_spec)}"
+    return ffmpeg_cmd + [
+        '-i', input_spec,
+        '-map', '0:v:0?',
+        '-map', '0:a:0',
+        '-c', 'copy',
+        '-f', 'segment',
+        '-segment_time', f"{window:g}",
+        '-reset_timestamps', '1',
+        '-segment_list', os.path.join(window_dir, SEGMENT_LIST),
+        '-segment_list_type', 'csv',
+        os.path.join(window_dir, 'window-%05d.ts')
+    ]
+
+
+class SegmenterSource:
+    """Windows of a stream (any input ffmpeg reads) or of a file that is still growing.
+
+    Cuts are stream copies at keyframes, so windows are about --window long;
+    their exact bounds come from the segment list.
+    """
+
+    def __init__(self, input_spec, window, window_dir, follow=False, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.input_spec = input_spec
+        self.window = window
+        self.window_dir = window_dir
+        self.follow = follow
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.sleep = sleep
+
+    def listed(self):
+        # [(file name, start, end)] of the closed segments; the muxer appends a row when it closes one,
+        # and a row without its newline is still being written
+        try:
+            with open(os.path.join(self.window_dir, SEGMENT_LIST), 'r') as f:
+                text = f.read()
+        except FileNotFoundError:
+            return []
+        return [(name, float(start), float(end))
+                for name, start, end in csv.reader(text[:text.rfind('\n') + 1].splitlines())]
+
+    def windows(self):
+        os.makedirs(self.window_dir, exist_ok=True)
+        list_path = os.path.join(self.window_dir, SEGMENT_LIST)
+        if os.path.exists(list_path):
+            os.remove(list_path)
+        process = subprocess.Popen(segment_command(self.input_spec, self.window, self.window_dir,
+                                                   self.follow, self.idle_timeout))
+        seen = 0
+        try:
+            while True:
+                # Checked before reading the list, so the rows of the last segments are read after exit
+                finished = process.poll() is not None
+                for name, start, end in self.listed()[seen:]:
+                    yield Window(seen, start, end - start, os.path.join(self.window_dir, name), self.clock())
+                    seen += 1
+                if finished:
+                    break
+                self.sleep(POLL_INTERVAL)
+        finally:
+            if process.poll() is None:
+                process.terminate()
+                process.wait()
+        if process.returncode:
+            raise driver.PipelineError(f"ffmpeg segmenter for {self.input_spec} exited with {process.returncode}")
+
+
+class ReplaySource:
+    """Windows of a finished file, each released when it would have been recorded at speed x real time."""
+
+    def __init__(self, path, window, window_dir, speed=1.0, clock=time.monotonic, sleep=time.sleep):
+        self.path = path
+        self.window = window
+        self.window_dir = window_dir
+        self.speed = speed
+        self.clock = clock
+        self.sleep = sleep
+
+    def windows(self):
+        os.makedirs(self.window_dir, exist_ok=True)
+        duration = driver.get_media_duration(self.path)
+        if not duration:
+            raise driver.PipelineError(f"Cannot read the duration of {self.path}")
+        started = self.clock()
+        for index in range(math.ceil(duration / self.window)):
+            start = index * self.window
+            length = min(self.window, duration - start)
+            ready_at = started + (start + length) / self.speed
+            self.sleep(max(0.0, ready_at - self.clock()))
+            path = os.path.join(self.window_dir, f"window-{index:05d}.ts")
+            # The cut counts towards the lag, as the segmenter's copy does
+            driver.cut_media(self.path, start, length, path)
+            yield Window(index, start, length, path, ready_at)
+
+
+####################################
+# Stage graph
+####################################
+def window_stage(stage, bucket_name, ws):
+    # The driver's stages, except that mux writes an MPEG-TS segment into the window's directory
+    if stage != 'mux':
+        return driver.run_stage(stage, bucket_name, ws)
+    audio = ws.track_path if driver.synthesis_mode == 'timeline' else ws.audio_path
+    video = ws.input_video_path if driver.streaming_extract_mode else ws.video_only
+    segment = os.path.join(ws.output_dir, DUBBED_SEGMENT)
+    driver.combine_video_audio(video, audio, segment)
+    return segment
+
+
+def shifted_lines(path, offset, duration):
+    # Lines of a window's transcript, with timecodes moved offset seconds to the stream's clock.
+    # A timecode at or past the window's end is clamped to its last second, so that the rolling
+    # transcript never goes back in time at the next window
+    last = max(0, math.ceil(duration) - 1)
+    with open(path, 'r') as f:
+        lines = parse_lines(f.read())
+    return [(driver.convert_time_to_hh_mm_ss(min(timecode_to_seconds(timecode), last) + offset)
+             if timecode else None, text)
+            for timecode, text in lines if text.strip()]
+
+
+def write_playlist(path, segments, ended=False):
+    # HLS media playlist of [(file name, duration)], replaced in one step so players never read half of it
+    target = math.ceil(max([duration for _, duration in segments] + [1.0]))
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{target}",
+             "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:EVENT"]
+    for name, duration in segments:
+        lines += [f"#EXTINF:{duration:.3f},", name]
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    with open(path + '.tmp', 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(path + '.tmp', path)
+
+
+class WindowJob:
+    # One window on its way through the stages
+    def __init__(self, window, ws, deadline):
+        self.window = window
+        self.ws = ws
+        self.deadline = deadline
+        self.timings = {}
+        self.segment = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class LivePipeline:
+    """Run the windows of a source through the stages, emitting each in order within max_lag."""
+
+    def __init__(self, bucket_name, job_id, workdir, output_dir, max_lag=DEFAULT_MAX_LAG, workers=DEFAULT_WORKERS,
+                 ffmpeg_workers=DEFAULT_FFMPEG_WORKERS, clock=time.monotonic, sleep=time.sleep):
+        self.bucket_name = bucket_name
+        self.job_id = job_id
+        self.workdir = workdir
+        self.output_dir = output_dir
+        self.max_lag = max_lag
+        self.workers = workers
+        self.ffmpeg_workers = ffmpeg_workers
+        self.clock = clock
+        self.sleep = sleep
+        self.jobs = []
+        self.source_done = False
+        self.source_error = None
+        self._cond = threading.Condition()
+        self._pools = {}
+
+    @property
+    def playlist_path(self):
+        return os.path.join(self.output_dir, PLAYLIST)
+
+    @property
+    def transcript_path(self):
+        return os.path.join(self.output_dir, os.path.basename(driver.english_text))
+
+    def window_workspace(self, window):
+        window_dir = os.path.join(self.workdir, self.job_id, f"w{window.index:05d}")
+        return Workspace(f"{self.job_id}-w{window.index:05d}", window.path, window_dir, window_dir)
+
+    def _submit(self, job, position):
+        self._pools[STAGES[position]].submit(self._run_stage, job, position)
+
+    def _run_stage(self, job, position):
+        stage = STAGES[position]
+        try:
+            if self.clock() > job.deadline:
+                raise WindowLate(f"{job.ws.job_id}: past its deadline before {stage}, dropped")
+            started = self.clock()
+            result = window_stage(stage, self.bucket_name, job.ws)
+            job.timings[stage] = self.clock() - started
+        except WindowLate as error:
+            logging.info(error)
+            job.error = error
+            job.done.set()
+            return
+        except Exception as error:
+            logging.warning(f"{job.ws.job_id}: {stage} failed: {error}")
+            job.error = error
+            job.done.set()
+            return
+        if position + 1 < len(STAGES):
+            self._submit(job, position + 1)
+        else:
+            job.segment = result
+            job.done.set()
+
+    def _read(self, source):
+        # Reader thread: start every window as soon as the source has it
+        try:
+            for window in source.windows():
+                job = WindowJob(window, self.window_workspace(window), window.ready_at + self.max_lag)
+                job.ws.makedirs()
+                with self._cond:
+                    self.jobs.append(job)
+                    self._cond.notify_all()
+                self._submit(job, 0)
+        except Exception as error:
+            logging.error(f"{self.job_id}: input failed: {error}")
+            self.source_error = error
+        finally:
+            with self._cond:
+                self.source_done = True
+                self._cond.notify_all()
+
+    def _next_job(self, index):
+        with self._cond:
+            while len(self.jobs) <= index and not self.source_done:
+                self._cond.wait()
+            return self.jobs[index] if index < len(self.jobs) else None
+
+    def _emit(self, job, segments):
+        # Wait for the dub until the deadline, then write whichever segment there is
+        while not job.done.is_set() and self.clock() < job.deadline:
+            self.sleep(min(POLL_INTERVAL, job.deadline - self.clock()))
+        window = job.window
+        name = f"segment-{window.index:05d}.ts"
+        if job.done.is_set() and job.segment:
+            status = 'dubbed'
+            shutil.move(job.segment, os.path.join(self.output_dir, name))
+            with open(self.transcript_path, 'a') as f:
+                f.write(format_lines(shifted_lines(job.ws.dst_text, int(round(window.start)), window.duration)))
+        else:
+            status = 'failed' if job.error and not isinstance(job.error, WindowLate) else 'late'
+            shutil.copyfile(window.path, os.path.join(self.output_dir, name))
+        segments.append((name, window.duration))
+        write_playlist(self.playlist_path, segments)
+        lag = self.clock() - window.ready_at
+        logging.info(f"{self.job_id}: window {window.index} at {window.start:.1f}s emitted {status}, "
+                     f"{lag:.1f}s after its input was complete")
+        return {'index': window.index, 'start': window.start, 'duration': window.duration, 'status': status,
+                'lag': round(lag, 3), 'stages': {stage: round(t, 3) for stage, t in job.timings.items()}}
+
+    def run(self, source):
+        """Process every window of source; returns the run's report."""
+        check_settings()
+        os.makedirs(self.output_dir, exist_ok=True)
+        for path in (self.playlist_path, self.transcript_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._pools = {stage: ThreadPoolExecutor(self.ffmpeg_workers if stage in FFMPEG_STAGES else self.workers,
+                                                 thread_name_prefix=f"live-{stage}")
+                       for stage in STAGES}
+        started = self.clock()
+        reader = threading.Thread(target=self._read, args=(source,), name="live-reader", daemon=True)
+        reader.start()
+        segments, emitted = [], []
+        try:
+            while True:
+                job = self._next_job(len(emitted))
+                if job is None:
+                    break
+                emitted.append(self._emit(job, segments))
+        finally:
+            reader.join()
+            # In stage order: a stage still running can hand its window on to the next pool
+            for stage in STAGES:
+                self._pools[stage].shutdown(wait=True)
+        write_playlist(self.playlist_path, segments, ended=True)
+        if self.source_error:
+            raise driver.PipelineError(f"Live input of {self.job_id} failed: {self.source_error}")
+        return {
+            'job': self.job_id,
+            'elapsed': round(self.clock() - started, 3),
+            'media_seconds': round(sum(w['duration'] for w in emitted), 3),
+            'windows': emitted,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--input', required=True, help="stream URL or file")
+    kind = parser.add_mutually_exclusive_group()
+    kind.add_argument('--follow', action='store_true', help="the input file is still being written")
+    kind.add_argument('--replay', action='store_true', help="replay a finished file at --speed x real time")
+    parser.add_argument('--speed', type=float, default=1.0, help="with --replay: playback speed")
+    parser.add_argument('--window', type=float, default=DEFAULT_WINDOW, help="seconds of input per window")
+    parser.add_argument('--max-lag', type=float, default=DEFAULT_MAX_LAG,
+                        help="seconds from the end of a window to its segment")
+    parser.add_argument('--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help="with --follow: seconds without new data that end the input")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="windows in each AWS stage at once")
+    parser.add_argument('--ffmpeg-workers', type=int, default=DEFAULT_FFMPEG_WORKERS)
+    parser.add_argument('--workdir', default="./live", help="root for the per-window workspaces")
+    parser.add_argument('--output-dir', help="segments, playlist and transcript (default: <workdir>/<job-id>)")
+    parser.add_argument('--bucket', help="audio bucket (discovered from the account if omitted)")
+    args = parser.parse_args(argv)
+    driver.configure_logging()
+    if args.window <= 0 or args.max_lag <= 0:
+        parser.error("--window and --max-lag must be positive")
+
+    job_id = job_id_for(args.input)
+    window_dir = os.path.join(args.workdir, job_id, 'windows')
+    if args.replay:
+        source = ReplaySource(args.input, args.window, window_dir, speed=args.speed)
+    else:
+        source = SegmenterSource(args.input, args.window, window_dir, follow=args.follow,
+                                 idle_timeout=args.idle_timeout)
+    driver.set_transcription_waiter(TranscriptionWaiter(max_delay=TRANSCRIBE_MAX_DELAY), listen=True)
+    try:
+        bucket_name = args.bucket or driver.retrieve_audio_bucket()
+        live = LivePipeline(bucket_name, job_id, args.workdir, args.output_dir or os.path.join(args.workdir, job_id),
+                            max_lag=args.max_lag, workers=args.workers, ffmpeg_workers=args.ffmpeg_workers)
+        report = live.run(source)
+    except driver.PipelineError as error:
+        logging.error(error)
+        return error.exit_code
+
+    windows = report['windows']
+    dubbed = sum(1 for w in windows if w['status'] == 'dubbed')
+    logging.info(f"{dubbed}/{len(windows)} windows dubbed, max lag "
+                 f"{max([w['lag'] for w in windows] + [0.0]):.1f}s: {live.playlist_path}")
+    # Late windows are the lag bound at work; failed ones are errors
+    return 1 if any(w['status'] == 'failed' for w in windows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""One ffmpeg pass that muxes every output language into a single container.
+
+The video stream and the original audio are stream-copied. Each dubbed track
+is encoded to AAC, and each subtitle file becomes a text track in the
+container's subtitle format. Every track is tagged with its ISO 639-2
+language. The first dubbed track is the default, so players start in the
+first target language.
+"""
+import subprocess
+
+from pipeline.subtitles import SUBTITLE_CODECS, output_container
+
+
+def command(video_path, audio_tracks, subtitle_tracks, output_path, original_audio_language=None):
+    """ffmpeg arguments for the mux.
+
+    audio_tracks and subtitle_tracks are [(path, iso639_2)]. The first audio
+    stream of video_path is kept (copied) when original_audio_language is
+    given.
+    """
+    cmd = ['ffmpeg', '-y', '-nostdin', '-i', video_path]
+    for path, _ in audio_tracks + subtitle_tracks:
+        cmd += ['-i', path]
+
+    cmd += ['-map', '0:v:0']
+    if original_audio_language:
+        cmd += ['-map', '0:a:0']
+    for index in range(1, len(audio_tracks) + 1):
+        cmd += ['-map', f'{index}:a:0']
+    for index in range(len(audio_tracks) + 1, len(audio_tracks) + len(subtitle_tracks) + 1):
+        cmd += ['-map', f'{index}:0']
+
+    cmd += ['-c:v', 'copy', '-c:a', 'aac', '-c:s', SUBTITLE_CODECS[output_container(output_path)]]
+    first_dub = 0
+    if original_audio_language:
+        cmd += ['-c:a:0', 'copy', '-metadata:s:a:0', f'language={original_audio_language}', '-disposition:a:0', '0']
+        first_dub = 1
+    for offset, (_, language) in enumerate(audio_tracks):
+        cmd += [f'-metadata:s:a:{first_dub + offset}', f'language={language}']
+    if audio_tracks:
+        cmd += [f'-disposition:a:{first_dub}', 'default']
+    for index, (_, language) in enumerate(subtitle_tracks):
+        cmd += [f'-metadata:s:s:{index}', f'language={language}']
+    cmd.append(output_path)
+    return cmd
+
+
+def mux(video_path, audio_tracks, subtitle_tracks, output_path, original_audio_language=None):
+    subprocess.run(command(video_path, audio_tracks, subtitle_tracks, output_path, original_audio_language),
+                   check=True)
+    return output_path
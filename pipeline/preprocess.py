@@ -0,0 +1,149 @@
+"""Audio preprocessing for transcription: mono, 16 kHz, speech only.
+
+Speech recognition needs a single channel at 16 kHz, not the stereo
+high-quality MP3 ``split_video_audio`` produces. Everything uploaded is also
+billed as transcription time, so with ``vad`` enabled long non-speech
+stretches (found with ffmpeg's silencedetect) are cut out as well.
+
+Cutting shifts everything after the cut, so the kept intervals are recorded
+in a ``TimeMap``. ``TimeMap.remap_items`` moves Transcribe item times back
+onto the original video timeline before ``align_sentences`` sees them.
+"""
+import bisect
+import json
+import logging
+import subprocess
+
+from pipeline import chunked
+
+SAMPLE_RATE = 16000
+
+# name -> (ffmpeg audio codec arguments, Transcribe MediaFormat / file extension)
+CODECS = {
+    'mp3': (['-c:a', 'libmp3lame', '-b:a', '32k'], 'mp3'),
+    'flac': (['-c:a', 'flac', '-sample_fmt', 's16'], 'flac'),
+    'ogg': (['-c:a', 'libopus', '-b:a', '24k', '-application', 'voip'], 'ogg'),
+}
+DEFAULT_CODEC = 'mp3'
+
+# Only silences at least this long are removed, and PADDING seconds of each
+# removed silence are kept on either side so words are not clipped.
+VAD_NOISE_DB = -35
+VAD_MIN_GAP = 2.0
+VAD_PADDING = 0.3
+
+
+class TimeMap:
+    """Piecewise mapping from processed (cut) audio time to original time.
+
+    segments: [(processed_start, original_start, length)] in order.
+    """
+
+    def __init__(self, segments=None):
+        self.segments = list(segments or [])
+        self._starts = [segment[0] for segment in self.segments]
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        segments = []
+        processed = 0.0
+        for start, end in intervals:
+            segments.append((processed, start, end - start))
+            processed += end - start
+        return cls(segments)
+
+    @property
+    def removed(self):
+        # Original-time intervals cut out between kept segments
+        gaps = []
+        for (_, start, length), (_, next_start, _) in zip(self.segments, self.segments[1:]):
+            if next_start > start + length:
+                gaps.append((start + length, next_start))
+        return gaps
+
+    @property
+    def processed_duration(self):
+        return sum(length for _, _, length in self.segments)
+
+    def to_original(self, t):
+        if not self.segments:
+            return t
+        i = max(bisect.bisect_right(self._starts, t) - 1, 0)
+        processed_start, original_start, _ = self.segments[i]
+        return original_start + (t - processed_start)
+
+    def remap_items(self, items):
+        if not self.segments:
+            return items
+        remapped = []
+        for item in items:
+            if 'start_time' in item or 'end_time' in item:
+                item = dict(item)
+                for field in ('start_time', 'end_time'):
+                    if field in item:
+                        item[field] = f"{self.to_original(float(item[field])):.3f}"
+            remapped.append(item)
+        return remapped
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'segments': self.segments}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls([tuple(segment) for segment in json.load(f)['segments']])
+
+
+def speech_intervals(silences, duration, min_gap=VAD_MIN_GAP, padding=VAD_PADDING):
+    # Intervals to keep: everything except the inner part of silences longer than min_gap
+    keep = []
+    position = 0.0
+    for start, end in silences:
+        if end - start < min_gap:
+            continue
+        cut_start, cut_end = start + padding, end - padding
+        if cut_start <= position:
+            cut_start = position
+        if cut_end <= cut_start:
+            continue
+        if cut_start > position:
+            keep.append((position, cut_start))
+        position = cut_end
+    if duration > position:
+        keep.append((position, duration))
+    return keep
+
+
+def select_filter(intervals):
+    # aselect keeping only the given intervals, with timestamps made contiguous again
+    expression = '+'.join(f'between(t,{start:.3f},{end:.3f})' for start, end in intervals)
+    return f"aselect='{expression}',asetpts=N/SR/TB"
+
+
+def split_for_transcription(input_path, video_path, audio_path, codec=DEFAULT_CODEC, vad=False,
+                            duration=None, min_gap=VAD_MIN_GAP, padding=VAD_PADDING):
+    """Like split_video_audio, but the audio is mono speech-rate audio for Transcribe.
+
+    Returns the TimeMap for the written audio (empty when nothing was cut).
+    video_path may be None to write the audio only.
+    """
+    codec_args, _ = CODECS[codec]
+    time_map = TimeMap()
+    filters = []
+    if vad and duration:
+        silences = chunked.detect_silences(input_path, noise_db=VAD_NOISE_DB, min_silence=min_gap,
+                                           duration=duration)
+        intervals = speech_intervals(silences, duration, min_gap, padding)
+        if intervals and intervals != [(0.0, duration)]:
+            time_map = TimeMap.from_intervals(intervals)
+            filters = ['-af', select_filter(intervals)]
+            logging.info(f"VAD keeps {time_map.processed_duration:.1f}s of {duration:.1f}s "
+                         f"in {len(intervals)} intervals")
+
+    ffmpeg_cmd = ['ffmpeg', '-y', '-nostdin', '-i', input_path]
+    if video_path:
+        ffmpeg_cmd += ['-c:v', 'copy', '-an', video_path]
+    ffmpeg_cmd += ['-vn', '-map', '0:a', '-ac', '1', '-ar', str(SAMPLE_RATE), *filters, *codec_args, audio_path]
+    subprocess.run(ffmpeg_cmd, check=True)
+    return time_map
@@ -0,0 +1,98 @@
+"""Extract audio with ffmpeg straight into an S3 multipart upload.
+
+No ``video_only.mp4`` or local audio file is written: ffmpeg's stdout is fed
+to ``s3_stream.MultipartStreamUploader``. When ffprobe reports an audio codec
+Transcribe already accepts, the stream is copied instead of re-encoded.
+
+Objects are content-addressed: the key is derived from the source file's
+SHA-256 plus the extraction arguments, so when the object is already in the
+bucket the extraction and upload are skipped entirely. The key, the
+transcript cache and transcription-job reuse all rest on it, so it covers
+the whole file.
+
+There is no local audio file, so streaming cannot be combined with
+PREPROCESS_AUDIO or TRANSCRIBE_CHUNKS; the driver refuses both.
+"""
+import logging
+import subprocess
+from collections import namedtuple
+
+import s3_stream
+import stage_cache
+
+# Prefix for extracted audio; kept away from the audio/ prefix that triggers the SynthesizeLambda
+S3_MEDIA_PREFIX = "media/"
+
+# ffprobe codec -> (ffmpeg output format, Transcribe MediaFormat / file extension)
+COPYABLE_CODECS = {
+    'mp3': ('mp3', 'mp3'),
+    'flac': ('flac', 'flac'),
+    'opus': ('ogg', 'ogg'),
+    'vorbis': ('ogg', 'ogg'),
+}
+REENCODE_ARGS = ['-c:a', 'libmp3lame', '-q:a', '2', '-f', 'mp3']
+
+ExtractionPlan = namedtuple('ExtractionPlan', ['codec', 'ffmpeg_args', 'media_format'])
+
+
+def probe_audio_codec(path):
+    # Codec name of the first audio stream, None when there is none or ffprobe fails
+    ffprobe_cmd = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'a:0',
+        '-show_entries', 'stream=codec_name',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        path
+    ]
+    try:
+        output = subprocess.run(ffprobe_cmd, check=True, capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.strip() or None
+
+
+def plan_extraction(input_path):
+    codec = probe_audio_codec(input_path)
+    if codec in COPYABLE_CODECS:
+        muxer, media_format = COPYABLE_CODECS[codec]
+        return ExtractionPlan(codec, ['-c:a', 'copy', '-f', muxer], media_format)
+    return ExtractionPlan(codec, REENCODE_ARGS, 'mp3')
+
+
+def audio_digest(source_digest, plan):
+    # Content key of the extracted audio: same source + same arguments = same bytes
+    return stage_cache.digest(source_digest, *plan.ffmpeg_args)
+
+
+def media_key(digest, plan):
+    return f"{S3_MEDIA_PREFIX}{digest}.{plan.media_format}"
+
+
+def extract_to_s3(input_path, s3, bucket, key, plan, part_size=s3_stream.DEFAULT_PART_SIZE,
+                  max_workers=s3_stream.DEFAULT_WORKERS):
+    """Stream the audio of input_path into s3://bucket/key; returns bytes uploaded (0 if skipped)."""
+    if s3_stream.object_exists(s3, bucket, key):
+        logging.info(f"s3://{bucket}/{key} already uploaded, skipping extraction")
+        return 0
+
+    ffmpeg_cmd = ['ffmpeg', '-nostdin', '-v', 'error', '-i', input_path,
+                  '-vn', '-map', '0:a:0', *plan.ffmpeg_args, 'pipe:1']
+    process = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.PIPE)
+    try:
+        uploader = s3_stream.upload_stream(process.stdout, s3, bucket, key, part_size=part_size,
+                                           max_workers=max_workers)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        process.stdout.close()
+    if process.wait() != 0:
+        # The object is already complete but truncated; do not leave it behind for the skip check
+        s3.delete_object(Bucket=bucket, Key=key)
+        raise subprocess.CalledProcessError(process.returncode, ffmpeg_cmd)
+
+    logging.info(f"Streamed {uploader.bytes_written} bytes of {plan.codec or 'audio'} "
+                 f"({'copied' if plan.ffmpeg_args[1] == 'copy' else 're-encoded'}) to s3://{bucket}/{key}")
+    return uploader.bytes_written
+
@@ -0,0 +1,93 @@
+"""Subtitles from the translated transcript, muxed as a soft subtitle track.
+
+Every ``HH:MM:SS: text`` line becomes one cue. A cue starts at its timecode
+and ends at the next line's timecode, or earlier when the text needs less
+reading time. The cues are written as SRT and WebVTT. The SRT is muxed into
+a copy of the original container with ``-c copy``, so audio and video are not
+re-encoded. Only the subtitle track is converted to the container's text
+format.
+"""
+import os
+import subprocess
+import textwrap
+
+from pipeline.synthesis import timeline_slots
+from transcript_lines import parse_lines
+
+CHARS_PER_SECOND = 15  # comfortable reading speed
+MIN_CUE_SECONDS = 1.5
+LINE_WIDTH = 42  # characters per subtitle line, two lines per cue in practice
+# Subtitle codec for each container; ffmpeg converts the SRT input to it
+SUBTITLE_CODECS = {
+    '.mp4': 'mov_text',
+    '.m4v': 'mov_text',
+    '.mov': 'mov_text',
+    '.mkv': 'srt',
+    '.webm': 'webvtt',
+}
+DEFAULT_CONTAINER = '.mkv'  # holds any codec the source has
+
+
+def cues(lines, total_duration=None):
+    # [(start, end, text)] with each cue shortened to its reading time
+    result = []
+    for start, end, text in timeline_slots(lines, total_duration):
+        reading = max(MIN_CUE_SECONDS, len(text) / CHARS_PER_SECOND)
+        result.append((start, min(end, start + reading), text))
+    return result
+
+
+def _timestamp(seconds, separator):
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def _wrap(text):
+    return '\n'.join(textwrap.wrap(text, LINE_WIDTH)) or text
+
+
+def format_srt(cue_list):
+    return ''.join(f"{index}\n{_timestamp(start, ',')} --> {_timestamp(end, ',')}\n{_wrap(text)}\n\n"
+                   for index, (start, end, text) in enumerate(cue_list, 1))
+
+
+def format_vtt(cue_list):
+    return "WEBVTT\n\n" + ''.join(f"{_timestamp(start, '.')} --> {_timestamp(end, '.')}\n{_wrap(text)}\n\n"
+                                  for start, end, text in cue_list)
+
+
+def write_subtitles(text_path, srt_path, vtt_path, total_duration=None):
+    with open(text_path, 'r') as f:
+        cue_list = cues(parse_lines(f.read()), total_duration)
+    with open(srt_path, 'w') as f:
+        f.write(format_srt(cue_list))
+    with open(vtt_path, 'w') as f:
+        f.write(format_vtt(cue_list))
+    return cue_list
+
+
+def output_container(input_path):
+    ext = os.path.splitext(input_path)[1].lower()
+    return ext if ext in SUBTITLE_CODECS else DEFAULT_CONTAINER
+
+
+def mux_command(video_path, srt_path, output_path, language='eng'):
+    codec = SUBTITLE_CODECS[output_container(output_path)]
+    return [
+        'ffmpeg', '-y', '-nostdin',
+        '-i', video_path,
+        '-i', srt_path,
+        '-map', '0:v', '-map', '0:a?', '-map', '1:0',
+        '-c', 'copy',
+        '-c:s', codec,
+        '-metadata:s:s:0', f'language={language}',
+        output_path,
+    ]
+
+
+def mux_subtitles(video_path, srt_path, output_path, language='eng'):
+    subprocess.run(mux_command(video_path, srt_path, output_path, language), check=True)
+    return output_path
@@ -0,0 +1,183 @@
+"""Synthesize the translated transcript sentence by sentence onto the video timeline.
+
+Every ``HH:MM:SS: text`` line becomes its own Polly request (so there is no
+overall length limit), run on a bounded thread pool. Each clip owns the
+slot from its timecode to the next line's timecode; clips longer than their
+slot are sped up with ffmpeg's atempo filter, then all clips are written at
+their offsets into one PCM WAV track exactly as long as the video.
+"""
+import logging
+import math
+import struct
+import subprocess
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import stage_cache
+import tracing
+from transcript_lines import parse_lines, timecode_to_seconds
+
+SAMPLE_RATE = 16000  # Polly PCM output is 16-bit signed little-endian mono at 8000 or 16000 Hz
+SAMPLE_WIDTH = 2
+VOICE = 'Matthew'
+MAX_WORKERS = 8
+MAX_TEMPO = 1.5  # faster than this stops sounding natural; the clip is clipped instead
+
+
+def timeline_slots(lines, total_duration):
+    # [(start, end, text)] for the non-empty lines; a slot ends where the next line starts
+    # (the last one at total_duration, or open-ended when the duration is unknown)
+    timed = [(timecode_to_seconds(tc), text.strip()) for tc, text in lines if tc is not None]
+    slots = []
+    for i, (start, text) in enumerate(timed):
+        if i + 1 < len(timed):
+            end = timed[i + 1][0]
+        else:
+            end = math.inf if total_duration is None else max(total_duration, start)
+        if text:
+            slots.append((float(start), float(end), text))
+    return slots
+
+
+def pcm_duration(pcm, sample_rate=SAMPLE_RATE):
+    return len(pcm) / (SAMPLE_WIDTH * sample_rate)
+
+
+def synthesize_sentence(polly, text, voice=VOICE, sample_rate=SAMPLE_RATE, cache=None):
+    key = stage_cache.speech_key(text, voice, f'pcm{sample_rate}')
+    pcm = cache.get(stage_cache.SPEECH, key) if cache else None
+    if pcm is None:
+        response = polly.synthesize_speech(
+            Text=text,
+            VoiceId=voice,
+            OutputFormat='pcm',
+            SampleRate=str(sample_rate)
+        )
+        pcm = response['AudioStream'].read()
+        if cache:
+            cache.put(stage_cache.SPEECH, key, pcm)
+    return pcm
+
+
+def atempo_chain(factor):
+    # atempo accepts 0.5..2.0 per instance on older ffmpeg builds, so chain them
+    filters = []
+    while factor > 2.0:
+        filters.append('atempo=2.0')
+        factor /= 2.0
+    filters.append(f'atempo={factor:.4f}')
+    return ','.join(filters)
+
+
+def fit_tempo(pcm, slot, sample_rate=SAMPLE_RATE, max_tempo=MAX_TEMPO):
+    # Speed a clip up (never slow it down) so that it fits into slot seconds
+    duration = pcm_duration(pcm, sample_rate)
+    if slot <= 0 or duration <= slot:
+        return pcm
+    factor = min(duration / slot, max_tempo)
+    pcm_format = ['-f', 's16le', '-ar', str(sample_rate), '-ac', '1']
+    ffmpeg_cmd = ['ffmpeg', '-nostdin', '-v', 'error', *pcm_format, '-i', 'pipe:0',
+                  '-filter:a', atempo_chain(factor), *pcm_format, 'pipe:1']
+    return subprocess.run(ffmpeg_cmd, input=pcm, capture_output=True, check=True).stdout
+
+
+def assemble_track(clips, total_duration, output_path, sample_rate=SAMPLE_RATE):
+    """Write (start, end, pcm) clips at their offsets into a WAV of total_duration.
+
+    Clips are written in time order with silence in between; a clip that
+    still overruns its slot is cut at the slot end so later lines stay in sync.
+    """
+    frame_bytes = SAMPLE_WIDTH
+    total_frames = int(round(total_duration * sample_rate))
+    with wave.open(output_path, 'wb') as track:
+        track.setnchannels(1)
+        track.setsampwidth(SAMPLE_WIDTH)
+        track.setframerate(sample_rate)
+
+        position = 0
+        for start, end, pcm in sorted(clips, key=lambda clip: clip[0]):
+            start_frame = int(round(min(start, total_duration) * sample_rate))
+            end_frame = int(round(min(end, total_duration) * sample_rate))
+            if start_frame > position:
+                track.writeframes(b'\0' * ((start_frame - position) * frame_bytes))
+                position = start_frame
+            frames = min(len(pcm) // frame_bytes, max(end_frame - position, 0))
+            if frames < len(pcm) // frame_bytes:
+                logging.warning(f"Clip at {start:.0f}s overruns its slot by "
+                                f"{pcm_duration(pcm, sample_rate) - (end - start):.2f}s, cutting it")
+            track.writeframes(pcm[:frames * frame_bytes])
+            position += frames
+        if total_frames > position:
+            track.writeframes(b'\0' * ((total_frames - position) * frame_bytes))
+    return output_path
+
+
+def render_slots(slots, polly, voice=VOICE, max_workers=MAX_WORKERS, cache=None, sample_rate=SAMPLE_RATE):
+    # [(start, end, pcm)]: one Polly clip per slot, sped up to fit it
+    def render(slot):
+        start, end, text = slot
+        pcm = synthesize_sentence(polly, text, voice, sample_rate, cache)
+        return start, end, fit_tempo(pcm, end - start, sample_rate)
+
+    if not slots:
+        return []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(tracing.propagate(render), slots))
+
+
+def _data_offset(f):
+    # Byte offset of the sample data in a RIFF/WAVE file
+    f.seek(12)
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("WAV file has no data chunk")
+        chunk_id, size = struct.unpack('<4sI', header)
+        if chunk_id == b'data':
+            return f.tell()
+        f.seek(size + (size & 1), 1)
+
+
+def splice_track(track_path, clips, silence=(), sample_rate=SAMPLE_RATE):
+    """Overwrite parts of an existing track in place.
+
+    silence is [(start, end)] to blank first (slots of lines that are gone),
+    clips is [(start, end, pcm)] written over their whole slot: the clip,
+    cut at the slot end, then silence. Nothing else in the file is touched,
+    so splicing a few lines into a long track costs only their bytes.
+    """
+    with wave.open(track_path, 'rb') as track:
+        total_frames = track.getnframes()
+    spliced = 0
+    with open(track_path, 'r+b') as f:
+        data = _data_offset(f)
+
+        def write(start, end, pcm):
+            start_frame = min(int(round(start * sample_rate)), total_frames)
+            end_frame = min(int(round(min(end, total_frames / sample_rate) * sample_rate)), total_frames)
+            frames = max(end_frame - start_frame, 0)
+            region = pcm[:frames * SAMPLE_WIDTH]
+            f.seek(data + start_frame * SAMPLE_WIDTH)
+            f.write(region + b'\0' * (frames * SAMPLE_WIDTH - len(region)))
+            return frames
+
+        for start, end in silence:
+            write(start, end, b'')
+        for start, end, pcm in clips:
+            spliced += write(start, end, pcm)
+    logging.info(f"Spliced {len(clips)} clips ({spliced / sample_rate:.1f}s) into {track_path}")
+    return track_path
+
+
+def synthesize_timeline(text_path, output_path, total_duration, polly, voice=VOICE,
+                        max_workers=MAX_WORKERS, cache=None, sample_rate=SAMPLE_RATE):
+    # Synthesize every timecoded line of text_path and lay the clips onto one track
+    with open(text_path, 'r') as f:
+        slots = timeline_slots(parse_lines(f.read()), total_duration)
+
+    clips = render_slots(slots, polly, voice, max_workers, cache, sample_rate)
+    if total_duration is None:
+        total_duration = max((start + pcm_duration(pcm, sample_rate) for start, _, pcm in clips), default=0.0)
+
+    logging.info(f"Synthesized {len(clips)} sentences onto a {total_duration:.1f}s track")
+    return assemble_track(clips, total_duration, output_path, sample_rate)
@@ -0,0 +1,237 @@
+"""Wait for many Amazon Transcribe jobs at once.
+
+Instead of polling every job every 10 seconds, each job gets its own poll
+schedule: the first poll is scheduled from the media duration (Transcribe
+runs well below real time, so there is no point asking early about a long
+clip), later polls back off geometrically up to ``max_delay``. All jobs share
+one client and one overall timeout.
+
+Transcribe writes ``transcripts/<job name>.json`` into the OutputBucketName
+passed to start_transcription_job, so an S3 ObjectCreated notification for
+that key is also accepted as a completion signal via ``notify`` and wakes
+waiters without another GetTranscriptionJob call. The stack sends those
+notifications to its TranscriptQueue; a ``NotificationListener`` feeds them
+to the process's waiter. Polling stays the fallback for notifications that
+are lost or go to another process.
+
+A job is forgotten once no ``wait`` call is waiting on it any more.
+"""
+import json
+import logging
+import math
+import threading
+import time
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+TERMINAL_STATES = ('COMPLETED', 'FAILED')
+
+DEFAULT_TIMEOUT = 4 * 3600
+MIN_DELAY = 2.0
+MAX_DELAY = 60.0
+BACKOFF = 1.5
+# Fraction of the media duration to wait before the first poll
+REALTIME_FACTOR = 0.25
+
+
+class _Job:
+    __slots__ = ('name', 'status', 'uri', 'delay', 'next_poll', 'polls', 'waiters')
+
+    def __init__(self, name, delay, next_poll):
+        self.name = name
+        self.status = None
+        self.uri = None
+        self.delay = delay
+        self.next_poll = next_poll
+        self.polls = 0
+        self.waiters = 0
+
+
+class TranscriptionWaiter:
+    def __init__(self, client=None, timeout=DEFAULT_TIMEOUT, min_delay=MIN_DELAY,
+                 max_delay=MAX_DELAY, backoff=BACKOFF, realtime_factor=REALTIME_FACTOR,
+                 clock=time.monotonic, sleep=None):
+        if client is None:
+            import aws_clients
+            client = aws_clients.get_client('transcribe')
+        self.client = client
+        self.timeout = timeout
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.realtime_factor = realtime_factor
+        self.api_calls = 0
+        self._clock = clock
+        self._sleep = sleep or self._wait_for_wakeup
+        self._cond = threading.Condition()
+        self._jobs = {}
+
+    def _initial_delay(self, media_duration):
+        if not media_duration:
+            return self.min_delay
+        return min(max(media_duration * self.realtime_factor, self.min_delay), self.max_delay)
+
+    def add(self, job_name, media_duration=None):
+        delay = self._initial_delay(media_duration)
+        with self._cond:
+            if job_name not in self._jobs:
+                self._jobs[job_name] = _Job(job_name, delay, self._clock() + delay)
+        return job_name
+
+    def status(self, job_name):
+        with self._cond:
+            job = self._jobs[job_name]
+            return job.status, job.uri
+
+    def notify(self, event):
+        """Feed an S3 event (or an SQS/SNS body carrying one) to the waiter.
+
+        Returns the names of the jobs it completed.
+        """
+        if isinstance(event, (str, bytes)):
+            event = json.loads(event)
+        if 'Message' in event and isinstance(event['Message'], str):
+            event = json.loads(event['Message'])  # SNS envelope
+
+        completed = []
+        with self._cond:
+            for record in event.get('Records', []):
+                if not record.get('eventName', 'ObjectCreated').startswith('ObjectCreated'):
+                    continue
+                s3 = record.get('s3', {})
+                bucket = s3.get('bucket', {}).get('name')
+                key = s3.get('object', {}).get('key', '')
+                if not key.endswith('.json'):
+                    continue
+                job = self._jobs.get(key.rsplit('/', 1)[-1][:-len('.json')])
+                if job is None or job.status in TERMINAL_STATES:
+                    continue
+                job.status = 'COMPLETED'
+                job.uri = f"s3://{bucket}/{key}"
+                completed.append(job.name)
+            if completed:
+                self._cond.notify_all()
+        return completed
+
+    def _poll(self, job):
+        self.api_calls += 1
+        try:
+            response = self.client.get_transcription_job(TranscriptionJobName=job.name)
+        except (BotoCoreError, ClientError) as error:
+            logging.warning(f"Error getting transcription job status for {job.name}: {error}")
+            return None, None
+        job_info = response['TranscriptionJob']
+        return job_info['TranscriptionJobStatus'], job_info.get('Transcript', {}).get('TranscriptFileUri')
+
+    def _claim_due(self, names, now):
+        due = []
+        with self._cond:
+            for name in names:
+                job = self._jobs[name]
+                if job.status not in TERMINAL_STATES and job.next_poll <= now:
+                    job.next_poll = math.inf  # claimed: no other thread polls it meanwhile
+                    due.append(job)
+        return due
+
+    def _wait_for_wakeup(self, delay):
+        with self._cond:
+            self._cond.wait(delay)
+
+    def wait(self, job_names=None, timeout=None):
+        """Block until every named job (default: all added jobs) finishes.
+
+        Returns {job_name: (status, transcript_uri)}; jobs that did not
+        finish before the timeout have status None.
+        """
+        with self._cond:
+            names = list(job_names) if job_names is not None else list(self._jobs)
+            for name in names:
+                self.add(name)
+                self._jobs[name].waiters += 1
+        try:
+            return self._wait(names, timeout)
+        finally:
+            with self._cond:
+                for name in names:
+                    job = self._jobs[name]
+                    job.waiters -= 1
+                    if job.waiters == 0:
+                        del self._jobs[name]
+
+    def _wait(self, names, timeout):
+        deadline = self._clock() + (self.timeout if timeout is None else timeout)
+
+        while True:
+            now = self._clock()
+            for job in self._claim_due(names, now):
+                try:
+                    status, uri = self._poll(job)
+                except Exception as error:
+                    # Not a boto error (e.g. a malformed response): the job must not stay claimed
+                    logging.warning(f"Unexpected error polling transcription job {job.name}: {error!r}")
+                    status, uri = None, None
+                with self._cond:
+                    job.polls += 1
+                    if job.status not in TERMINAL_STATES:  # a notification may have won the race
+                        job.status, job.uri = status, uri
+                    job.delay = min(job.delay * self.backoff, self.max_delay)
+                    job.next_poll = self._clock() + job.delay
+                    self._cond.notify_all()
+
+            with self._cond:
+                pending = [self._jobs[n] for n in names if self._jobs[n].status not in TERMINAL_STATES]
+                if not pending:
+                    break
+                next_poll = min(job.next_poll for job in pending)
+            now = self._clock()
+            if now >= deadline:
+                logging.warning(f"Timed out waiting for {len(pending)} transcription job(s)")
+                break
+            self._sleep(max(0.0, min(next_poll, deadline) - now))
+
+        with self._cond:
+            return {n: (self._jobs[n].status if self._jobs[n].status in TERMINAL_STATES else None,
+                        self._jobs[n].uri) for n in names}
+
+
+class NotificationListener:
+    """Feed the S3 notifications on a queue (see ``pipeline.work_queue``) to a waiter.
+
+    Every process that waits on jobs may listen on the same queue. A
+    notification that completes none of this process's jobs is made visible
+    again for the others, and deleted after ``max_receives`` deliveries.
+    """
+
+    def __init__(self, queue, waiter, wait_seconds=10, retry_delay=1, max_receives=3):
+        self.queue = queue
+        self.waiter = waiter
+        self.wait_seconds = wait_seconds
+        self.retry_delay = retry_delay
+        self.max_receives = max_receives
+        self.stop = threading.Event()
+        self._thread = None
+
+    def handle(self, message):
+        if self.waiter.notify(message.body) or message.receive_count >= self.max_receives:
+            self.queue.delete(message)
+        else:
+            self.queue.extend(message, self.retry_delay)
+
+    def run(self):
+        while not self.stop.is_set():
+            try:
+                for message in self.queue.receive(10, self.wait_seconds):
+                    self.handle(message)
+            except Exception as error:
+                logging.warning(f"Error receiving transcript notifications: {error}")
+                self.stop.wait(self.retry_delay)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='transcript-notifications', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.stop.set()
+        if self._thread:
+            self._thread.join()
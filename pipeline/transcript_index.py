@@ -0,0 +1,434 @@
+"""Persistent search over every processed transcript and translation.
+
+    python -m pipeline.transcript_index search "జై హింద్"
+    python -m pipeline.transcript_index search "prime minister" --language en --from 00:05:00 --to 00:20:00
+    python -m pipeline.transcript_index add --workdir ./jobs      # index runs made before the index existed
+    python -m pipeline.transcript_index stats
+
+Every translated run adds its ``HH:MM:SS: text`` lines, source and
+translations, to the index under TRANSCRIPT_INDEX (./transcript-index/). A
+hit gives the video, the language and the clip as milliseconds: the line's
+timecode up to the next line's.
+
+The index is a set of immutable segments. Each segment is a directory of
+NumPy arrays, opened with ``mmap_mode='r'``, so a query reads only the pages
+it touches:
+
+    term_hash, term_offsets, terms      sorted 64-bit term hashes and the terms
+    post_offsets, post_line, post_pos   positions of every term, by line
+    line_video, line_lang, line_start, line_end, text_offsets, text
+                                        one row per transcript line
+
+``manifest.json`` names the segment holding each video's current lines, so
+indexing a video again supersedes its older lines without rewriting their
+segment. Segments of similar size are merged once MERGE_FACTOR of them
+exist. Merging drops superseded lines, which keeps the segment count
+logarithmic in the corpus.
+"""
+import argparse
+import fcntl
+import functools
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import sys
+import unicodedata
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+from pipeline.workspace import DST_TEXT, SRC_TEXT
+from transcript_lines import parse_lines, timecode_to_seconds
+
+DEFAULT_ROOT = "./transcript-index/"
+MANIFEST = "manifest.json"
+MERGE_FACTOR = 8
+LAST_LINE_MS = 6000  # extent of a video's last line when its duration is unknown
+SOURCE_LANGUAGE = "te-IN"
+TARGET_LANGUAGE = "en-US"
+
+Hit = namedtuple('Hit', 'video language start_ms end_ms text')
+
+ARRAYS = ('term_hash', 'term_offsets', 'terms', 'post_offsets', 'post_line', 'post_pos',
+          'line_video', 'line_lang', 'line_start', 'line_end', 'text_offsets', 'text')
+
+
+@functools.lru_cache(maxsize=1)
+def _token_re():
+    # Letters, digits and combining marks: \w alone splits Telugu words at every vowel sign
+    marks, start = [], None
+    for code in range(0x300, 0x20000):
+        is_mark = unicodedata.category(chr(code)).startswith('M')
+        if is_mark and start is None:
+            start = code
+        elif not is_mark and start is not None:
+            marks.append(f"{re.escape(chr(start))}-{re.escape(chr(code - 1))}")
+            start = None
+    return re.compile(f"(?:[^\\W_]|[{''.join(marks)}])+")
+
+
+def tokenize(text):
+    return _token_re().findall(unicodedata.normalize('NFKC', text).casefold())
+
+
+def term_hash(term):
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _packed(strings):
+    # UTF-8 buffer and offsets of a list of strings
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _clip(text, offsets, i):
+    return bytes(text[offsets[i]:offsets[i + 1]]).decode('utf-8')
+
+
+def write_segment(path, rows, videos, languages):
+    """Write rows [(video index, language index, start_ms, end_ms, text)] as a segment."""
+    postings = {}
+    for line, (_, _, _, _, text) in enumerate(rows):
+        for pos, token in enumerate(tokenize(text)):
+            postings.setdefault(token, []).append((line, pos))
+    terms = sorted(postings, key=term_hash)
+    term_bytes, term_offsets = _packed(terms)
+    post_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(postings[t]) for t in terms], out=post_offsets[1:])
+    flat = [p for t in terms for p in postings[t]]
+    text, text_offsets = _packed([row[4] for row in rows])
+    arrays = {
+        'term_hash': np.array([term_hash(t) for t in terms], dtype=np.uint64),
+        'term_offsets': term_offsets,
+        'terms': term_bytes,
+        'post_offsets': post_offsets,
+        'post_line': np.array([line for line, _ in flat], dtype=np.uint32),
+        'post_pos': np.array([pos for _, pos in flat], dtype=np.uint32),
+        'line_video': np.array([row[0] for row in rows], dtype=np.uint32),
+        'line_lang': np.array([row[1] for row in rows], dtype=np.uint8),
+        'line_start': np.array([row[2] for row in rows], dtype=np.uint32),
+        'line_end': np.array([row[3] for row in rows], dtype=np.uint32),
+        'text_offsets': text_offsets,
+        'text': text,
+    }
+    tmp = f"{path}.tmp"
+    os.makedirs(tmp)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), array)
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump({'videos': videos, 'languages': languages}, f, ensure_ascii=False)
+    os.rename(tmp, path)
+
+
+class Segment:
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        self.videos = meta['videos']
+        self.languages = meta['languages']
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r'))
+
+    def __len__(self):
+        return len(self.line_video)
+
+    def postings(self, term):
+        # (line ids, positions) of term, None when the segment never saw it
+        h = np.uint64(term_hash(term))
+        lo, hi = np.searchsorted(self.term_hash, h, 'left'), np.searchsorted(self.term_hash, h, 'right')
+        for i in range(lo, hi):
+            if _clip(self.terms, self.term_offsets, i) == term:
+                start, end = self.post_offsets[i], self.post_offsets[i + 1]
+                return self.post_line[start:end], self.post_pos[start:end]
+        return None
+
+    def phrase_lines(self, tokens):
+        # Lines holding tokens at consecutive positions, ascending
+        keys = None
+        for offset, token in enumerate(tokens):
+            found = self.postings(token)
+            if found is None:
+                return np.zeros(0, dtype=np.int64)
+            lines, positions = found
+            shifted = (lines.astype(np.int64) << 32) + (positions.astype(np.int64) - offset)
+            keys = shifted if keys is None else np.intersect1d(keys, shifted, assume_unique=True)
+        return np.unique(keys >> 32)
+
+    def text_of(self, line):
+        return _clip(self.text, self.text_offsets, line)
+
+    def rows(self, live):
+        # (video id, language, start_ms, end_ms, text) of the lines whose video is in live
+        text, offsets = bytes(self.text), self.text_offsets.tolist()
+        for line, (video, language, start, end) in enumerate(zip(
+                self.line_video.tolist(), self.line_lang.tolist(), self.line_start.tolist(), self.line_end.tolist())):
+            if self.videos[video] in live:
+                yield (self.videos[video], self.languages[language], start, end,
+                       text[offsets[line]:offsets[line + 1]].decode('utf-8'))
+
+
+def transcript_rows(video, transcripts, duration=None):
+    # Rows of one video from {language: transcript path}
+    rows = []
+    for language, path in transcripts.items():
+        with open(path, 'r') as f:
+            lines = [(tc, text.strip()) for tc, text in parse_lines(f.read()) if tc is not None]
+        for i, (timecode, text) in enumerate(lines):
+            start = timecode_to_seconds(timecode) * 1000
+            if i + 1 < len(lines):
+                end = timecode_to_seconds(lines[i + 1][0]) * 1000
+            else:
+                end = max(start, int(duration * 1000)) if duration else start + LAST_LINE_MS
+            if text:
+                rows.append((video, language, start, max(start, end), text))
+    return rows
+
+
+def language_matches(code, wanted):
+    # "en" selects en-US too
+    return not wanted or code in wanted or code.split('-')[0] in wanted
+
+
+class TranscriptIndex:
+    def __init__(self, root=DEFAULT_ROOT, merge_factor=MERGE_FACTOR):
+        self.root = root
+        self.merge_factor = merge_factor
+        self._segments = {}  # name -> open Segment
+        os.makedirs(os.path.join(root, 'segments'), exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        # Writers in other processes (batch workers) wait for each other
+        with open(os.path.join(self.root, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def manifest(self):
+        try:
+            with open(os.path.join(self.root, MANIFEST), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'version': 1, 'segments': {}, 'videos': {}}
+
+    def _save_manifest(self, manifest):
+        tmp = os.path.join(self.root, f".{MANIFEST}.tmp")
+        with open(tmp, 'w') as f:
+            # json.dumps without indent runs in C; the manifest lists every video
+            f.write(json.dumps(manifest, ensure_ascii=False))
+        os.replace(tmp, os.path.join(self.root, MANIFEST))
+
+    def _segment(self, name):
+        if name not in self._segments:
+            self._segments[name] = Segment(os.path.join(self.root, 'segments', name))
+        return self._segments[name]
+
+    def _write(self, rows, manifest):
+        # A new segment from (video id, language, ...) rows, registered in manifest
+        videos = list(dict.fromkeys(row[0] for row in rows))
+        languages = list(dict.fromkeys(row[1] for row in rows))
+        video_index = {v: i for i, v in enumerate(videos)}
+        language_index = {code: i for i, code in enumerate(languages)}
+        manifest['next_segment'] = manifest.get('next_segment', 0) + 1
+        name = f"{manifest['next_segment']:08d}-{uuid.uuid4().hex[:8]}"
+        write_segment(os.path.join(self.root, 'segments', name),
+                      [(video_index[v], language_index[lang], start, end, text) for v, lang, start, end, text in rows],
+                      videos, languages)
+        manifest['segments'][name] = {'lines': len(rows), 'videos': videos}
+        return name
+
+    def add(self, video, transcripts, source=None, duration=None):
+        """Index the lines of {language: transcript path} as video's, superseding earlier ones."""
+        rows = transcript_rows(video, transcripts, duration)
+        with self._locked():
+            manifest = self.manifest()
+            name = self._write(rows, manifest) if rows else None
+            manifest['videos'][video] = {'segment': name, 'source': source, 'languages': sorted(transcripts),
+                                         'lines': len(rows)}
+            self._drop_dead(manifest)
+            self._merge(manifest)
+            self._save_manifest(manifest)
+        return len(rows)
+
+    def _live(self, manifest, name):
+        return {video for video in manifest['segments'][name]['videos']
+                if manifest['videos'].get(video, {}).get('segment') == name}
+
+    def _drop_dead(self, manifest):
+        for name in [n for n in manifest['segments'] if not self._live(manifest, n)]:
+            del manifest['segments'][name]
+            self._remove(name)
+
+    def _remove(self, name):
+        # Readers that still have the arrays mapped keep reading them
+        self._segments.pop(name, None)
+        shutil.rmtree(os.path.join(self.root, 'segments', name), ignore_errors=True)
+
+    def _merge(self, manifest, everything=False):
+        # Merge merge_factor segments of the same size tier (all of them when everything)
+        while True:
+            tiers = {}
+            for name, info in sorted(manifest['segments'].items()):
+                tier = 0 if everything else int(math.log(max(info['lines'], 1), self.merge_factor))
+                tiers.setdefault(tier, []).append(name)
+            group = next((names for names in tiers.values()
+                          if len(names) >= (2 if everything else self.merge_factor)), None)
+            if group is None:
+                return
+            rows = [row for name in group for row in self._segment(name).rows(self._live(manifest, name))]
+            merged = self._write(rows, manifest)
+            for video in manifest['segments'][merged]['videos']:
+                manifest['videos'][video]['segment'] = merged
+            for name in group:
+                del manifest['segments'][name]
+                self._remove(name)
+            logging.info(f"Merged {len(group)} index segments into {merged} ({len(rows)} lines)")
+
+    def compact(self):
+        # One segment holding only current lines
+        with self._locked():
+            manifest = self.manifest()
+            self._drop_dead(manifest)
+            self._merge(manifest, everything=True)
+            self._save_manifest(manifest)
+
+    def search(self, phrase, languages=None, start_ms=None, end_ms=None, videos=None, limit=None):
+        """Lines containing phrase, as Hits sorted by video, language and time.
+
+        languages selects codes ("en" includes "en-US"); start_ms/end_ms keep
+        the lines whose clip overlaps that range; videos restricts the job ids.
+        """
+        tokens = tokenize(phrase)
+        if not tokens:
+            return []
+        manifest = self.manifest()
+        hits = []
+        for name in manifest['segments']:
+            live = self._live(manifest, name)
+            if videos:
+                live &= set(videos)
+            if not live:
+                continue
+            segment = self._segment(name)
+            lines = segment.phrase_lines(tokens)
+            if not len(lines):
+                continue
+            keep = np.isin(segment.line_video[lines], [i for i, v in enumerate(segment.videos) if v in live])
+            keep &= np.isin(segment.line_lang[lines], [i for i, code in enumerate(segment.languages)
+                                                        if language_matches(code, languages)])
+            if start_ms is not None:
+                keep &= segment.line_end[lines] > start_ms
+            if end_ms is not None:
+                keep &= segment.line_start[lines] < end_ms
+            for line in lines[keep]:
+                hits.append(Hit(segment.videos[segment.line_video[line]], segment.languages[segment.line_lang[line]],
+                                int(segment.line_start[line]), int(segment.line_end[line]), segment.text_of(line)))
+        hits.sort(key=lambda hit: (hit.video, hit.language, hit.start_ms))
+        return hits[:limit] if limit else hits
+
+    def stats(self):
+        manifest = self.manifest()
+        size = 0
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, 'segments')):
+            size += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+        return {
+            'videos': sum(1 for info in manifest['videos'].values() if info['segment']),
+            'lines': sum(info['lines'] for info in manifest['videos'].values()),
+            'segments': len(manifest['segments']),
+            'terms': sum(len(self._segment(name).term_hash) for name in manifest['segments']),
+            'bytes': size,
+        }
+
+
+def from_env(default_root=DEFAULT_ROOT):
+    # TRANSCRIPT_INDEX overrides the directory, TRANSCRIPT_INDEX_DISABLED=1 turns indexing off (None)
+    if os.environ.get('TRANSCRIPT_INDEX_DISABLED') == '1':
+        return None
+    return TranscriptIndex(os.environ.get('TRANSCRIPT_INDEX') or default_root)
+
+
+def job_transcripts(job_dir, source_language=SOURCE_LANGUAGE, target_language=TARGET_LANGUAGE):
+    # {language: path} of the transcripts a finished run left in job_dir
+    from pipeline.languages import TARGETS
+    found = {}
+    for name, language in ((SRC_TEXT, source_language), (DST_TEXT, target_language)):
+        if os.path.exists(os.path.join(job_dir, name)):
+            found[language] = os.path.join(job_dir, name)
+    for code in TARGETS:
+        path = os.path.join(job_dir, f"{code}_text.txt")
+        if os.path.exists(path):
+            found[code] = path
+    return found
+
+
+def parse_offset(value):
+    # "HH:MM:SS", "MM:SS" or seconds -> milliseconds
+    parts = value.split(':')
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return int(round(seconds * 1000))
+
+
+def format_ms(ms):
+    seconds, ms = divmod(ms, 1000)
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}.{ms:03d}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search every processed transcript and translation")
+    parser.add_argument('--index', default=os.environ.get('TRANSCRIPT_INDEX') or DEFAULT_ROOT,
+                        help="index directory (default: TRANSCRIPT_INDEX or ./transcript-index/)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    search = commands.add_parser('search', help="find the clips where a phrase was said")
+    search.add_argument('phrase')
+    search.add_argument('--language', action='append', help="language code, repeatable (en matches en-US)")
+    search.add_argument('--from', dest='start', help="clips ending after this offset (HH:MM:SS or seconds)")
+    search.add_argument('--to', dest='end', help="clips starting before this offset")
+    search.add_argument('--video', action='append', help="job id, repeatable")
+    search.add_argument('--limit', type=int)
+    search.add_argument('--json', action='store_true', help="one JSON object per hit")
+    add = commands.add_parser('add', help="index the transcripts of finished job directories")
+    add.add_argument('--workdir', default="./jobs", help="directory of job directories")
+    add.add_argument('--source-language', default=SOURCE_LANGUAGE)
+    add.add_argument('--target-language', default=TARGET_LANGUAGE)
+    commands.add_parser('compact', help="merge every segment into one")
+    commands.add_parser('stats')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    index = TranscriptIndex(args.index)
+
+    if args.command == 'search':
+        hits = index.search(args.phrase, args.language, args.start and parse_offset(args.start),
+                            args.end and parse_offset(args.end), args.video, args.limit)
+        for hit in hits:
+            if args.json:
+                print(json.dumps(hit._asdict(), ensure_ascii=False))
+            else:
+                print(f"{hit.video}\t{hit.language}\t{format_ms(hit.start_ms)}\t"
+                      f"{hit.start_ms}-{hit.end_ms}\t{hit.text}")
+        return 0 if hits else 1
+    if args.command == 'add':
+        jobs = sorted(entry.path for entry in os.scandir(args.workdir) if entry.is_dir())
+        lines = 0
+        for job_dir in jobs:
+            transcripts = job_transcripts(job_dir, args.source_language, args.target_language)
+            if transcripts:
+                lines += index.add(os.path.basename(job_dir), transcripts)
+        logging.info(f"Indexed {lines} lines of {len(jobs)} jobs")
+    elif args.command == 'compact':
+        index.compact()
+    print(json.dumps(index.stats()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""Message queues for the worker fleet (``pipeline.workers``).
+
+Three implementations with the same small interface and SQS semantics:
+
+    send(body)                 enqueue a JSON-serializable dict
+    receive(max_messages, wait_seconds)
+                               [Message] made invisible for visibility_timeout
+    delete(message)            acknowledge; False if the receipt went stale
+    extend(message, seconds)   keep a message invisible while its stage runs
+
+A received message that is neither deleted nor extended becomes visible
+again after the timeout, so a crashed worker's stage is picked up by another
+one. A message received more than max_receives times is moved to the dead
+letter queue instead of being handed out again.
+
+    InMemoryQueue   threads of one process
+    FileQueue       processes or hosts sharing a directory, built on atomic
+                    renames, with the visibility deadline kept as the file mtime
+    SQSQueue        the stack's WorkQueue; dead-lettering is the queue's
+                    redrive policy (see app.py)
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+VISIBILITY_TIMEOUT = 900  # seconds; longer than one stage takes
+MAX_RECEIVES = 5
+CLAIM_TIMEOUT = 60  # a FileQueue receiver that died between rename and deadline
+
+Message = namedtuple('Message', 'id body receipt receive_count')
+
+
+class InMemoryQueue:
+    def __init__(self, visibility_timeout=VISIBILITY_TIMEOUT, max_receives=MAX_RECEIVES, clock=time.monotonic):
+        self.visibility_timeout = visibility_timeout
+        self.max_receives = max_receives
+        self.clock = clock
+        self.dead = []  # bodies of dead-lettered messages
+        self._messages = {}  # id -> [body, visible_at, receive_count, receipt]
+        self._cond = threading.Condition()
+
+    def send(self, body):
+        with self._cond:
+            self._messages[uuid.uuid4().hex] = [json.loads(json.dumps(body)), self.clock(), 0, None]
+            self._cond.notify_all()
+
+    def receive(self, max_messages=1, wait_seconds=0):
+        deadline = time.monotonic() + wait_seconds
+        with self._cond:
+            while True:
+                received = self._take(max_messages)
+                remaining = deadline - time.monotonic()
+                if received or remaining <= 0:
+                    return received
+                self._cond.wait(min(remaining, 0.1))
+
+    def _take(self, max_messages):
+        now, received = self.clock(), []
+        for message_id, entry in list(self._messages.items()):
+            if len(received) == max_messages:
+                break
+            body, visible_at, count, _ = entry
+            if visible_at > now:
+                continue
+            if count >= self.max_receives:
+                self.dead.append(self._messages.pop(message_id)[0])
+                continue
+            receipt = uuid.uuid4().hex
+            self._messages[message_id] = [body, now + self.visibility_timeout, count + 1, receipt]
+            received.append(Message(message_id, body, receipt, count + 1))
+        return received
+
+    def _owned(self, message):
+        entry = self._messages.get(message.id)
+        return entry is not None and entry[3] == message.receipt
+
+    def delete(self, message):
+        with self._cond:
+            if not self._owned(message):
+                return False
+            del self._messages[message.id]
+            return True
+
+    def extend(self, message, seconds):
+        with self._cond:
+            if self._owned(message):
+                self._messages[message.id][1] = self.clock() + seconds
+                if seconds == 0:
+                    self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._messages)
+
+
+class FileQueue:
+    """A queue in a directory: ready/<id>.json, inflight/<id>.<receipt>.json, dead/<id>.json.
+
+    Receiving renames a ready file to inflight/<id>.<receipt>.claim (only one
+    process can win the rename), sets its mtime to the visibility deadline and
+    renames it to .json. Any receiver moves expired .json files, and claims
+    abandoned mid-way, back to ready/.
+    """
+
+    def __init__(self, root, visibility_timeout=VISIBILITY_TIMEOUT, max_receives=MAX_RECEIVES, poll_interval=0.2):
+        self.root = root
+        self.visibility_timeout = visibility_timeout
+        self.max_receives = max_receives
+        self.poll_interval = poll_interval
+        for name in ('ready', 'inflight', 'dead'):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def _write(self, path, record):
+        tmp = self._path(f".tmp-{uuid.uuid4().hex}")
+        with open(tmp, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp, path)
+
+    def send(self, body):
+        # Time-ordered ids, so ready/ lists oldest first
+        message_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        self._write(self._path('ready', f"{message_id}.json"), {'body': body, 'receive_count': 0})
+
+    def _reclaim(self):
+        now = time.time()
+        for name in os.listdir(self._path('inflight')):
+            path = self._path('inflight', name)
+            try:
+                # The rename of a claim updates its ctime, not its mtime
+                expired = (os.path.getmtime(path) <= now if name.endswith('.json')
+                           else os.path.getctime(path) <= now - CLAIM_TIMEOUT)
+                if expired:
+                    os.rename(path, self._path('ready', f"{name.split('.')[0]}.json"))
+            except FileNotFoundError:
+                pass  # deleted, or reclaimed by another process
+
+    def receive(self, max_messages=1, wait_seconds=0):
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            self._reclaim()
+            received = []
+            for name in sorted(os.listdir(self._path('ready'))):
+                if len(received) == max_messages:
+                    break
+                message_id = name[:-len('.json')]
+                receipt = uuid.uuid4().hex
+                claim = self._path('inflight', f"{message_id}.{receipt}.claim")
+                try:
+                    os.rename(self._path('ready', name), claim)
+                except FileNotFoundError:
+                    continue  # another receiver won
+                with open(claim, 'r') as f:
+                    record = json.load(f)
+                if record['receive_count'] >= self.max_receives:
+                    os.rename(claim, self._path('dead', name))
+                    continue
+                record['receive_count'] += 1
+                self._write(claim, record)
+                expires = time.time() + self.visibility_timeout
+                os.utime(claim, (expires, expires))
+                os.rename(claim, self._path('inflight', f"{message_id}.{receipt}.json"))
+                received.append(Message(message_id, record['body'], receipt, record['receive_count']))
+            if received or time.monotonic() >= deadline:
+                return received
+            time.sleep(self.poll_interval)
+
+    def _inflight(self, message):
+        return self._path('inflight', f"{message.id}.{message.receipt}.json")
+
+    def delete(self, message):
+        try:
+            os.remove(self._inflight(message))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def extend(self, message, seconds):
+        expires = time.time() + seconds
+        try:
+            os.utime(self._inflight(message), (expires, expires))
+        except FileNotFoundError:
+            pass
+
+    @property
+    def dead(self):
+        bodies = []
+        for name in sorted(os.listdir(self._path('dead'))):
+            with open(self._path('dead', name), 'r') as f:
+                bodies.append(json.load(f)['body'])
+        return bodies
+
+    def __len__(self):
+        return len(os.listdir(self._path('ready'))) + len(os.listdir(self._path('inflight')))
+
+
+class SQSQueue:
+    def __init__(self, queue_url, client=None, visibility_timeout=None):
+        import aws_clients
+        self.queue_url = queue_url
+        self.sqs = client or aws_clients.get_client('sqs')
+        # None: the queue's own VisibilityTimeout
+        self.visibility_timeout = visibility_timeout
+
+    def send(self, body):
+        self.sqs.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(body))
+
+    def receive(self, max_messages=1, wait_seconds=0):
+        kwargs = {'QueueUrl': self.queue_url, 'MaxNumberOfMessages': min(max_messages, 10),
+                  'WaitTimeSeconds': min(int(wait_seconds), 20), 'AttributeNames': ['ApproximateReceiveCount']}
+        if self.visibility_timeout is not None:
+            kwargs['VisibilityTimeout'] = self.visibility_timeout
+        response = self.sqs.receive_message(**kwargs)
+        return [Message(m['MessageId'], json.loads(m['Body']), m['ReceiptHandle'],
+                        int(m.get('Attributes', {}).get('ApproximateReceiveCount', 1)))
+                for m in response.get('Messages', [])]
+
+    def delete(self, message):
+        self.sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=message.receipt)
+        return True
+
+    def extend(self, message, seconds):
+        self.sqs.change_message_visibility(QueueUrl=self.queue_url, ReceiptHandle=message.receipt,
+                                          VisibilityTimeout=int(seconds))
+
+
+def open_queue(spec, visibility_timeout=VISIBILITY_TIMEOUT, max_receives=MAX_RECEIVES):
+    # "memory", "file:///shared/queue" (or a plain directory) or an SQS queue URL
+    if spec == 'memory':
+        return InMemoryQueue(visibility_timeout, max_receives)
+    if spec.startswith('https://'):
+        return SQSQueue(spec)
+    path = spec[len('file://'):] if spec.startswith('file://') else spec
+    return FileQueue(path, visibility_timeout, max_receives)
@@ -0,0 +1,288 @@
+"""Stateless stage workers that pull the next stage of a job from a queue.
+
+    python -m pipeline.workers submit --queue /shared/queue --input-dir ./mediadir --workdir /shared/jobs
+    python -m pipeline.workers work --queue /shared/queue --workdir /shared/jobs --workers 8
+    python -m pipeline.workers work --workdir /shared/jobs      # the stack's SQS WorkQueue
+    python -m pipeline.workers run --input-dir ./mediadir       # in-memory queue, exits when done
+
+A message names one stage of one job, {"stage": "transcribe", "workspace": {...}}.
+A worker runs that stage with ``driver.run_stages`` and, on success, sends
+the next stage's message before it deletes its own. Videos uploaded to
+incoming/ in the audio bucket reach the stack's queue as S3 event
+notifications. A worker downloads the video into the workdir and enqueues its
+first stage. The object's ETag is kept next to the download: a duplicate
+notification for the same object neither downloads it again nor restarts a
+job that is already under way.
+
+Duplicate deliveries are harmless. A stage the job's checkpoint already has
+as done is not run again, and only its successor is enqueued, in case the
+worker that ran it died before doing so. A lease file in the job directory
+keeps two workers from running the same stage at the same time. While a
+stage runs, its message is kept invisible by a heartbeat. A failing stage is
+not deleted. It is retried after a backoff and dead-lettered once it has
+been received MAX_RECEIVES times.
+
+Stages hand files to each other through the job's workspace. Workers on
+different hosts therefore need the workdir on shared storage (EFS, NFS).
+"""
+import argparse
+import dataclasses
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
+
+import transcribe_video_tel2eng as driver
+from pipeline import checkpoint, work_queue
+from pipeline.batch import discover_videos, load_manifest, make_workspaces
+from pipeline.workspace import Workspace
+
+INCOMING_PREFIX = "incoming/"
+RETRY_BASE = 30  # seconds before a failed stage is tried again, doubled per receive
+WAIT_SECONDS = 10
+
+
+def stage_message(ws, stage):
+    return {'type': 'stage', 'stage': stage, 'workspace': dataclasses.asdict(ws)}
+
+
+def next_stage(stage):
+    order = driver.active_stages()
+    index = order.index(stage) + 1
+    return order[index] if index < len(order) else None
+
+
+def submit(queue, workspaces, restart=False):
+    # Enqueue the first stage of every job
+    for ws in workspaces:
+        if restart:
+            ws.makedirs()
+            driver.load_checkpoint(ws, reload=True).clear()
+        queue.send(stage_message(ws, driver.active_stages()[0]))
+    return len(workspaces)
+
+
+def s3_objects(body):
+    # (bucket, key, ETag or None) of every object-created record in an S3 event notification
+    return [(record['s3']['bucket']['name'], unquote_plus(record['s3']['object']['key']),
+             record['s3']['object'].get('eTag'))
+            for record in body.get('Records', [])
+            if record.get('eventSource') == 'aws:s3' and record.get('eventName', '').startswith('ObjectCreated')]
+
+
+class Lease:
+    """An exclusive claim on one stage of one job, by file creation; stale after ttl seconds."""
+
+    def __init__(self, ws, stage, ttl):
+        self.path = os.path.join(ws.output_dir, f".lease-{stage}")
+        self.ttl = ttl
+
+    def acquire(self, owner):
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) < self.ttl:
+                        return False
+                    os.remove(self.path)  # its worker stopped renewing it
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, 'w') as f:
+                f.write(owner)
+            return True
+        return False
+
+    def renew(self):
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            pass
+
+    def release(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class Worker:
+    def __init__(self, queue, bucket_name, workdir, visibility_timeout=work_queue.VISIBILITY_TIMEOUT):
+        self.queue = queue
+        self.bucket_name = bucket_name
+        self.workdir = workdir
+        self.visibility_timeout = visibility_timeout
+        self.worker_id = f"{os.uname().nodename}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.processed = 0
+
+    def _heartbeat(self, message, lease, stop):
+        # Keep the message invisible and the lease fresh while the stage runs
+        while not stop.wait(self.visibility_timeout / 3):
+            self.queue.extend(message, self.visibility_timeout)
+            lease.renew()
+
+    def run_stage(self, message, ws, stage):
+        lease = Lease(ws, stage, self.visibility_timeout)
+        if not lease.acquire(self.worker_id):
+            # Another worker has it; look again once that one would have finished or died
+            logging.info(f"{ws.job_id}: {stage} is running elsewhere")
+            self.queue.extend(message, self.visibility_timeout)
+            return False
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(message, lease, stop), daemon=True)
+        heartbeat.start()
+        try:
+            driver.run_stages(self.bucket_name, ws, (stage,))
+            return True
+        except Exception as error:
+            delay = min(self.visibility_timeout, RETRY_BASE * 2 ** (message.receive_count - 1))
+            logging.error(f"{ws.job_id}: {stage} failed (receive {message.receive_count}), "
+                          f"retrying in {delay}s: {error}")
+            self.queue.extend(message, delay)
+            return False
+        finally:
+            stop.set()
+            heartbeat.join()
+            lease.release()
+
+    def handle(self, message):
+        # True when the message was acknowledged
+        body = message.body
+        if body.get('type') != 'stage':
+            for bucket, key, etag in s3_objects(body):
+                ws = self.download(bucket, key, etag)
+                if ws:
+                    self.queue.send(stage_message(ws, driver.active_stages()[0]))
+            return self.queue.delete(message)  # S3 test events and unknown messages are dropped too
+
+        ws = Workspace(**body['workspace'])
+        stage = body['stage']
+        ws.makedirs()
+        if driver.load_checkpoint(ws, reload=True).done(stage):
+            logging.info(f"{ws.job_id}: {stage} already done, duplicate delivery")
+        elif not self.run_stage(message, ws, stage):
+            return False
+
+        following = next_stage(stage)
+        if following:
+            self.queue.send(stage_message(ws, following))
+        else:
+            logging.info(f"{ws.job_id}: done: {driver.load_checkpoint(ws).result(stage)}")
+        self.processed += 1
+        return self.queue.delete(message)
+
+    def download(self, bucket, key, etag=None):
+        # An upload to incoming/ becomes a job on its own copy of the video. None when this
+        # version of the object was queued before: stages may be reading the copy right now
+        path = os.path.join(self.workdir, 'incoming', key[len(INCOMING_PREFIX):] if key.startswith(INCOMING_PREFIX)
+                            else os.path.basename(key))
+        if etag and os.path.exists(path) and checkpoint.source_etag(path) == etag:
+            ws = Workspace.for_video(path, self.workdir)
+            if driver.load_checkpoint(ws, reload=True).started():
+                logging.info(f"s3://{bucket}/{key} is already a job, duplicate notification")
+                return None
+            # Downloaded, but the worker may have died before queueing it
+            return ws
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Into place with a rename, so a reader of an older version keeps its file
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.part"
+        try:
+            driver.download_file(bucket, key, tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        if etag:
+            checkpoint.record_source_etag(path, etag)
+        elif os.path.exists(path + checkpoint.SOURCE_ETAG_SUFFIX):
+            os.remove(path + checkpoint.SOURCE_ETAG_SUFFIX)  # it was for another version
+        logging.info(f"Queued s3://{bucket}/{key} as a new job")
+        return Workspace.for_video(path, self.workdir)
+
+    def run(self, stop=None, idle_exit=None):
+        """Handle messages until stop is set, or until the queue stayed empty for idle_exit seconds."""
+        stop = stop or threading.Event()
+        idle_since = time.monotonic()
+        while not stop.is_set():
+            messages = self.queue.receive(1, WAIT_SECONDS if idle_exit is None else min(WAIT_SECONDS, idle_exit))
+            if messages:
+                idle_since = time.monotonic()
+            elif idle_exit is not None and time.monotonic() - idle_since >= idle_exit:
+                return
+            for message in messages:
+                try:
+                    self.handle(message)
+                except Exception:
+                    # Left on the queue: visible again after the timeout, dead-lettered eventually
+                    logging.exception(f"Worker {self.worker_id} could not handle message {message.id}")
+
+
+def run_workers(queue, bucket_name, workdir, workers, stop=None, idle_exit=None,
+                visibility_timeout=work_queue.VISIBILITY_TIMEOUT):
+    # A pool of worker threads in this process; start more processes or hosts to scale further
+    fleet = [Worker(queue, bucket_name, workdir, visibility_timeout) for _ in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for worker in fleet:
+            pool.submit(worker.run, stop, idle_exit)
+    return sum(worker.processed for worker in fleet)
+
+
+def queue_spec(args):
+    # --queue, WORK_QUEUE, or the stack's SQS queue
+    spec = args.queue or os.environ.get('WORK_QUEUE')
+    if spec:
+        return spec
+    return driver.get_discovery().work_queue_url()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Queue-driven pipeline workers")
+    parser.add_argument('command', choices=('submit', 'work', 'run'))
+    parser.add_argument('--queue', help="queue directory, file:// URL or SQS queue URL "
+                                        "(default: WORK_QUEUE, else the stack's WorkQueue)")
+    parser.add_argument('--workdir', default="./jobs", help="root for per-job workspaces (shared storage)")
+    parser.add_argument('--bucket', help="audio bucket (discovered from the account if omitted)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--manifest', help="text file with one video path per line")
+    source.add_argument('--input-dir', help="directory of videos to process")
+    parser.add_argument('--workers', type=int, default=4, help="worker threads in this process")
+    parser.add_argument('--visibility-timeout', type=int, default=work_queue.VISIBILITY_TIMEOUT)
+    parser.add_argument('--max-receives', type=int, default=work_queue.MAX_RECEIVES)
+    parser.add_argument('--idle-exit', type=float, help="stop after the queue was empty this many seconds")
+    parser.add_argument('--restart', action='store_true', help="submit: ignore checkpoints of earlier runs")
+    args = parser.parse_args(argv)
+    driver.configure_logging()
+    # Workers always continue jobs; --restart clears checkpoints when submitting instead
+    driver.resume_runs = True
+
+    try:
+        spec = 'memory' if args.command == 'run' else queue_spec(args)
+        queue = work_queue.open_queue(spec, args.visibility_timeout, args.max_receives)
+        if args.command in ('submit', 'run'):
+            if not (args.manifest or args.input_dir):
+                parser.error(f"{args.command} needs --manifest or --input-dir")
+            videos = load_manifest(args.manifest) if args.manifest else discover_videos(args.input_dir)
+            count = submit(queue, make_workspaces(videos, args.workdir), args.restart)
+            logging.info(f"Submitted {count} jobs")
+            if args.command == 'submit':
+                return 0
+        bucket_name = args.bucket or driver.retrieve_audio_bucket()
+    except (driver.PipelineError, driver.discovery.DiscoveryError) as error:
+        logging.error(error)
+        return getattr(error, 'exit_code', 1)
+
+    idle_exit = args.idle_exit if args.command == 'work' else 1.0
+    processed = run_workers(queue, bucket_name, args.workdir, args.workers, idle_exit=idle_exit,
+                            visibility_timeout=args.visibility_timeout)
+    dead = getattr(queue, 'dead', [])
+    logging.info(f"Workers handled {processed} stages, {len(dead)} dead-lettered")
+    return 1 if dead else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
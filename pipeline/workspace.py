@@ -0,0 +1,129 @@
+"""Per-job working directories so that concurrent runs never share files."""
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+
+# File names used inside every job directory (same names the single-video
+# driver has always used).
+VIDEO_ONLY = "video_only.mp4"
+AUDIO_ONLY = "telugu_audio.mp3"
+SRC_TEXT = "telugu_text.txt"
+DST_TEXT = "english_text.txt"
+DST_AUDIO = "english_audio.mp3"
+DST_TRACK = "english_audio.wav"
+DST_VIDEO = "english_video.mp4"
+DST_SRT = "english_text.srt"
+DST_VTT = "english_text.vtt"
+SUBTITLED_VIDEO = "english_subtitled"
+MULTILINGUAL_VIDEO = "multilingual_video"
+TIME_MAP = "time_map.json"
+LINE_RECORD = "line_record.json"
+EDITED_LINES = "edited_lines.txt"
+EDITED_TRANSLATION = "edited_translation.txt"
+
+# Prefix for every object a job writes to the audio bucket
+S3_JOB_PREFIX = "jobs/"
+
+
+def job_id_for(input_video_path):
+    # Readable stem plus a short digest of the absolute path, so two clips
+    # called "intro.mp4" in different directories still get distinct jobs.
+    stem = os.path.splitext(os.path.basename(input_video_path))[0]
+    stem = re.sub(r'[^0-9A-Za-z._-]+', '-', stem).strip('-') or "video"
+    digest = hashlib.sha1(os.path.abspath(input_video_path).encode('utf-8')).hexdigest()[:8]
+    return f"{stem}-{digest}"
+
+
+@dataclass(frozen=True)
+class Workspace:
+    """Local paths and S3 keys that belong to exactly one pipeline job."""
+    job_id: str
+    input_video_path: str
+    media_dir: str
+    output_dir: str
+
+    @classmethod
+    def for_video(cls, input_video_path, root):
+        job_id = job_id_for(input_video_path)
+        job_dir = os.path.join(root, job_id)
+        return cls(job_id, input_video_path, job_dir, job_dir)
+
+    @property
+    def video_only(self):
+        return os.path.join(self.media_dir, VIDEO_ONLY)
+
+    @property
+    def audio_only(self):
+        return os.path.join(self.media_dir, AUDIO_ONLY)
+
+    def audio_file(self, media_format):
+        # Extracted audio in another container (preprocessing can write flac/ogg)
+        return os.path.splitext(self.audio_only)[0] + f".{media_format}"
+
+    @property
+    def time_map_path(self):
+        # Removed-interval map written when preprocessing cuts non-speech audio
+        return os.path.join(self.media_dir, TIME_MAP)
+
+    @property
+    def src_text(self):
+        return os.path.join(self.output_dir, SRC_TEXT)
+
+    @property
+    def dst_text(self):
+        return os.path.join(self.output_dir, DST_TEXT)
+
+    @property
+    def audio_path(self):
+        return os.path.join(self.output_dir, DST_AUDIO)
+
+    @property
+    def track_path(self):
+        # Timeline-aligned dubbed track written by pipeline.synthesis
+        return os.path.join(self.output_dir, DST_TRACK)
+
+    @property
+    def output_video_path(self):
+        return os.path.join(self.output_dir, DST_VIDEO)
+
+    @property
+    def srt_path(self):
+        return os.path.join(self.output_dir, DST_SRT)
+
+    @property
+    def vtt_path(self):
+        return os.path.join(self.output_dir, DST_VTT)
+
+    def subtitled_video_path(self, container):
+        # Original streams plus the English subtitle track, in a container like the input's
+        return os.path.join(self.output_dir, SUBTITLED_VIDEO + container)
+
+    @property
+    def line_record_path(self):
+        # Source lines and the translations the current outputs were built from
+        return os.path.join(self.output_dir, LINE_RECORD)
+
+    @property
+    def edited_lines(self):
+        # Just the lines an editor changed, sent to Translate by an incremental re-run
+        return os.path.join(self.output_dir, EDITED_LINES)
+
+    @property
+    def edited_translation(self):
+        return os.path.join(self.output_dir, EDITED_TRANSLATION)
+
+    def language_file(self, language, name):
+        # Per-language output of a multi-language run, e.g. hi_text.txt
+        return os.path.join(self.output_dir, f"{language}_{name}")
+
+    def multilingual_video_path(self, container):
+        return os.path.join(self.output_dir, MULTILINGUAL_VIDEO + container)
+
+    def key(self, path):
+        # S3 key for a local workspace file
+        return f"{S3_JOB_PREFIX}{self.job_id}/{os.path.basename(path)}"
+
+    def makedirs(self):
+        os.makedirs(self.media_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
@@ -0,0 +1,3 @@
+# Importing the pipeline package puts lambda/ on sys.path, so tests can import
+# the Lambda handlers and their shared modules the way the Lambda runtime does.
+import pipeline  # noqa: F401
@@ -0,0 +1,31 @@
+import pytest
+
+import stage_cache
+import translation_memory
+import transcribe_video_tel2eng as driver
+from benchmarks import loadtest, simulated_aws
+from pipeline.discovery import StackDiscovery
+from pipeline.transcribe_waiter import TranscriptionWaiter
+from pipeline.workspace import Workspace
+
+
+@pytest.fixture
+def simulated(tmp_path, monkeypatch):
+    # One 30 s video in a workspace, run against simulated AWS services and ffmpeg
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-west-1')
+    monkeypatch.setenv('STAGE_CACHE_DISABLED', '1')
+    monkeypatch.setenv('TRANSCRIPT_INDEX', str(tmp_path / 'transcript-index'))
+    monkeypatch.setattr(stage_cache, '_shared', {})
+    monkeypatch.setattr(translation_memory, '_shared', {})
+    monkeypatch.setattr(driver, 'result_poll_interval', 0.01)
+    aws = simulated_aws.SimulatedAWS(time_scale=0.0002).install()
+    media = simulated_aws.SimulatedMedia(aws).install(driver)
+    driver.set_transcription_waiter(TranscriptionWaiter(driver.aws_clients.get_client('transcribe'),
+                                                        clock=aws.clock, sleep=aws.sleep))
+    driver.set_discovery(StackDiscovery(driver.myapp, str(tmp_path)))
+    video = loadtest.make_videos(str(tmp_path), 1, 30.0, 30.0)[0]
+    yield aws, Workspace.for_video(video, str(tmp_path / 'jobs'))
+    driver.set_discovery(None)
+    driver.set_transcription_waiter(None)
+    media.uninstall()
+    aws.uninstall()
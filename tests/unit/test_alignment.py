@@ -0,0 +1,95 @@
+import json
+import random
+
+from pipeline.alignment import ItemTable, align_table, iter_transcript_items
+from pipeline.preprocess import TimeMap
+
+
+def reference_align(items, step_size, maxline_len=90, confidence=0.0):
+    # The original per-item loop of align_sentences, with numeric confidence
+    aligned, sentence = [], []
+    curline_len, start_time = 0, 0.0
+    for item in items:
+        if 'start_time' in item:
+            item_start = float(item['start_time'])
+            if item_start - start_time > step_size or curline_len > maxline_len:
+                aligned.append({"time": start_time, "line": " ".join(sentence)})
+                sentence, curline_len, start_time = [], 0, item_start
+        alternative = item['alternatives'][0]
+        if item['type'] == 'pronunciation' and float(alternative['confidence']) > confidence:
+            sentence.append(alternative['content'])
+            curline_len += len(alternative['content']) + 1
+        elif item['type'] == 'punctuation' and sentence and float(alternative['confidence']) > confidence:
+            sentence[-1] += alternative['content']
+            curline_len += len(alternative['content']) + 1
+    if sentence:
+        aligned.append({"time": start_time, "line": " ".join(sentence)})
+    return aligned
+
+
+def synthetic_items(rng, count):
+    words = ["నమస్కారం", "ఇది", "ఒక", "పరీక్ష", "hello", "a", "తెలుగు", "వీడియో"]
+    items, t = [], 0.0
+    for _ in range(count):
+        if rng.random() < 0.15:
+            confidence = rng.choice(["0.0", "0.5"])
+            items.append({"type": "punctuation",
+                          "alternatives": [{"confidence": confidence, "content": rng.choice(".,?")}]})
+            continue
+        t += rng.choice([0.1, 0.4, 0.9, 3.0, 7.5])
+        confidence = rng.choice(["0.99", "0.043", "0.0", "1.0e-3"])
+        items.append({"start_time": f"{t:.3f}", "end_time": f"{t + 0.3:.3f}", "type": "pronunciation",
+                      "alternatives": [{"confidence": confidence, "content": rng.choice(words)}]})
+    return items
+
+
+def test_matches_reference_loop():
+    rng = random.Random(7)
+    for count in (0, 1, 5, 60, 2000):
+        items = synthetic_items(rng, count)
+        table = ItemTable.from_items(items)
+        for step_size, maxline_len in ((6, 90), (2, 20), (0.5, 5), (100, 1000)):
+            assert align_table(table, step_size, maxline_len) == reference_align(items, step_size, maxline_len)
+
+
+def test_empty_lines_and_leading_punctuation():
+    items = [
+        {"start_time": "0.5", "type": "pronunciation", "alternatives": [{"confidence": "0.0", "content": "x"}]},
+        {"start_time": "9.0", "type": "pronunciation", "alternatives": [{"confidence": "0.9", "content": "a"}]},
+        {"type": "punctuation", "alternatives": [{"confidence": "0.9", "content": ","}]},
+        {"start_time": "20.0", "type": "punctuation", "alternatives": [{"confidence": "0.9", "content": "!"}]},
+        {"start_time": "20.5", "type": "pronunciation", "alternatives": [{"confidence": "0.9", "content": "b"}]},
+    ]
+    expected = [{"time": 0.0, "line": ""}, {"time": 9.0, "line": "a,"}, {"time": 20.0, "line": "b"}]
+    assert align_table(ItemTable.from_items(items), 6, 90) == expected == reference_align(items, 6)
+
+
+def test_unsorted_times_fall_back_to_item_loop():
+    items = synthetic_items(random.Random(3), 50)
+    items[10]["start_time"], items[20]["start_time"] = items[20]["start_time"], items[10]["start_time"]
+    assert align_table(ItemTable.from_items(items), 6, 90) == reference_align(items, 6)
+
+
+def test_streaming_parser_skips_everything_but_items():
+    items = synthetic_items(random.Random(11), 200)
+    document = {
+        "jobName": "job \"quoted\" [x] {y}",
+        "results": {
+            "transcripts": [{"transcript": "a } tricky ] string \\\" here"}],
+            "speaker_labels": {"segments": [{"items": [{"start_time": "0.1"}] * 3}], "speakers": 2},
+            "items": items,
+            "trailing": [1, 2.5, None, True],
+        },
+        "status": "COMPLETED",
+    }
+    data = json.dumps(document, ensure_ascii=False, indent=1).encode('utf-8')
+    for size in (1, 7, 4096):
+        chunks = [data[i:i + size] for i in range(0, len(data), size)]
+        assert list(iter_transcript_items(chunks)) == items
+
+
+def test_remap_matches_time_map_items():
+    items = synthetic_items(random.Random(5), 300)
+    time_map = TimeMap.from_intervals([(0.0, 40.0), (55.0, 120.0), (300.0, 1000.0)])
+    table = ItemTable.from_items(items).remap(time_map)
+    assert align_table(table, 6, 90) == reference_align(time_map.remap_items(items), 6)
@@ -0,0 +1,103 @@
+import importlib
+import io
+import json
+
+import pytest
+
+import aws_clients
+
+
+class FakeClient:
+    def __init__(self, service):
+        self.service = service
+        self.objects = {}
+
+    # ssm
+    def get_parameter(self, Name, WithDecryption):
+        return {'Parameter': {'Value': Name.rsplit('/', 1)[-1]}}
+
+    def get_paginator(self, operation):
+        return self
+
+    def paginate(self, Path, Recursive, WithDecryption):
+        names = [f"{function_id}FunctionName"
+                 for function_id in ("TranscriptionLambda", "TranslateLambda", "SynthesizeLambda")]
+        return [{'Parameters': [{'Name': Path + name, 'Value': name} for name in names]}]
+
+    # lambda
+    def invoke(self, FunctionName, InvocationType, Payload):
+        return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(FunctionName).encode())}
+
+    # s3
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body
+
+    # translate
+    def translate_text(self, Text, SourceLanguageCode, TargetLanguageCode):
+        return {'TranslatedText': Text.upper()}
+
+
+@pytest.fixture
+def fake_clients(monkeypatch):
+    aws_clients.reset()
+    monkeypatch.setattr(aws_clients, '_new_client', lambda service, region: FakeClient(service))
+    yield aws_clients.constructions
+    aws_clients.reset()
+
+
+def test_clients_are_cached_per_service_and_region(fake_clients):
+    s3 = aws_clients.get_client('s3', 'us-west-1')
+
+    assert aws_clients.get_client('s3', 'us-west-1') is s3
+    assert aws_clients.get_client('s3', 'eu-west-1') is not s3
+    assert fake_clients == {'s3': 2}
+
+
+def test_importing_the_driver_creates_no_clients(fake_clients, monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-west-1')
+    import transcribe_video_tel2eng
+    importlib.reload(transcribe_video_tel2eng)
+
+    assert fake_clients == {}
+
+
+def test_driver_invocations_share_clients(fake_clients, tmp_path, monkeypatch):
+    import transcribe_video_tel2eng as driver
+    from pipeline.discovery import StackDiscovery
+    monkeypatch.setenv('AWS_ACCOUNT_ID', '123456789012')
+    monkeypatch.setattr(driver, '_discovery', StackDiscovery(driver.myapp, str(tmp_path)))
+
+    for function_id in ("TranscriptionLambda", "TranslateLambda", "SynthesizeLambda"):
+        assert driver.invoke_lambda(function_id, {}) == f"{function_id}FunctionName"
+
+    assert fake_clients == {'ssm': 1, 'lambda': 1}
+
+
+def test_warm_lambda_reuses_clients_across_invocations(fake_clients, monkeypatch):
+    import translate_text
+    monkeypatch.setenv('LANGUAGE_CODE', 'te')
+    monkeypatch.setenv('TARGET_LANGUAGE_CODE', 'en')
+    monkeypatch.setenv('STAGE_CACHE_DISABLED', '1')
+    s3 = aws_clients.get_client('s3')
+    s3.objects['in.txt'] = "00:00:00: నమస్కారం\n".encode('utf-8')
+    event = {'bucket': 'clients-test-bucket', 'src_text': 'in.txt', 'dst_text': 'out.txt'}
+
+    for _ in range(3):
+        translate_text.handler(event, None)
+
+    assert s3.objects['out.txt'] == "00:00:00: నమస్కారం\n".upper().encode('utf-8')
+    assert fake_clients == {'s3': 1, 'translate': 1}
+
+
+def test_lambda_init_builds_the_handler_clients(fake_clients, monkeypatch):
+    import translate_text
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-west-1')
+    importlib.reload(translate_text)
+    assert fake_clients == {}
+
+    monkeypatch.setenv('AWS_LAMBDA_FUNCTION_NAME', 'TranslateLambda')
+    importlib.reload(translate_text)
+    assert fake_clients == {'s3': 1, 'translate': 1}
@@ -0,0 +1,35 @@
+import json
+
+from benchmarks import bench_transcript
+from pipeline.alignment import iter_transcript_items
+
+
+def test_synthetic_transcript_has_mixed_items():
+    items = bench_transcript.synthetic_transcript(2000)['results']['items']
+
+    assert len(items) == 2000
+    assert any(item['type'] == 'punctuation' for item in items)
+    assert any(float(item['alternatives'][0]['confidence']) < 0.05
+               for item in items if item['type'] == 'pronunciation')
+
+
+def test_report_and_regression_check(tmp_path, monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-west-1')
+    output = tmp_path / 'bench.json'
+
+    assert bench_transcript.main(['--sizes', '50', '--repeat', '1', '--output', str(output)]) == 0
+    report = json.loads(output.read_text())
+    names = {r['name'] for r in report['results']}
+    assert {'align_sentences', 'convert_time_to_hh_mm_ss', 'transcribe_job_write', 'remove_timecode'} <= names
+
+    slower = [dict(r, seconds=r['seconds'] * 2 + 1) for r in report['results']]
+    assert len(bench_transcript.compare(slower, report, tolerance=0.2)) == len(slower)
+    assert bench_transcript.compare(report['results'], report, tolerance=0.2) == []
+
+
+def test_parser_reads_the_synthetic_json():
+    document = bench_transcript.synthetic_transcript(300)
+    data = json.dumps(document, ensure_ascii=False).encode('utf-8')
+
+    assert list(iter_transcript_items([data[i:i + 100] for i in range(0, len(data), 100)])) == \
+        document['results']['items']
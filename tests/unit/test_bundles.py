@@ -0,0 +1,40 @@
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks import bench_cold_start
+from pipeline import bundles
+
+
+def test_bundles_hold_only_imported_modules():
+    transcribe = bundles.modules('transcribe_audio')
+    translate = bundles.modules('translate_text')
+
+    assert transcribe == ['async_results', 'aws_clients', 'ratelimit', 'stage_cache', 'tracing', 'transcribe_audio']
+    assert {'translation_memory', 'transcript_lines'} <= set(translate)
+    assert 'translate_text.py' in bundles.excludes('transcribe_audio')
+    assert 'transcribe_audio.py' not in bundles.excludes('transcribe_audio')
+
+
+def test_built_bundle_imports_on_its_own(tmp_path):
+    for function_id, module in bundles.FUNCTIONS.items():
+        bundle = str(tmp_path / function_id)
+        assert bundles.build(module, bundle) > 0
+        # Only the bundle on the path, as in the Lambda runtime
+        env = dict(os.environ, PYTHONPATH='', AWS_DEFAULT_REGION='us-west-1')
+        subprocess.run([sys.executable, '-c', f"import {module}"], cwd=bundle, env=env, check=True)
+
+
+def test_cold_start_report_and_regression_check(tmp_path):
+    output = tmp_path / 'cold_start.json'
+
+    assert bench_cold_start.main(['--functions', 'SynthesizeLambda', '--repeat', '1', '--output', str(output)]) == 0
+    report = json.loads(output.read_text())
+    result, = report['results']
+    assert result['name'] == 'SynthesizeLambda' and result['prewarm']
+    assert result['init'] > 0 and result['first'] > 0 and result['cold'] >= result['init']
+
+    slower = [dict(result, cold=result['cold'] * 2 + 1)]
+    assert len(bench_cold_start.compare(slower, report, tolerance=0.25)) == 1
+    assert bench_cold_start.compare(report['results'], report, tolerance=0.25) == []
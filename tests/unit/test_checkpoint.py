@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+import transcribe_video_tel2eng as driver
+from benchmarks import loadtest
+from pipeline import checkpoint, synthesis
+
+
+def test_stage_is_done_only_while_its_files_exist(tmp_path):
+    output = tmp_path / 'english_text.txt'
+    output.write_text('hello')
+    ckpt = checkpoint.Checkpoint(str(tmp_path / 'checkpoint.json'), 'fp')
+    ckpt.complete('translate', str(output))
+
+    assert checkpoint.Checkpoint(str(tmp_path / 'checkpoint.json'), 'fp').done('translate')
+    output.unlink()
+    assert not ckpt.done('translate')
+
+
+def test_other_fingerprint_starts_over(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    ckpt = checkpoint.Checkpoint(path, 'fp1')
+    ckpt.complete('extract')
+    ckpt.put('transcription_job:abc', 'job-1')
+
+    assert checkpoint.Checkpoint(path, 'fp1').get('transcription_job:abc') == 'job-1'
+    assert checkpoint.Checkpoint(path, 'fp2').state == {'fingerprint': 'fp2', 'stages': {}, 'steps': {}}
+
+
+def test_memo_skips_recorded_steps_but_not_failures(tmp_path):
+    ckpt = checkpoint.Checkpoint(str(tmp_path / 'checkpoint.json'), 'fp')
+    calls = []
+
+    def start():
+        calls.append(1)
+        return None if len(calls) == 1 else 'job-1'
+
+    assert ckpt.memo('job', start) is None
+    assert ckpt.memo('job', start) == 'job-1'
+    assert ckpt.memo('job', start) == 'job-1'
+    assert len(calls) == 2
+
+
+def test_failed_run_resumes_at_the_failed_stage(simulated, monkeypatch):
+    aws, ws = simulated
+    real_synthesize = synthesis.synthesize_timeline
+    monkeypatch.setattr(synthesis, 'synthesize_timeline', lambda *args, **kwargs: 1 / 0)
+
+    with pytest.raises(ZeroDivisionError):
+        driver.process_audio_bucket(loadtest.BUCKET, ws)
+    state = driver.load_checkpoint(ws).state['stages']
+    assert [state[stage]['status'] for stage in driver.STAGES[:4]] == ['done', 'done', 'done', 'failed']
+    calls = dict(aws.calls)
+
+    monkeypatch.setattr(synthesis, 'synthesize_timeline', real_synthesize)
+    assert driver.process_audio_bucket(loadtest.BUCKET, ws) == ws.output_video_path
+
+    # Only synthesis and mux ran again: no new uploads, Lambda calls or Transcribe jobs
+    for name in ('s3.put', 'lambda.invoke', 'transcribe.start_transcription_job'):
+        assert aws.calls[name] == calls[name]
+    assert aws.calls['polly.synthesize_speech'] > calls.get('polly.synthesize_speech', 0)
+
+
+def test_lost_transcript_redoes_only_transcription_parsing(simulated):
+    aws, ws = simulated
+    driver.process_audio_bucket(loadtest.BUCKET, ws)
+    jobs = aws.calls['transcribe.start_transcription_job']
+    os.remove(ws.src_text)
+
+    driver.process_audio_bucket(loadtest.BUCKET, ws)
+
+    # The recorded job name is waited on again instead of starting a new job
+    assert aws.calls['transcribe.start_transcription_job'] == jobs
+
+
+def test_async_invocations_are_picked_up_after_a_crash(simulated, monkeypatch):
+    aws, ws = simulated
+    monkeypatch.setattr(driver, 'async_invoke', True)
+    ws.makedirs()
+    event = {'bucket': loadtest.BUCKET, 'media': 'missing.mp3', 'job_name': 'async-job'}
+    real_wait = driver.wait_for_result
+
+    def crash(*args):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(driver, 'wait_for_result', crash)
+    with pytest.raises(KeyboardInterrupt):
+        driver.call_lambda("TranscriptionLambda", event, ws, 'transcription_job:x')
+
+    # The resumed driver waits for the queued invocation instead of invoking again
+    monkeypatch.setattr(driver, 'wait_for_result', real_wait)
+    with pytest.raises(driver.PipelineError, match='NoSuchKey'):
+        driver.call_lambda("TranscriptionLambda", event, ws, 'transcription_job:x')
+    assert aws.calls['lambda.invoke'] == 1
+    assert driver.load_checkpoint(ws).get('transcription_job:x:pending') is None
+
+
+def test_async_pipeline_reads_results_from_s3(simulated, monkeypatch):
+    aws, ws = simulated
+    monkeypatch.setattr(driver, 'async_invoke', True)
+
+    assert driver.process_audio_bucket(loadtest.BUCKET, ws) == ws.output_video_path
+    results = [key for key in aws.objects[loadtest.BUCKET] if key.endswith('.result.json')]
+    assert len(results) == 2  # transcription and translation
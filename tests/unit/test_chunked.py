@@ -0,0 +1,60 @@
+from pipeline.chunked import choose_cut_points, merge_chunk_items, parse_silences
+
+
+def word(start, end, content, confidence="0.98"):
+    return {"start_time": start, "end_time": end, "type": "pronunciation",
+            "alternatives": [{"confidence": confidence, "content": content}]}
+
+
+def punct(content):
+    return {"type": "punctuation", "alternatives": [{"confidence": "0.0", "content": content}]}
+
+
+def test_merge_applies_chunk_offsets_in_order():
+    first = [word("0.04", "0.5", "ఒకటి"), punct("."), word("1.2", "1.9", "రెండు")]
+    second = [word("0.0", "0.35", "మూడు"), word("2.5", "3.0", "నాలుగు"), punct("?")]
+
+    merged = merge_chunk_items([(130.25, second), (0.0, first)])
+
+    assert [item["alternatives"][0]["content"] for item in merged] == \
+        ["ఒకటి", ".", "రెండు", "మూడు", "నాలుగు", "?"]
+    assert [item.get("start_time") for item in merged] == \
+        ["0.040", None, "1.200", "130.250", "132.750", None]
+    assert merged[4]["end_time"] == "133.250"
+    # inputs are not modified
+    assert second[0]["start_time"] == "0.0"
+
+
+def test_merge_renumbers_item_ids():
+    chunk = [dict(word("0.1", "0.2", "a"), id=0), dict(word("0.3", "0.4", "b"), id=1)]
+
+    merged = merge_chunk_items([(0.0, chunk), (60.0, chunk)])
+
+    assert [item["id"] for item in merged] == [0, 1, 2, 3]
+
+
+def test_merged_items_align_like_a_single_job():
+    single = [word("1.0", "1.5", "a"), word("8.0", "8.5", "b"), word("61.0", "61.5", "c"),
+              word("70.0", "70.4", "d")]
+    chunks = [(0.0, single[:2]), (60.0, [word("1.0", "1.5", "c"), word("10.0", "10.4", "d")])]
+
+    merged = merge_chunk_items(chunks)
+
+    assert [float(item["start_time"]) for item in merged] == [float(item["start_time"]) for item in single]
+
+
+def test_parse_silences():
+    log = ("[silencedetect @ 0x1] silence_start: 12.5\n"
+           "[silencedetect @ 0x1] silence_end: 14.25 | silence_duration: 1.75\n"
+           "[silencedetect @ 0x1] silence_start: 300.0\n")
+
+    assert parse_silences(log, duration=302.0) == [(12.5, 14.25), (300.0, 302.0)]
+
+
+def test_cut_points_land_in_silences_and_respect_min_chunk():
+    silences = [(50.0, 51.0), (290.0, 292.0), (610.0, 611.0), (880.0, 882.0), (1190.0, 1191.0)]
+
+    cuts = choose_cut_points(silences, 1200.0, chunks=4, min_chunk=120.0)
+
+    assert cuts == [291.0, 610.5, 881.0]
+    assert choose_cut_points(silences, 200.0, chunks=4, min_chunk=120.0) == []
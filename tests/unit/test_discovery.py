@@ -0,0 +1,149 @@
+import io
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+import aws_clients
+from pipeline import discovery
+
+
+class FakeAWS:
+    def __init__(self, params, buckets=()):
+        self.params = dict(params)
+        self.buckets = list(buckets)
+        self.calls = []
+
+    def client(self, service, region_name):
+        return self
+
+    # ssm
+    def get_paginator(self, operation):
+        return self
+
+    def paginate(self, Path, Recursive, WithDecryption):
+        self.calls.append('get_parameters_by_path')
+        items = [{'Name': Path + name, 'Value': value} for name, value in self.params.items()]
+        return [{'Parameters': items[:2]}, {'Parameters': items[2:]}]
+
+    # s3
+    def list_buckets(self):
+        self.calls.append('list_buckets')
+        return {'Buckets': [{'Name': name} for name in self.buckets]}
+
+    # sts
+    def get_caller_identity(self):
+        self.calls.append('get_caller_identity')
+        return {'Account': '123456789012'}
+
+
+OUTPUTS = {
+    'TranscriptionLambdaFunctionName': 'stack-TranscriptionLambda-1',
+    'TranslateLambdaFunctionName': 'stack-TranslateLambda-1',
+    'SynthesizeLambdaFunctionName': 'stack-SynthesizeLambda-1',
+    'AudioBucketName': 'stack-transcribebucket-1',
+}
+
+
+@pytest.fixture
+def fake_aws(monkeypatch):
+    aws = FakeAWS(OUTPUTS)
+    monkeypatch.delenv('AWS_ACCOUNT_ID', raising=False)
+    aws_clients.set_factory(aws.client)
+    yield aws
+    aws_clients.set_factory(None)
+
+
+def test_outputs_are_fetched_once_and_cached_on_disk(fake_aws, tmp_path):
+    first = discovery.StackDiscovery('myapplication', str(tmp_path), region_name='us-west-1')
+    assert first.function_name('TranslateLambda') == 'stack-TranslateLambda-1'
+    assert first.audio_bucket() == 'stack-transcribebucket-1'
+
+    # A second process (a new instance) reads the file instead of calling SSM
+    second = discovery.StackDiscovery('myapplication', str(tmp_path), region_name='us-west-1')
+    assert second.function_name('SynthesizeLambda') == 'stack-SynthesizeLambda-1'
+
+    assert fake_aws.calls.count('get_parameters_by_path') == 1
+    assert 'list_buckets' not in fake_aws.calls
+    with open(tmp_path / 'discovery' / '123456789012-us-west-1.json') as f:
+        assert json.load(f)['parameters'] == OUTPUTS
+
+
+def test_expired_cache_is_refetched(fake_aws, tmp_path):
+    now = [1000.0]
+    discovery.StackDiscovery('myapplication', str(tmp_path), ttl=60, region_name='us-west-1',
+                             clock=lambda: now[0]).audio_bucket()
+    now[0] += 61
+    discovery.StackDiscovery('myapplication', str(tmp_path), ttl=60, region_name='us-west-1',
+                             clock=lambda: now[0]).audio_bucket()
+
+    assert fake_aws.calls.count('get_parameters_by_path') == 2
+
+
+def test_missing_function_refreshes_once_then_fails(fake_aws, tmp_path):
+    stack = discovery.StackDiscovery('myapplication', str(tmp_path), region_name='us-west-1')
+    stack.parameters()
+    fake_aws.params['NewLambdaFunctionName'] = 'stack-NewLambda-1'
+    assert stack.function_name('NewLambda') == 'stack-NewLambda-1'
+
+    with pytest.raises(discovery.DiscoveryError, match='/myapplication/GoneLambdaFunctionName'):
+        stack.function_name('GoneLambda')
+    assert fake_aws.calls.count('get_parameters_by_path') == 3
+
+
+def test_missing_optional_output_is_looked_up_once_per_ttl(fake_aws, tmp_path):
+    now = [0]
+    stack = discovery.StackDiscovery('myapplication', str(tmp_path), ttl=3600, region_name='us-west-1',
+                                     clock=lambda: now[0])
+    for _ in range(3):
+        with pytest.raises(discovery.DiscoveryError):
+            stack.transcript_queue_url()
+    # A new process reads the absence from the cache file too
+    other = discovery.StackDiscovery('myapplication', str(tmp_path), ttl=3600, region_name='us-west-1',
+                                     clock=lambda: now[0])
+    with pytest.raises(discovery.DiscoveryError):
+        other.transcript_queue_url()
+    assert fake_aws.calls.count('get_parameters_by_path') == 2
+
+    # Past the TTL the stack is asked again, and a redeploy that added the output is seen
+    now[0] = 4000
+    fake_aws.params['TranscriptQueueUrl'] = 'https://sqs.us-west-1.amazonaws.com/1/TranscriptQueue'
+    assert stack.transcript_queue_url().endswith('/TranscriptQueue')
+    assert fake_aws.calls.count('get_parameters_by_path') == 3
+
+
+def test_old_stacks_fall_back_to_one_bucket_scan(fake_aws, tmp_path):
+    del fake_aws.params['AudioBucketName']
+    fake_aws.buckets = ['other-bucket', 'telugutoenglishtranscrip-transcribebucketabc-123']
+    stack = discovery.StackDiscovery('myapplication', str(tmp_path), region_name='us-west-1')
+
+    assert stack.audio_bucket() == 'telugutoenglishtranscrip-transcribebucketabc-123'
+    assert discovery.StackDiscovery('myapplication', str(tmp_path), region_name='us-west-1').audio_bucket() == \
+        'telugutoenglishtranscrip-transcribebucketabc-123'
+    assert fake_aws.calls.count('list_buckets') == 1
+
+
+@pytest.mark.parametrize('buckets', [[], ['telugutoenglishtranscrip-transcribebucketa',
+                                          'telugutoenglishtranscrip-transcribebucketb']])
+def test_no_or_ambiguous_bucket_fails_loudly(fake_aws, tmp_path, buckets):
+    del fake_aws.params['AudioBucketName']
+    fake_aws.buckets = ['other-bucket'] + buckets
+    stack = discovery.StackDiscovery('myapplication', str(tmp_path), region_name='us-west-1')
+
+    with pytest.raises(discovery.DiscoveryError):
+        stack.audio_bucket()
+
+
+def test_driver_rediscovers_after_a_redeploy(fake_aws, tmp_path, monkeypatch):
+    import transcribe_video_tel2eng as driver
+    monkeypatch.setattr(driver, '_discovery', discovery.StackDiscovery(driver.myapp, str(tmp_path)))
+    driver.get_discovery().parameters()
+    fake_aws.params['TranslateLambdaFunctionName'] = 'stack-TranslateLambda-2'
+
+    def invoke(FunctionName, InvocationType, Payload):
+        if FunctionName != 'stack-TranslateLambda-2':
+            raise ClientError({'Error': {'Code': 'ResourceNotFoundException', 'Message': 'gone'}}, 'Invoke')
+        return {'StatusCode': 200, 'Payload': io.BytesIO(b'"ok"')}
+    monkeypatch.setattr(fake_aws, 'invoke', invoke, raising=False)
+
+    assert driver.invoke_lambda('TranslateLambda', {}) == 'ok'
@@ -0,0 +1,64 @@
+import wave
+
+import transcribe_video_tel2eng as driver
+from benchmarks import loadtest
+from pipeline import incremental, synthesis
+from transcript_lines import parse_lines
+
+RECORD = [('00:00:00', 'ఒకటి', 'one'), ('00:00:06', 'రెండు', 'two'), ('00:00:12', 'మూడు', 'three')]
+
+
+def test_only_edited_lines_need_translation():
+    edited = [('00:00:00', 'ఒకటి'), ('00:00:06', 'రెండు!'), ('00:00:12', 'మూడు'), ('00:00:18', 'నాలుగు')]
+    changes = incremental.diff(RECORD, edited)
+
+    assert changes.changed == [1, 3]
+    assert changes.removed == 1
+    assert incremental.merge(edited, changes.translations, ['two!', 'four']) == \
+        [('00:00:00', 'one'), ('00:00:06', 'two!'), ('00:00:12', 'three'), ('00:00:18', 'four')]
+
+
+def test_slot_changes_cover_edited_and_neighbouring_slots():
+    old = [(tc, translation) for tc, _, translation in RECORD]
+    new = [('00:00:00', 'one'), ('00:00:06', 'two!'), ('00:00:12', 'three'), ('00:00:18', 'four')]
+
+    silence, render = incremental.slot_changes(old, new, 24.0)
+    # "three" now ends where "four" starts
+    assert silence == [(6.0, 12.0), (12.0, 24.0)]
+    assert render == [(6.0, 12.0, 'two!'), (12.0, 18.0, 'three'), (18.0, 24.0, 'four')]
+
+
+def test_splice_rewrites_only_the_slot(tmp_path):
+    rate = 100
+    track = str(tmp_path / 'track.wav')
+    synthesis.assemble_track([(0.0, 1.0, b'\1\0' * 100), (1.0, 2.0, b'\2\0' * 100)], 3.0, track, rate)
+
+    synthesis.splice_track(track, [(1.0, 2.0, b'\3\0' * 50)], silence=[(0.0, 1.0)], sample_rate=rate)
+
+    with wave.open(track, 'rb') as f:
+        assert f.getnframes() == 300
+        frames = f.readframes(300)
+    assert frames == b'\0\0' * 100 + b'\3\0' * 50 + b'\0\0' * 150
+
+
+def test_edit_reruns_one_line(simulated):
+    aws, ws = simulated
+    driver.process_audio_bucket(loadtest.BUCKET, ws)
+    with open(ws.src_text, 'r') as f:
+        lines = parse_lines(f.read())
+    lines[1] = (lines[1][0], lines[1][1] + ' సవరణ')
+    with open(ws.src_text, 'w') as f:
+        f.write(''.join(f"{tc}: {text}\n" for tc, text in lines))
+    calls = dict(aws.calls)
+
+    assert driver.rerun_edited(loadtest.BUCKET, ws) == ws.output_video_path
+
+    assert aws.calls['translate.translate_text'] == calls['translate.translate_text'] + 1
+    assert aws.calls['polly.synthesize_speech'] == calls['polly.synthesize_speech'] + 1
+    assert aws.calls['transcribe.start_transcription_job'] == calls['transcribe.start_transcription_job']
+    with open(ws.dst_text, 'r') as f:
+        assert len(parse_lines(f.read())) == len(lines)
+    # Nothing left to do the second time
+    calls = dict(aws.calls)
+    driver.rerun_edited(loadtest.BUCKET, ws)
+    assert aws.calls == calls
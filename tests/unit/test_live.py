@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+import transcribe_video_tel2eng as driver
+from benchmarks import loadtest
+from benchmarks.simulated_aws import media_header_duration
+from pipeline import live
+from transcript_lines import parse_lines, timecode_to_seconds
+
+
+def replay(aws, ws, tmp_path, window, max_lag):
+    source = live.ReplaySource(ws.input_video_path, window, str(tmp_path / 'windows'), clock=aws.clock,
+                               sleep=aws.sleep)
+    runner = live.LivePipeline(loadtest.BUCKET, ws.job_id, str(tmp_path / 'live'), str(tmp_path / 'out'),
+                               max_lag=max_lag, clock=aws.clock, sleep=aws.sleep)
+    return runner, runner.run(source)
+
+
+def test_windows_are_dubbed_and_emitted_in_order(simulated, tmp_path):
+    aws, ws = simulated
+    # The fixture's clock runs 5000 times faster than real time, so Python's own overhead takes
+    # simulated minutes; this bound only has to keep every window in time
+    runner, report = replay(aws, ws, tmp_path, window=10.0, max_lag=36000.0)
+
+    assert [(w['index'], w['start'], w['status']) for w in report['windows']] == [
+        (0, 0.0, 'dubbed'), (1, 10.0, 'dubbed'), (2, 20.0, 'dubbed')]
+    assert all(0 < w['lag'] <= 36000.0 for w in report['windows'])
+    with open(runner.playlist_path, 'r') as f:
+        playlist = f.read().splitlines()
+    assert [line for line in playlist if line.startswith('segment-')] == [
+        'segment-00000.ts', 'segment-00001.ts', 'segment-00002.ts']
+    assert playlist[-1] == '#EXT-X-ENDLIST'
+    with open(tmp_path / 'out' / 'segment-00002.ts', 'rb') as f:
+        assert media_header_duration(f.readline()) == 10.0
+
+    # The rolling transcript is on the stream's clock
+    with open(runner.transcript_path, 'r') as f:
+        seconds = [timecode_to_seconds(tc) for tc, _ in parse_lines(f.read()) if tc]
+    assert seconds == sorted(seconds) and seconds[-1] >= 20
+
+
+def test_late_windows_fall_back_to_the_original(simulated, tmp_path):
+    aws, ws = simulated
+    runner, report = replay(aws, ws, tmp_path, window=15.0, max_lag=1.0)
+
+    # Transcription alone takes longer than the allowed lag
+    assert [w['status'] for w in report['windows']] == ['late', 'late']
+    assert all('translate' not in w['stages'] for w in report['windows'])
+    with open(tmp_path / 'out' / 'segment-00001.ts', 'rb') as f:
+        assert b'window:' in f.readline()
+
+
+def test_window_lines_stay_inside_the_window(tmp_path):
+    path = tmp_path / 'english_text.txt'
+    path.write_text("00:00:00: Hello\n00:00:09: today\n00:00:14: past the end\n")
+
+    assert live.shifted_lines(str(path), 10, 10.0) == [
+        ('00:00:10', 'Hello'), ('00:00:19', 'today'), ('00:00:19', 'past the end')]
+
+
+def test_segment_list_rows_are_read_once_closed(tmp_path):
+    source = live.SegmenterSource('rtmp://localhost/live/talk', 20.0, str(tmp_path))
+    with open(tmp_path / live.SEGMENT_LIST, 'w') as f:
+        f.write("window-00000.ts,0.000000,20.020000\nwindow-00001.ts,20.020000,40.0")
+
+    assert source.listed() == [('window-00000.ts', 0.0, 20.02)]
+
+    command = live.segment_command('growing.ts', 20.0, str(tmp_path), follow=True, idle_timeout=5.0)
+    assert command[command.index('-rw_timeout') + 1] == '5000000'
+    assert command[command.index('-i') + 1] == f"file:{os.path.abspath('growing.ts')}"
+
+
+def test_live_mode_only_dubs(simulated, tmp_path, monkeypatch):
+    aws, ws = simulated
+    monkeypatch.setattr(driver, 'output_mode', 'subtitles')
+
+    with pytest.raises(driver.PipelineError):
+        replay(aws, ws, tmp_path, window=10.0, max_lag=60.0)
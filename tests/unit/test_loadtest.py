@@ -0,0 +1,46 @@
+import json
+import random
+
+import stage_cache
+import transcribe_video_tel2eng as driver
+from benchmarks import loadtest, simulated_aws
+
+
+def test_latency_matches_median_and_p95():
+    rng = random.Random(1)
+    samples = [simulated_aws.Latency(1.0, 3.0).sample(rng) for _ in range(20000)]
+
+    assert 0.95 < loadtest.percentile(samples, 50) < 1.05
+    assert 2.8 < loadtest.percentile(samples, 95) < 3.2
+    assert simulated_aws.Latency(0.5, per_unit=0.1).sample(rng, units=10) == 1.5
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert [loadtest.percentile(values, q) for q in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert loadtest.percentile([7.0], 99) == 7.0
+
+
+def test_full_pipeline_against_simulated_services(tmp_path, monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-west-1')
+    # main() turns the stage cache and the transcript index off and sets the worker count; undo all afterwards
+    monkeypatch.setenv('STAGE_CACHE_DISABLED', '1')
+    monkeypatch.setenv('TRANSCRIPT_INDEX_DISABLED', '1')
+    monkeypatch.setattr(stage_cache, '_shared', {})
+    monkeypatch.setattr(driver, 'synthesis_workers', driver.synthesis_workers)
+    profile = tmp_path / 'profile.json'
+    profile.write_text('{"throttle": {"polly": 0.2}, '
+                       '"latency": {"transcribe.job": {"median": 5.0, "per_unit": 0.1}}}')
+    output = tmp_path / 'report.json'
+
+    status = loadtest.main(['--videos', '4', '--duration', '20', '60', '--concurrency', '2',
+                            '--time-scale', '0.0005', '--profile', str(profile), '--output', str(output)])
+
+    report = json.loads(output.read_text())
+    assert status == 0, report['errors']
+    assert report['succeeded'] == 4
+    assert all(report['stages'][stage]['count'] == 4 for stage in loadtest.STAGES)
+    assert report['end_to_end']['p50'] > 0
+    assert report['aws']['throttled'].get('polly', 0) > 0
+    assert report['aws']['calls']['transcribe.start_transcription_job'] == 4
+    assert report['aws']['calls']['polly.synthesize_speech'] > 4
@@ -0,0 +1,60 @@
+import pytest
+
+import transcribe_video_tel2eng as driver
+from benchmarks import loadtest
+from pipeline import languages, multitrack
+
+
+def test_parse_targets_keeps_order_and_rejects_unknown_codes():
+    assert [t.code for t in languages.parse_targets('en, hi,en,ta')] == ['en', 'hi', 'ta']
+    assert languages.parse_targets('') == []
+    with pytest.raises(ValueError, match='xx'):
+        languages.parse_targets('en,xx')
+
+
+def test_one_mux_pass_tags_every_track():
+    cmd = multitrack.command('in.mp4', [('en.wav', 'eng'), ('hi.wav', 'hin')],
+                             [('en.srt', 'eng'), ('hi.srt', 'hin'), ('ta.srt', 'tam')], 'out.mp4', 'tel')
+
+    assert cmd.count('-i') == 6
+    maps = [cmd[i + 1] for i, arg in enumerate(cmd) if arg == '-map']
+    assert maps == ['0:v:0', '0:a:0', '1:a:0', '2:a:0', '3:0', '4:0', '5:0']
+    assert cmd[cmd.index('-c:s') + 1] == 'mov_text'
+    # Original audio is copied and not default; the first dub is
+    assert cmd[cmd.index('-c:a:0') + 1] == 'copy'
+    assert cmd[cmd.index('-disposition:a:1') + 1] == 'default'
+    assert cmd[cmd.index('-metadata:s:a:2') + 1] == 'language=hin'
+    assert cmd[cmd.index('-metadata:s:s:2') + 1] == 'language=tam'
+
+
+def test_fan_out_transcribes_once(simulated, monkeypatch):
+    aws, ws = simulated
+    monkeypatch.setattr(driver, 'target_languages_spec', 'en,hi,ta')
+    muxed = {}
+    simulated_mux = multitrack.mux
+
+    def mux(video, audio, subs, output, original=None):
+        muxed.update(audio=audio, subs=subs)
+        return simulated_mux(video, audio, subs, output, original)
+    monkeypatch.setattr(multitrack, 'mux', mux)
+
+    output = driver.process_audio_bucket(loadtest.BUCKET, ws)
+
+    assert output == ws.multilingual_video_path('.mp4')
+    assert aws.calls['transcribe.start_transcription_job'] == 1
+    assert aws.calls['translate.translate_text'] >= 3
+    # Polly has no Tamil voice: Tamil gets subtitles only
+    assert [language for _, language in muxed['audio']] == ['eng', 'hin']
+    assert [language for _, language in muxed['subs']] == ['eng', 'hin', 'tam']
+    state = driver.load_checkpoint(ws).state['stages']
+    assert list(state) == list(driver.MULTILINGUAL_STAGES)
+
+
+@pytest.mark.parametrize('setting, value', [('preprocess_codec', 'opus'), ('transcribe_chunks', 4)])
+def test_streaming_extract_refuses_local_audio_settings(simulated, monkeypatch, setting, value):
+    aws, ws = simulated
+    monkeypatch.setattr(driver, 'streaming_extract_mode', True)
+    monkeypatch.setattr(driver, setting, value)
+
+    with pytest.raises(driver.PipelineError):
+        driver.process_audio_bucket(loadtest.BUCKET, ws)
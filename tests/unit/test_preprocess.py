@@ -0,0 +1,43 @@
+import pytest
+
+from pipeline.preprocess import TimeMap, select_filter, speech_intervals
+
+
+def test_only_long_silences_are_cut_with_padding():
+    silences = [(5.0, 5.8), (20.0, 30.0), (50.0, 54.0)]
+
+    intervals = speech_intervals(silences, 60.0, min_gap=2.0, padding=0.5)
+
+    assert intervals == [(0.0, 20.5), (29.5, 50.5), (53.5, 60.0)]
+
+
+def test_time_map_round_trip(tmp_path):
+    time_map = TimeMap.from_intervals([(0.0, 20.5), (29.5, 50.5), (53.5, 60.0)])
+
+    assert time_map.removed == [(20.5, 29.5), (50.5, 53.5)]
+    assert time_map.processed_duration == pytest.approx(48.0)
+    assert time_map.to_original(10.0) == pytest.approx(10.0)
+    assert time_map.to_original(20.5) == pytest.approx(29.5)
+    assert time_map.to_original(25.0) == pytest.approx(34.0)
+    assert time_map.to_original(43.0) == pytest.approx(55.0)
+
+    time_map.save(str(tmp_path / 'map.json'))
+    assert TimeMap.load(str(tmp_path / 'map.json')).segments == time_map.segments
+
+
+def test_items_are_remapped_to_original_timeline():
+    time_map = TimeMap.from_intervals([(0.0, 10.0), (40.0, 50.0)])
+    items = [{"start_time": "9.5", "end_time": "9.9", "type": "pronunciation"},
+             {"type": "punctuation"},
+             {"start_time": "12.0", "end_time": "12.4", "type": "pronunciation"}]
+
+    remapped = time_map.remap_items(items)
+
+    assert [item.get("start_time") for item in remapped] == ["9.500", None, "42.000"]
+    assert items[2]["start_time"] == "12.0"
+    assert TimeMap().remap_items(items) is items
+
+
+def test_select_filter():
+    assert select_filter([(0.0, 1.5), (3.0, 4.0)]) == \
+        "aselect='between(t,0.000,1.500)+between(t,3.000,4.000)',asetpts=N/SR/TB"
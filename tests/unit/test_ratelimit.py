@@ -0,0 +1,156 @@
+import io
+import json
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError
+
+import ratelimit
+import tracing
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def throttle(operation='TranslateText'):
+    return ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, operation)
+
+
+class FlakyTranslate:
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.calls = 0
+
+    def translate_text(self, Text):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return {'TranslatedText': Text.upper()}
+
+    def get_paginator(self, operation):
+        return 'paginator'
+
+
+class FlakyTranscribe:
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.calls = 0
+
+    def start_transcription_job(self, TranscriptionJobName):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return {'TranscriptionJob': {}}
+
+
+def limited_client(client, clock, rate=4.0, concurrency=4):
+    return ratelimit.LimitedClient(client, ratelimit.ServiceLimiter('translate', rate, concurrency,
+                                                                    clock=clock, sleep=clock.sleep))
+
+
+def test_token_bucket_paces_calls_at_the_rate():
+    clock = FakeClock()
+    bucket = ratelimit.TokenBucket(2.0, burst=1, clock=clock, sleep=clock.sleep)
+
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_burst_shrinks_with_the_rate_and_grows_back():
+    clock = FakeClock()
+    bucket = ratelimit.TokenBucket(8.0, clock=clock, sleep=clock.sleep)
+
+    bucket.set_rate(2.0)
+    assert bucket.burst == 2.0
+    clock.now += 60
+    for _ in range(3):
+        bucket.acquire()
+    # Two tokens in the bucket after a long idle, the third waited for a refill
+    assert clock.now == pytest.approx(60.5)
+
+    bucket.set_rate(100.0)
+    assert bucket.burst == 8.0
+
+
+def test_throttles_are_retried_and_slow_the_service_down():
+    clock = FakeClock()
+    translate = FlakyTranslate([throttle(), throttle()])
+    client = limited_client(translate, clock)
+
+    assert client.translate_text(Text='hello') == {'TranslatedText': 'HELLO'}
+    assert translate.calls == 3
+    stats = client._limiter.stats()
+    # Both throttles came within the cooldown: one halving, then a success adds back a little
+    assert stats['throttles'] == 2 and stats['retries'] == 2
+    assert stats['allowed_rate']['translate_text'] == 2.5
+    assert stats['concurrency_limit'] == 2.5
+    assert client.get_paginator('x') == 'paginator'
+
+
+def test_successes_recover_the_rate_up_to_the_quota():
+    clock = FakeClock()
+    client = limited_client(FlakyTranslate([throttle()]), clock)
+    client.translate_text(Text='a')
+    for _ in range(200):
+        client.translate_text(Text='a')
+
+    assert client._limiter.stats()['allowed_rate']['translate_text'] == 4.0
+
+
+def test_other_client_errors_are_not_retried():
+    clock = FakeClock()
+    denied = ClientError({'Error': {'Code': 'AccessDeniedException', 'Message': 'no'}}, 'TranslateText')
+    translate = FlakyTranslate([denied])
+
+    with pytest.raises(ClientError):
+        limited_client(translate, clock).translate_text(Text='a')
+    assert translate.calls == 1
+
+
+def test_start_operations_are_not_retried_after_transient_errors():
+    clock = FakeClock()
+    client = limited_client(FlakyTranscribe([ReadTimeoutError(endpoint_url='https://transcribe')]), clock)
+
+    with pytest.raises(ReadTimeoutError):
+        client.start_transcription_job(TranscriptionJobName='job')
+    assert client._client.calls == 1
+
+    # Throttled requests and requests that never left are safe to send again
+    client = limited_client(FlakyTranscribe([throttle('StartTranscriptionJob'),
+                                             EndpointConnectionError(endpoint_url='https://transcribe')]), clock)
+    assert client.start_transcription_job(TranscriptionJobName='job') == {'TranscriptionJob': {}}
+    assert client._client.calls == 3
+
+
+def test_only_quota_bound_services_are_wrapped(monkeypatch):
+    monkeypatch.setenv('RATE_LIMITS', '{"polly": 3, "translate.translate_text": 7}')
+    ratelimit.reset()
+    s3 = object()
+
+    assert ratelimit.wrap(s3, 's3') is s3
+    assert isinstance(ratelimit.wrap(FlakyTranslate([]), 'translate'), ratelimit.LimitedClient)
+    assert ratelimit.limiter('polly').default_rate == 3.0
+    assert ratelimit.limiter('translate').rates == {'translate_text': 7.0}
+    monkeypatch.setenv('RATE_LIMITS_DISABLED', '1')
+    assert not ratelimit.limited('translate')
+    ratelimit.reset()
+
+
+def test_allowed_rate_is_published_as_a_metric(monkeypatch):
+    monkeypatch.setenv('TRACE_FORMAT', 'emf')
+    out = io.StringIO()
+    monkeypatch.setattr(tracing.sys, 'stdout', out)
+    clock = FakeClock()
+    limited_client(FlakyTranslate([throttle()]), clock).translate_text(Text='a')
+
+    emf = json.loads(out.getvalue().splitlines()[0])
+    assert (emf['Service'], emf['Operation'], emf['AllowedRate']) == ('translate', 'translate_text', 2.0)
+    assert emf['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [['Operation', 'Service']]
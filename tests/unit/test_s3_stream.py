@@ -0,0 +1,72 @@
+import io
+import threading
+
+import pytest
+
+from s3_stream import MIN_PART_SIZE, MultipartStreamUploader, upload_stream
+
+
+class FakeS3:
+    def __init__(self, fail_part=None):
+        self.objects = {}
+        self.parts = {}
+        self.calls = []
+        self.fail_part = fail_part
+        self.lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.calls.append('put_object')
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.calls.append('create_multipart_upload')
+        return {'UploadId': 'upload-1'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        if PartNumber == self.fail_part:
+            raise RuntimeError("connection reset")
+        with self.lock:
+            self.parts[PartNumber] = Body
+        return {'ETag': f'"etag-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append('complete_multipart_upload')
+        numbers = [part['PartNumber'] for part in MultipartUpload['Parts']]
+        assert numbers == sorted(numbers)
+        self.objects[Key] = b''.join(self.parts[n] for n in numbers)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.calls.append('abort_multipart_upload')
+
+
+def test_small_stream_uses_single_put():
+    s3 = FakeS3()
+    upload_stream(io.BytesIO(b'ID3' + b'x' * 1000), s3, 'bucket', 'media/a.mp3')
+
+    assert s3.calls == ['put_object']
+    assert s3.objects['media/a.mp3'] == b'ID3' + b'x' * 1000
+
+
+def test_large_stream_is_reassembled_in_order():
+    s3 = FakeS3()
+    data = bytes(range(256)) * (MIN_PART_SIZE * 3 // 256 + 7)
+    uploader = upload_stream(io.BytesIO(data), s3, 'bucket', 'media/b.mp3', part_size=MIN_PART_SIZE)
+
+    assert s3.objects['media/b.mp3'] == data
+    assert uploader.parts_uploaded == 4
+    assert uploader.bytes_written == len(data)
+
+
+def test_failed_part_aborts_upload():
+    s3 = FakeS3(fail_part=2)
+    with pytest.raises(RuntimeError):
+        upload_stream(io.BytesIO(b'x' * (MIN_PART_SIZE * 3)), s3, 'bucket', 'media/c.mp3',
+                      part_size=MIN_PART_SIZE)
+
+    assert 'abort_multipart_upload' in s3.calls
+    assert 'media/c.mp3' not in s3.objects
+
+
+def test_part_size_below_s3_minimum_is_rejected():
+    with pytest.raises(ValueError):
+        MultipartStreamUploader(FakeS3(), 'bucket', 'key', part_size=1024)
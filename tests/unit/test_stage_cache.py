@@ -0,0 +1,70 @@
+import io
+import os
+
+from botocore.exceptions import ClientError
+
+import stage_cache
+from stage_cache import StageCache
+
+
+def test_hit_miss_counters(tmp_path):
+    cache = StageCache(str(tmp_path))
+    key = stage_cache.translation_key("00:00:01: నమస్కారం", "te-IN", "en-US")
+
+    assert cache.get(stage_cache.TRANSLATIONS, key) is None
+    cache.put(stage_cache.TRANSLATIONS, key, "00:00:01: Hello")
+    assert cache.get(stage_cache.TRANSLATIONS, key) == b"00:00:01: Hello"
+
+    stats = cache.stats()['namespaces'][stage_cache.TRANSLATIONS]
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    cache = StageCache(str(tmp_path), max_bytes=300)
+    for name in ('a', 'b', 'c'):
+        cache.put(stage_cache.SPEECH, stage_cache.digest(name), b'x' * 100)
+    cache.get(stage_cache.SPEECH, stage_cache.digest('a'))
+    cache.put(stage_cache.SPEECH, stage_cache.digest('d'), b'x' * 100)
+
+    assert cache.size == 300
+    assert cache.evictions == 1
+    assert cache.get(stage_cache.SPEECH, stage_cache.digest('b')) is None
+    assert cache.get(stage_cache.SPEECH, stage_cache.digest('a')) is not None
+
+
+def test_index_survives_restart(tmp_path):
+    cache = StageCache(str(tmp_path))
+    cache.put(stage_cache.TRANSCRIPTS, stage_cache.digest('audio'), b'{}')
+
+    reopened = StageCache(str(tmp_path))
+    assert reopened.size == 2
+    assert reopened.get(stage_cache.TRANSCRIPTS, stage_cache.digest('audio')) == b'{}'
+    assert not any(name.startswith('.tmp') for _, _, files in os.walk(tmp_path) for name in files)
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+
+def test_s3_mirror_shared_between_caches(tmp_path):
+    s3 = FakeS3()
+    writer = StageCache(str(tmp_path / 'one'), s3_bucket='bucket', s3_client=s3)
+    reader = StageCache(str(tmp_path / 'two'), s3_bucket='bucket', s3_client=s3)
+    key = stage_cache.speech_key("Hello.", "Matthew", "mp3")
+
+    writer.put(stage_cache.SPEECH, key, b'mp3')
+
+    assert reader.get(stage_cache.SPEECH, key) == b'mp3'
+    assert reader.s3_hits[stage_cache.SPEECH] == 1
+    assert reader.get(stage_cache.SPEECH, key) == b'mp3'
+    assert reader.s3_hits[stage_cache.SPEECH] == 1
+
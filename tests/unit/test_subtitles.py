@@ -0,0 +1,49 @@
+import transcribe_video_tel2eng as driver
+from benchmarks import loadtest
+from pipeline import subtitles
+from transcript_lines import parse_lines
+
+TRANSLATED = ("00:00:00: \n"
+              "00:00:04: Hello.\n"
+              "00:00:06: This sentence is long enough that it needs a second line on screen.\n"
+              "01:02:03: Goodbye.\n")
+
+
+def test_cues_end_at_the_next_line_or_after_their_reading_time():
+    cue_list = subtitles.cues(parse_lines(TRANSLATED), 3730.0)
+    long_text = cue_list[1][2]
+
+    assert [(start, end) for start, end, _ in cue_list] == [(4.0, 5.5), (6.0, 6.0 + len(long_text) / 15),
+                                                            (3723.0, 3724.5)]
+
+
+def test_srt_and_vtt_formats():
+    cue_list = [(4.0, 5.5, "Hello."), (3723.25, 3725.0, "This sentence is long enough that it needs a second line.")]
+
+    assert subtitles.format_srt(cue_list) == (
+        "1\n00:00:04,000 --> 00:00:05,500\nHello.\n\n"
+        "2\n01:02:03,250 --> 01:02:05,000\nThis sentence is long enough that it needs\na second line.\n\n")
+    assert subtitles.format_vtt(cue_list[:1]) == "WEBVTT\n\n00:00:04.000 --> 00:00:05.500\nHello.\n\n"
+
+
+def test_mux_copies_audio_and_video():
+    command = subtitles.mux_command('in.mp4', 'subs.srt', 'out.mp4')
+
+    assert command[command.index('-c') + 1] == 'copy'
+    assert command[command.index('-c:s') + 1] == 'mov_text'
+    assert subtitles.output_container('talk.avi') == '.mkv'
+    assert subtitles.mux_command('in.webm', 'subs.srt', 'out.webm')[-4] == 'webvtt'
+
+
+def test_subtitle_mode_skips_synthesis(simulated, monkeypatch):
+    aws, ws = simulated
+    monkeypatch.setattr(driver, 'output_mode', 'subtitles')
+
+    output = driver.process_audio_bucket(loadtest.BUCKET, ws)
+
+    assert output == ws.subtitled_video_path('.mp4')
+    with open(ws.srt_path) as f:
+        assert f.read().startswith("1\n00:00:")
+    assert not any(name.startswith('polly.') for name in aws.calls)
+    assert aws.calls['lambda.invoke'] == 2  # transcription and translation only
+    assert list(driver.load_checkpoint(ws).state['stages']) == list(driver.SUBTITLE_STAGES)
@@ -0,0 +1,30 @@
+import wave
+
+from pipeline.synthesis import SAMPLE_RATE, assemble_track, atempo_chain, timeline_slots
+from transcript_lines import parse_lines
+
+
+def test_slots_run_to_next_timecode_and_skip_empty_lines():
+    lines = parse_lines("00:00:00: \n00:00:04: Hello.\n00:00:09: Goodbye.\n")
+
+    assert timeline_slots(lines, 12.5) == [(4.0, 9.0, "Hello."), (9.0, 12.5, "Goodbye.")]
+
+
+def test_track_matches_video_length_and_clips_land_on_their_offsets(tmp_path):
+    second = b'\x01\x00' * SAMPLE_RATE
+    clips = [(4.0, 9.0, second * 2), (9.0, 10.0, second * 3)]  # the second clip overruns its slot
+    path = assemble_track(clips, 12.0, str(tmp_path / 'track.wav'))
+
+    with wave.open(path) as track:
+        assert track.getnframes() == 12 * SAMPLE_RATE
+        frames = track.readframes(track.getnframes())
+    samples = frames[::2]
+    assert samples[:4 * SAMPLE_RATE] == b'\0' * 4 * SAMPLE_RATE
+    assert samples[4 * SAMPLE_RATE:6 * SAMPLE_RATE] == b'\x01' * 2 * SAMPLE_RATE
+    assert samples[9 * SAMPLE_RATE:10 * SAMPLE_RATE] == b'\x01' * SAMPLE_RATE
+    assert samples[10 * SAMPLE_RATE:] == b'\0' * 2 * SAMPLE_RATE
+
+
+def test_atempo_chain_stays_in_filter_range():
+    assert atempo_chain(1.25) == 'atempo=1.2500'
+    assert atempo_chain(3.0) == 'atempo=2.0,atempo=1.5000'
@@ -0,0 +1,57 @@
+import os
+
+import synthesize_speech
+import transcribe_video_tel2eng as driver
+from benchmarks import loadtest, simulated_aws
+
+TEXT = "Hello, and welcome to the news. Today we talk about the monsoon."
+
+
+def test_speech_is_streamed_to_s3_once(simulated):
+    aws, ws = simulated
+    aws.put_object(loadtest.BUCKET, 'jobs/talk/english_text.txt', TEXT.encode('utf-8'))
+    event = {'bucket': loadtest.BUCKET, 'synth_file': 'jobs/talk/english_text.txt'}
+
+    key, error = synthesize_speech.synthesize_speech(event, None)
+
+    assert error is None and key.startswith('speech/') and key.endswith('.mp3')
+    assert len(aws.get_object(loadtest.BUCKET, key)) > 0
+    # The same text again: the output is already there
+    assert synthesize_speech.synthesize_speech(event, None) == [key, None]
+    assert aws.calls['polly.synthesize_speech'] == 1
+
+
+def test_long_text_becomes_a_synthesis_task(simulated, monkeypatch):
+    aws, ws = simulated
+    monkeypatch.setattr(synthesize_speech, 'SYNC_TEXT_LIMIT', 20)
+    monkeypatch.setenv('SYNTHESIS_TOPIC_ARN', 'arn:aws:sns:us-west-1:000000000000:SynthesisTopic')
+    aws.put_object(loadtest.BUCKET, 'audio/talk.txt', TEXT.encode('utf-8'))
+    record = {'s3': {'bucket': {'name': loadtest.BUCKET}, 'object': {'key': 'audio/talk.txt'}}}
+
+    (key, error, task_id), = synthesize_speech.synthesize_speech({'Records': [record]}, None)
+
+    assert error is None and aws.calls['polly.synthesize_speech'] == 0
+    assert driver.wait_for_speech_task(task_id)['TaskStatus'] == 'completed'
+    assert len(aws.get_object(loadtest.BUCKET, key)) > 0
+    assert aws.calls['sns.publish'] == 1
+
+
+def test_missing_text_is_an_error_result(simulated):
+    aws, ws = simulated
+    key, error = synthesize_speech.synthesize_speech({'bucket': loadtest.BUCKET, 'synth_file': 'nowhere.txt'}, None)
+
+    assert key is None and 'NoSuchKey' in error
+
+
+def test_lambda_synthesis_mode_downloads_the_speech(simulated, monkeypatch):
+    aws, ws = simulated
+    monkeypatch.setattr(driver, 'synthesis_mode', 'lambda')
+    # Past the synchronous limit, so the driver waits on a task
+    monkeypatch.setattr(synthesize_speech, 'SYNC_TEXT_LIMIT', 100)
+
+    driver.process_audio_bucket(loadtest.BUCKET, ws)
+
+    assert aws.calls['polly.start_speech_synthesis_task'] == 1
+    assert os.path.getsize(ws.audio_path) > 0
+    with open(ws.output_video_path, 'rb') as f:
+        assert simulated_aws.media_header_duration(f.readline()) == 30.0
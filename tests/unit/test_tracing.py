@@ -0,0 +1,94 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+import tracing
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    path = tmp_path / 'trace.jsonl'
+    monkeypatch.setenv('TRACE_FILE', str(path))
+    monkeypatch.delenv('TRACE_FORMAT', raising=False)
+    monkeypatch.delenv('AWS_LAMBDA_FUNCTION_NAME', raising=False)
+    return path
+
+
+def records(path):
+    return {record['span']: record for record in tracing.read_records(str(path))}
+
+
+def test_nested_spans_roll_up_bytes_and_api_calls(trace_file):
+    with tracing.span('stage', job='job1') as stage:
+        tracing.record_api_call(sent=10)
+        with tracing.span('upload') as upload:
+            upload.add(bytes=100)
+            tracing.record_api_call(sent=100, received=5)
+
+    spans = records(trace_file)
+    assert spans['upload']['parent_id'] == spans['stage']['span_id']
+    assert spans['upload']['trace_id'] == spans['stage']['trace_id'] == stage.trace_id
+    assert (spans['upload']['bytes'], spans['upload']['api_calls']) == (100, 1)
+    assert (spans['stage']['bytes'], spans['stage']['api_calls']) == (100, 2)
+    assert spans['stage']['api_bytes_sent'] == 110
+    assert spans['stage']['job'] == 'job1'
+    assert tracing.current() is None
+
+
+def test_failed_span_records_the_error(trace_file):
+    with pytest.raises(ValueError):
+        with tracing.span('ffmpeg'):
+            raise ValueError("bad input")
+
+    assert records(trace_file)['ffmpeg']['error'] == "ValueError: bad input"
+
+
+def test_worker_threads_count_against_the_submitting_span(trace_file):
+    with tracing.span('synthesize'):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(tracing.propagate(lambda _: tracing.record_api_call()), range(20)))
+
+    assert records(trace_file)['synthesize']['api_calls'] == 20
+
+
+def test_botocore_clients_count_api_calls(trace_file):
+    s3 = tracing.instrument(boto3.client('s3', region_name='us-west-1',
+                                         aws_access_key_id='test', aws_secret_access_key='test'))
+    with Stubber(s3) as stubber:
+        stubber.add_response('put_object', {}, {'Bucket': 'b', 'Key': 'k', 'Body': b'12345'})
+        stubber.add_response('head_object', {'ContentLength': 5}, {'Bucket': 'b', 'Key': 'k'})
+        with tracing.span('upload'):
+            s3.put_object(Bucket='b', Key='k', Body=b'12345')
+            s3.head_object(Bucket='b', Key='k')
+
+    assert records(trace_file)['upload']['api_calls'] == 2
+
+
+def test_lambda_handlers_emit_embedded_metrics(monkeypatch, capsys):
+    monkeypatch.setenv('AWS_LAMBDA_FUNCTION_NAME', 'TranslateLambda')
+    monkeypatch.delenv('TRACE_FORMAT', raising=False)
+
+    @tracing.handler('translate_text')
+    def handler(event, context):
+        tracing.record_api_call(received=42)
+        return event['value']
+
+    assert handler({'value': 7}, None) == 7
+
+    emf = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    metrics = emf['_aws']['CloudWatchMetrics'][0]
+    assert metrics['Dimensions'] == [['Span']]
+    assert {metric['Name'] for metric in metrics['Metrics']} == {'Duration', 'ApiCalls', 'Bytes'}
+    assert (emf['Span'], emf['ApiCalls'], emf['Bytes']) == ('translate_text', 1, 42)
+
+
+def test_summarize_reports_percentiles_per_span():
+    rows = [{'span': 'upload', 'duration_ms': float(ms), 'bytes': 10, 'api_calls': 1,
+             'api_bytes_sent': 0, 'api_bytes_received': 0} for ms in range(1, 101)]
+
+    summary = tracing.summarize(rows)['upload']
+    assert (summary['count'], summary['p50_ms'], summary['p95_ms'], summary['max_ms']) == (100, 50.0, 95.0, 100.0)
+    assert summary['api_calls'] == 1
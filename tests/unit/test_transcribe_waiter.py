@@ -0,0 +1,169 @@
+import pytest
+from botocore.exceptions import EndpointConnectionError
+
+from pipeline.transcribe_waiter import NotificationListener, TranscriptionWaiter
+from pipeline.work_queue import InMemoryQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+class FakeTranscribeClient:
+    """Completes each job once the fake clock passes its finish time."""
+
+    def __init__(self, clock, finish_at, failed=(), errors=0):
+        self.clock = clock
+        self.finish_at = finish_at
+        self.failed = set(failed)
+        self.errors = errors
+        self.calls = []
+
+    def get_transcription_job(self, TranscriptionJobName):
+        self.calls.append((self.clock(), TranscriptionJobName))
+        if self.errors:
+            self.errors -= 1
+            raise EndpointConnectionError(endpoint_url="https://transcribe")
+        done = self.clock() >= self.finish_at[TranscriptionJobName]
+        if not done:
+            status = 'IN_PROGRESS'
+        elif TranscriptionJobName in self.failed:
+            status = 'FAILED'
+        else:
+            status = 'COMPLETED'
+        job = {'TranscriptionJobName': TranscriptionJobName, 'TranscriptionJobStatus': status, 'Transcript': {}}
+        if status == 'COMPLETED':
+            job['Transcript']['TranscriptFileUri'] = f"s3://bucket/{TranscriptionJobName}.json"
+        return {'TranscriptionJob': job}
+
+
+def make_waiter(clock, client, **kwargs):
+    return TranscriptionWaiter(client, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def s3_event(bucket, key):
+    return {'Records': [{'eventName': 'ObjectCreated:Put',
+                         's3': {'bucket': {'name': bucket}, 'object': {'key': key}}}]}
+
+
+def test_short_job_is_noticed_quickly():
+    clock = FakeClock()
+    client = FakeTranscribeClient(clock, {'short': 3.0})
+    waiter = make_waiter(clock, client, min_delay=1.0, backoff=1.5)
+    waiter.add('short', media_duration=2.0)
+
+    result = waiter.wait()
+
+    assert result == {'short': ('COMPLETED', 's3://bucket/short.json')}
+    assert clock.now < 5.0
+
+
+def test_long_job_polls_rarely():
+    clock = FakeClock()
+    client = FakeTranscribeClient(clock, {'long': 1800.0})
+    waiter = make_waiter(clock, client, max_delay=120.0)
+    waiter.add('long', media_duration=3600.0)
+
+    assert waiter.wait()['long'][0] == 'COMPLETED'
+    # The fixed 10 second loop would have made 180 calls
+    assert len(client.calls) < 25
+    assert client.calls[0][0] >= 120.0
+
+
+def test_many_jobs_tracked_at_once():
+    clock = FakeClock()
+    finish = {f'job{i}': 10.0 * i for i in range(10)}
+    client = FakeTranscribeClient(clock, finish, failed={'job3'})
+    waiter = make_waiter(clock, client)
+    for name in finish:
+        waiter.add(name, media_duration=20.0)
+
+    result = waiter.wait()
+
+    assert result['job3'][0] == 'FAILED'
+    assert all(result[name][0] == 'COMPLETED' for name in finish if name != 'job3')
+    assert waiter.api_calls == len(client.calls)
+
+
+def test_timeout_leaves_status_unset():
+    clock = FakeClock()
+    client = FakeTranscribeClient(clock, {'stuck': float('inf')})
+    waiter = make_waiter(clock, client, timeout=300.0)
+    waiter.add('stuck')
+
+    assert waiter.wait() == {'stuck': (None, None)}
+    assert clock.now == pytest.approx(300.0)
+
+
+def test_errors_are_retried():
+    clock = FakeClock()
+    client = FakeTranscribeClient(clock, {'job': 0.0}, errors=2)
+    waiter = make_waiter(clock, client)
+    waiter.add('job')
+
+    assert waiter.wait()['job'][0] == 'COMPLETED'
+    assert len(client.calls) == 3
+
+
+def test_s3_notification_completes_without_polling():
+    clock = FakeClock()
+    client = FakeTranscribeClient(clock, {'job': float('inf')})
+    waiter = make_waiter(clock, client)
+    waiter.add('job', media_duration=600.0)
+
+    assert waiter.notify(s3_event('out-bucket', 'other.json')) == []
+    assert waiter.notify(s3_event('out-bucket', '.write_access_check_file.temp')) == []
+    assert waiter.notify(s3_event('out-bucket', 'job.json')) == ['job']
+
+    assert waiter.wait() == {'job': ('COMPLETED', 's3://out-bucket/job.json')}
+    assert client.calls == []
+
+
+def test_finished_jobs_are_forgotten():
+    clock = FakeClock()
+    client = FakeTranscribeClient(clock, {'a': 5.0, 'b': 5.0})
+    waiter = make_waiter(clock, client)
+    waiter.add('a')
+    waiter.add('b')
+
+    assert waiter.wait(['a'])['a'][0] == 'COMPLETED'
+    assert list(waiter._jobs) == ['b']
+    assert waiter.wait()['b'][0] == 'COMPLETED'
+    assert waiter._jobs == {}
+
+
+def test_unexpected_poll_errors_are_retried():
+    clock = FakeClock()
+    client = FakeTranscribeClient(clock, {'job': 0.0})
+    responses = [{}, client.get_transcription_job('job')]
+    client.get_transcription_job = lambda TranscriptionJobName: responses.pop(0)  # KeyError on the first
+    waiter = make_waiter(clock, client, timeout=600)
+    waiter.add('job')
+
+    assert waiter.wait()['job'][0] == 'COMPLETED'
+    assert clock.now < 600
+
+
+def test_listener_hands_back_other_processes_notifications():
+    clock = FakeClock()
+    waiter = make_waiter(clock, FakeTranscribeClient(clock, {'job': float('inf')}))
+    waiter.add('job')
+    queue = InMemoryQueue(clock=clock)
+    listener = NotificationListener(queue, waiter, max_receives=2)
+    queue.send(s3_event('bucket', 'transcripts/job.json'))
+    queue.send(s3_event('bucket', 'transcripts/elsewhere.json'))
+
+    for message in queue.receive(10):
+        listener.handle(message)
+    assert waiter.status('job') == ('COMPLETED', 's3://bucket/transcripts/job.json')
+    assert len(queue) == 1
+    clock.sleep(listener.retry_delay)
+    listener.handle(queue.receive(1)[0])
+    assert len(queue) == 0
@@ -0,0 +1,88 @@
+import json
+
+import numpy as np
+
+import transcribe_video_tel2eng as driver
+from benchmarks import loadtest
+from pipeline import transcript_index
+from pipeline.transcript_index import Hit, TranscriptIndex
+from transcript_lines import parse_lines
+
+TELUGU = "00:00:00: నమస్కారం, ఈ రోజు మనం\n00:00:06: జై హింద్ అని చెప్పారు\n00:01:10: ఇది ముఖ్యమైన విషయం\n"
+ENGLISH = "00:00:00: Hello, today we\n00:00:06: He said Jai Hind\n00:01:10: Jai, this matters. Hind\n"
+
+
+def write_job(tmp_path, name, telugu=TELUGU, english=ENGLISH):
+    job = tmp_path / 'jobs' / name
+    job.mkdir(parents=True)
+    (job / 'telugu_text.txt').write_text(telugu)
+    (job / 'english_text.txt').write_text(english)
+    return {'te-IN': str(job / 'telugu_text.txt'), 'en-US': str(job / 'english_text.txt')}
+
+
+def test_telugu_words_stay_whole():
+    assert transcript_index.tokenize("నమస్కారం, ఈ రోజు! Jai HIND") == ['నమస్కారం', 'ఈ', 'రోజు', 'jai', 'hind']
+
+
+def test_phrase_search_returns_clip_offsets(tmp_path):
+    index = TranscriptIndex(str(tmp_path / 'index'))
+    assert index.add('talk', write_job(tmp_path, 'talk'), duration=90.0) == 6
+
+    # Both words on the last line, but not next to each other
+    assert index.search("jai hind") == [Hit('talk', 'en-US', 6000, 70000, "He said Jai Hind")]
+    assert index.search("జై హింద్") == [Hit('talk', 'te-IN', 6000, 70000, "జై హింద్ అని చెప్పారు")]
+    assert [hit.start_ms for hit in index.search("jai", languages=['en'])] == [6000, 70000]
+    assert index.search("jai", languages=['te']) == []
+    assert [hit.end_ms for hit in index.search("jai", start_ms=70000)] == [90000]
+    assert index.search("jai", end_ms=6000) == []
+
+
+def test_reindexing_a_video_supersedes_its_lines(tmp_path):
+    index = TranscriptIndex(str(tmp_path / 'index'))
+    index.add('talk', write_job(tmp_path, 'talk'))
+    index.add('talk', write_job(tmp_path, 'edited', english="00:00:06: He said Vande Mataram\n"))
+
+    assert index.search("jai hind", languages=['en']) == []
+    assert [hit.text for hit in index.search("vande mataram")] == ["He said Vande Mataram"]
+    assert index.stats()['segments'] == 1
+
+
+def test_segments_merge_and_stay_memory_mapped(tmp_path):
+    index = TranscriptIndex(str(tmp_path / 'index'), merge_factor=2)
+    for n in range(5):
+        index.add(f"video-{n}", write_job(tmp_path, f"video-{n}"))
+
+    stats = index.stats()
+    assert stats['videos'] == 5 and stats['lines'] == 30
+    assert stats['segments'] < 5
+    assert sorted({hit.video for hit in index.search("jai hind")}) == [f"video-{n}" for n in range(5)]
+
+    index.compact()
+    assert index.stats()['segments'] == 1
+    name, = index.manifest()['segments']
+    assert isinstance(TranscriptIndex(index.root)._segment(name).post_line, np.memmap)
+
+
+def test_cli_backfills_job_directories(tmp_path, capsys):
+    write_job(tmp_path, 'talk-1234abcd')
+    root = str(tmp_path / 'index')
+
+    assert transcript_index.main(['--index', root, 'add', '--workdir', str(tmp_path / 'jobs')]) == 0
+    capsys.readouterr()
+    assert transcript_index.main(['--index', root, 'search', 'Jai Hind', '--language', 'en', '--json']) == 0
+
+    hit, = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert hit['video'] == 'talk-1234abcd' and hit['start_ms'] == 6000
+    assert transcript_index.main(['--index', root, 'search', 'nowhere']) == 1
+
+
+def test_pipeline_runs_are_indexed(simulated):
+    aws, ws = simulated
+    driver.process_audio_bucket(loadtest.BUCKET, ws)
+    with open(ws.dst_text, 'r') as f:
+        timecode, text = next((tc, text) for tc, text in parse_lines(f.read()) if tc and text.strip())
+
+    index = transcript_index.from_env()
+    hits = index.search(text, languages=['en'], videos=[ws.job_id])
+    assert hits and hits[0].start_ms == transcript_index.parse_offset(timecode)
+    assert index.manifest()['videos'][ws.job_id]['languages'] == ['en-US', 'te-IN']
@@ -0,0 +1,56 @@
+import threading
+
+from transcript_lines import format_lines, parse_lines
+from translate_text import pack_batches, translate_segments
+
+
+class FakeTranslate:
+    def __init__(self, merge_lines=False):
+        self.requests = []
+        self.merge_lines = merge_lines
+        self.lock = threading.Lock()
+
+    def translate_text(self, Text, SourceLanguageCode, TargetLanguageCode):
+        assert len(Text.encode('utf-8')) <= 10000
+        with self.lock:
+            self.requests.append(Text)
+        lines = [f"<{line}>" for line in Text.split('\n')]
+        sep = ' ' if self.merge_lines and len(lines) > 1 else '\n'
+        return {'TranslatedText': sep.join(lines)}
+
+
+def test_batches_respect_byte_limit():
+    texts = ["తెలుగు " * 40] * 50  # about 800 bytes each
+    batches = pack_batches(texts, max_bytes=3000)
+
+    assert len(batches) > 1
+    for batch in batches:
+        assert len('\n'.join(piece for _, piece in batch).encode('utf-8')) <= 3000
+    assert [index for batch in batches for index, _ in batch] == list(range(50))
+
+
+def test_oversized_line_is_split_and_rejoined():
+    translate = FakeTranslate()
+    text = "పదం " * 500
+    result = translate_segments(translate, [text], 'te', 'en', max_bytes=1000)
+
+    assert len(translate.requests) > 1
+    assert result[0].replace('<', '').replace('>', '') == text.strip()
+
+
+def test_timecodes_preserved_line_for_line():
+    src = "00:00:00: \n00:00:06: మొదటి వాక్యం\n00:00:12: రెండవ వాక్యం\n"
+    lines = parse_lines(src)
+    translate = FakeTranslate()
+
+    translated = translate_segments(translate, [text for _, text in lines], 'te', 'en', max_bytes=40)
+    out = format_lines((tc, text) for (tc, _), text in zip(lines, translated))
+
+    assert out == "00:00:00: \n00:00:06: <మొదటి వాక్యం>\n00:00:12: <రెండవ వాక్యం>\n"
+
+
+def test_merged_lines_fall_back_to_single_requests():
+    translate = FakeTranslate(merge_lines=True)
+    result = translate_segments(translate, ["a", "b", "c"], 'te', 'en')
+
+    assert result == ["<a>", "<b>", "<c>"]
@@ -0,0 +1,121 @@
+import io
+
+from botocore.exceptions import ClientError
+
+from translate_text import translate_segments
+from translation_memory import S3TranslationMemory, TranslationMemory, normalize
+
+
+class FakeTranslate:
+    def __init__(self):
+        self.requests = []
+
+    def translate_text(self, Text, SourceLanguageCode, TargetLanguageCode):
+        self.requests.append(Text)
+        return {'TranslatedText': '\n'.join(f"<{line}>" for line in Text.split('\n'))}
+
+
+class FakeS3:
+    """Versions objects by a counter, which is also their ETag, and honours conditional writes."""
+
+    def __init__(self):
+        self.objects = {}
+        self.before_put = None
+
+    def get_object(self, Bucket, Key):
+        body, etag = self.objects[Key]
+        return {'Body': io.BytesIO(body), 'ETag': etag}
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None):
+        if self.before_put:
+            self.before_put, before_put = None, self.before_put
+            before_put()
+        current = self.objects.get(Key, (None, None))[1]
+        if (IfMatch and IfMatch != current) or (IfNoneMatch == '*' and current):
+            raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'PutObject')
+        self.objects[Key] = (Body, f'"{int((current or "0").strip(chr(34))) + 1}"')
+
+
+def test_normalized_and_near_duplicate_sentences_hit():
+    memory = TranslationMemory(threshold=0.8)
+    memory.add("కాంగ్రెస్ పార్టీ దేశానికి స్వాతంత్ర్యం తెచ్చింది", "Congress brought independence")
+
+    assert normalize("  Jai   HIND! ") == normalize("jai hind !") == "jai hind!"
+    assert memory.lookup("కాంగ్రెస్ పార్టీ దేశానికి  స్వాతంత్ర్యం తెచ్చింది!") == "Congress brought independence"
+    assert memory.lookup("కాంగ్రెస్ పార్టీ దేశానికి స్వాతంత్ర్యం తెచ్చింది.") == "Congress brought independence"
+    assert memory.lookup("ఈ రోజు వాతావరణం బాగుంది") is None
+    assert memory.stats()['hit_rate'] == round(2 / 3, 3)
+
+
+def test_questions_and_exclamations_are_other_sentences():
+    memory = TranslationMemory()
+    memory.add("Yes.", "<yes>")
+    memory.add("Stop!", "<stop!>")
+
+    assert normalize("Yes.") == normalize("yes") == "yes"
+    assert memory.lookup("yes") == "<yes>"
+    assert memory.lookup("Yes?") is None
+    assert memory.lookup("Stop?") is None
+    assert memory.lookup("STOP !") == "<stop!>"
+
+
+def test_near_duplicates_need_the_threshold():
+    memory = TranslationMemory(threshold=1.0)
+    memory.add("the party brought independence to the country", "x")
+
+    assert memory.lookup("the party brought independence to the country.") == "x"
+    assert memory.lookup("the party brought independence to this country") is None
+
+    memory.threshold = 0.7
+    assert memory.lookup("the party brought independence to this country") == "x"
+    assert memory.stats()['similar_hits'] == 1
+
+
+def test_only_unknown_segments_are_translated():
+    memory = TranslationMemory()
+    translate = FakeTranslate()
+    translate_segments(translate, ["one", "two"], 'te', 'en', memory=memory)
+
+    assert translate_segments(translate, ["two", "three", "One."], 'te', 'en', memory=memory) == \
+        ["<two>", "<three>", "<one>"]
+    assert translate.requests == ["one\ntwo", "three"]
+
+
+def test_invocations_merge_their_entries():
+    s3 = FakeS3()
+    first = S3TranslationMemory(s3, 'bucket', 'te-IN', 'en')
+    second = S3TranslationMemory(s3, 'bucket', 'te-IN', 'en')
+    first.add("one", "<one>")
+    second.add("two", "<two>")
+
+    assert first.save() == 1 and second.save() == 1
+    assert S3TranslationMemory(s3, 'bucket', 'te-IN', 'en').entries == {'one': ('one', '<one>'),
+                                                                       'two': ('two', '<two>')}
+    assert second.save() == 0
+
+
+def test_a_save_in_between_is_merged_again():
+    s3 = FakeS3()
+    first = S3TranslationMemory(s3, 'bucket', 'te-IN', 'en')
+    second = S3TranslationMemory(s3, 'bucket', 'te-IN', 'en')
+    first.add("one", "<one>")
+    second.add("two", "<two>")
+    # second saves after first has read the (missing) object but before it writes
+    s3.before_put = second.save
+
+    assert first.save() == 1
+    assert S3TranslationMemory(s3, 'bucket', 'te-IN', 'en').entries == {'one': ('one', '<one>'),
+                                                                       'two': ('two', '<two>')}
+
+
+def test_a_failed_save_reports_nothing_saved():
+    s3 = FakeS3()
+    memory = S3TranslationMemory(s3, 'bucket', 'te-IN', 'en')
+    memory.add("one", "<one>")
+
+    def denied():
+        raise ClientError({'Error': {'Code': 'AccessDenied'}}, 'PutObject')
+    s3.before_put = denied
+    assert memory.save() == 0
+    # The entry is still new, and the next save writes it
+    assert memory.save() == 1
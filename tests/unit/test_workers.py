@@ -0,0 +1,183 @@
+import os
+
+import transcribe_video_tel2eng as driver
+from benchmarks import loadtest
+from pipeline import work_queue, workers
+from pipeline.work_queue import FileQueue, InMemoryQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_unacknowledged_message_is_redelivered_then_dead_lettered():
+    clock = Clock()
+    queue = InMemoryQueue(visibility_timeout=10, max_receives=2, clock=clock)
+    queue.send({'n': 1})
+
+    first, = queue.receive()
+    assert queue.receive() == []
+    clock.now = 11
+    second, = queue.receive()
+    assert second.receive_count == 2
+    # The first receipt went stale with the redelivery
+    assert not queue.delete(first)
+
+    clock.now = 22
+    assert queue.receive() == []
+    assert queue.dead == [{'n': 1}]
+    assert len(queue) == 0
+
+
+def test_extend_keeps_a_message_invisible():
+    clock = Clock()
+    queue = InMemoryQueue(visibility_timeout=10, clock=clock)
+    queue.send({'n': 1})
+    message, = queue.receive()
+
+    clock.now = 8
+    queue.extend(message, 10)
+    clock.now = 15
+    assert queue.receive() == []
+    assert queue.delete(message)
+
+
+def test_file_queue_claims_each_message_once(tmp_path):
+    root = str(tmp_path / 'queue')
+    queue, other = FileQueue(root, visibility_timeout=60), FileQueue(root, visibility_timeout=60)
+    for n in range(3):
+        queue.send({'n': n})
+
+    received = queue.receive(2) + other.receive(2)
+    assert sorted(m.body['n'] for m in received) == [0, 1, 2]
+    assert other.receive() == []
+    assert all(queue.delete(m) for m in received)
+    assert len(queue) == 0
+
+
+def test_file_queue_reclaims_expired_messages(tmp_path):
+    queue = FileQueue(str(tmp_path / 'queue'), visibility_timeout=60, max_receives=2)
+    queue.send({'n': 1})
+    message, = queue.receive()
+
+    queue.extend(message, -1)  # as if the worker died an hour ago
+    redelivered, = queue.receive()
+    assert redelivered.receive_count == 2
+    assert not queue.delete(message)
+
+    queue.extend(redelivered, -1)
+    assert queue.receive() == []
+    assert queue.dead == [{'n': 1}]
+
+
+def test_open_queue_specs(tmp_path, monkeypatch):
+    # The SQS client is built on the spot and needs a region, whatever the environment has
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-west-1')
+    assert isinstance(work_queue.open_queue('memory'), InMemoryQueue)
+    assert isinstance(work_queue.open_queue(f"file://{tmp_path}/q"), FileQueue)
+    assert isinstance(work_queue.open_queue('https://sqs.us-west-1.amazonaws.com/1/WorkQueue'), work_queue.SQSQueue)
+
+
+def test_s3_notification_records():
+    body = {'Records': [{'eventSource': 'aws:s3', 'eventName': 'ObjectCreated:Put',
+                         's3': {'bucket': {'name': 'b'}, 'object': {'key': 'incoming/my+video%281%29.mp4'}}}]}
+
+    assert workers.s3_objects(body) == [('b', 'incoming/my video(1).mp4', None)]
+    assert workers.s3_objects({'Event': 's3:TestEvent'}) == []
+
+
+def test_fleet_runs_every_stage(simulated):
+    aws, ws = simulated
+    queue = InMemoryQueue()
+    assert workers.submit(queue, [ws]) == 1
+
+    processed = workers.run_workers(queue, loadtest.BUCKET, os.path.dirname(ws.output_dir), 3, idle_exit=0.5)
+
+    assert processed == len(driver.active_stages())
+    assert os.path.exists(ws.output_video_path)
+    assert len(queue) == 0 and queue.dead == []
+
+
+def test_duplicate_delivery_runs_a_stage_once(simulated):
+    aws, ws = simulated
+    queue = InMemoryQueue()
+    worker = workers.Worker(queue, loadtest.BUCKET, os.path.dirname(ws.output_dir))
+    body = workers.stage_message(ws, 'extract')
+    queue.send(body)
+    queue.send(body)
+
+    for message in queue.receive(2):
+        assert worker.handle(message)
+
+    # Each copy enqueued the successor; the stage ran once
+    assert [m.body['stage'] for m in queue.receive(2)] == ['transcribe', 'transcribe']
+    assert driver.load_checkpoint(ws, reload=True).done('extract')
+
+
+def test_failed_stage_stays_on_the_queue(simulated, monkeypatch):
+    aws, ws = simulated
+    queue = InMemoryQueue(visibility_timeout=900)
+    worker = workers.Worker(queue, loadtest.BUCKET, os.path.dirname(ws.output_dir))
+    queue.send(workers.stage_message(ws, 'extract'))
+
+    def fail(stage, bucket_name, ws):
+        raise driver.PipelineError(f"{stage} failed")
+    monkeypatch.setattr(driver, 'run_stage', fail)
+
+    message, = queue.receive()
+    assert not worker.handle(message)
+    assert len(queue) == 1
+    assert not os.path.exists(os.path.join(ws.output_dir, '.lease-extract'))
+
+
+def test_upload_notification_starts_a_job(simulated, tmp_path):
+    aws, ws = simulated
+    with open(ws.input_video_path, 'rb') as f:
+        aws.put_object(loadtest.BUCKET, 'incoming/talk.mp4', f.read())
+    queue = InMemoryQueue()
+    worker = workers.Worker(queue, loadtest.BUCKET, str(tmp_path / 'fleet'))
+    queue.send({'Records': [{'eventSource': 'aws:s3', 'eventName': 'ObjectCreated:Put',
+                             's3': {'bucket': {'name': loadtest.BUCKET}, 'object': {'key': 'incoming/talk.mp4'}}}]})
+
+    message, = queue.receive()
+    assert worker.handle(message)
+
+    first, = queue.receive()
+    assert first.body['stage'] == driver.active_stages()[0]
+    assert first.body['workspace']['input_video_path'] == str(tmp_path / 'fleet' / 'incoming' / 'talk.mp4')
+
+
+def test_duplicate_upload_notification_is_dropped(simulated, tmp_path):
+    aws, ws = simulated
+    with open(ws.input_video_path, 'rb') as f:
+        aws.put_object(loadtest.BUCKET, 'incoming/talk.mp4', f.read())
+    queue = InMemoryQueue()
+    worker = workers.Worker(queue, loadtest.BUCKET, str(tmp_path / 'fleet'))
+    notification = {'Records': [{'eventSource': 'aws:s3', 'eventName': 'ObjectCreated:Put',
+                                 's3': {'bucket': {'name': loadtest.BUCKET},
+                                        'object': {'key': 'incoming/talk.mp4', 'eTag': 'abc123'}}}]}
+    queue.send(notification)
+    message, = queue.receive()
+    assert worker.handle(message)
+    first, = queue.receive()
+    assert worker.handle(first)  # extract ran
+    job = workers.Workspace(**first.body['workspace'])
+    fingerprint = driver.load_checkpoint(job, reload=True).fingerprint
+    downloaded = os.stat(job.input_video_path).st_mtime_ns
+
+    following, = queue.receive()
+    assert following.body['stage'] == 'transcribe'
+
+    queue.send(notification)
+    message, = queue.receive()
+    assert worker.handle(message)
+
+    # Nothing new was queued, and the job keeps its checkpoint
+    assert queue.receive() == []
+    assert os.stat(job.input_video_path).st_mtime_ns == downloaded
+    assert driver.load_checkpoint(job, reload=True).fingerprint == fingerprint
+    assert driver.load_checkpoint(job).done('extract')
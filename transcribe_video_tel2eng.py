@@ -1,25 +1,36 @@
 
-import boto3
 import time
+import functools
 import subprocess
 import requests
 import logging
 import json
 import os
 import sys
-import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
 from botocore.exceptions import BotoCoreError, ClientError
 
+from pipeline.transcribe_waiter import NotificationListener, TranscriptionWaiter
+from pipeline.workspace import Workspace, job_id_for
+from pipeline import (alignment, checkpoint, chunked, discovery, incremental, languages, multitrack,
+                      preprocess, streaming_extract, subtitles, synthesis, transcript_index)
+import aws_clients
+import ratelimit
+import stage_cache
+import tracing
+from transcript_lines import format_lines, parse_lines
+
 ####################################
 # Configuration
 ####################################
 MY_REGION = 'us-west-1'
 STEP_SIZE = 6
-CONFIDENCE = '0.0'  # valid words seen for confidence of 0.043
+CONFIDENCE = 0.0  # valid words seen for confidence of 0.043; compared as a number
 MAXLINE_LEN = 90
 
-# Configure logging settings
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Specify the S3 bucket name
 # bucket_name = 'transcribeBucket'
@@ -43,6 +54,45 @@ telugu_text = outputdir + t_text
 e_trans = 'english_text.txt'
 english_text = outputdir + e_trans
 myapp = "myapplication"
+src_lang = "te-IN"
+dst_lang = "en-US"
+synth_voice = 'Matthew'  # must match the SynthesizeLambda voice for cache keys to line up
+cachedir = "./cache/"
+# Search index of every run's transcripts (pipeline.transcript_index)
+indexdir = "./transcript-index/"
+# 'timeline': per-sentence Polly calls laid onto the video timeline (pipeline.synthesis)
+# 'lambda': the whole text through the SynthesizeLambda
+synthesis_mode = os.environ.get('SYNTHESIS_MODE', 'timeline')
+synthesis_workers = int(os.environ.get('SYNTHESIS_WORKERS', 8))
+# Split audio longer than 2 * TRANSCRIBE_MIN_CHUNK seconds at silences into up to
+# TRANSCRIBE_CHUNKS parallel Transcribe jobs (1 disables chunking)
+transcribe_chunks = int(os.environ.get('TRANSCRIBE_CHUNKS', 1))
+transcribe_min_chunk = float(os.environ.get('TRANSCRIBE_MIN_CHUNK', chunked.MIN_CHUNK))
+# Pipe ffmpeg's audio straight into a multipart S3 upload (no video_only.mp4 / local audio file)
+streaming_extract_mode = os.environ.get('STREAMING_EXTRACT') == '1'
+# Transcription-oriented audio: PREPROCESS_AUDIO=mp3|flac|ogg writes mono 16 kHz audio,
+# PREPROCESS_VAD=1 also cuts long non-speech stretches (times are mapped back afterwards)
+preprocess_codec = os.environ.get('PREPROCESS_AUDIO') or None
+preprocess_vad = os.environ.get('PREPROCESS_VAD') == '1'
+# 'dub': synthesize English speech and mux it in; 'subtitles': English captions only,
+# muxed as a soft subtitle track with stream copy (no Polly, no audio re-encode)
+output_mode = os.environ.get('OUTPUT_MODE', 'dub')
+# TARGET_LANGUAGES=en,hi,ta: transcribe once, then translate (and dub, where Polly has a
+# voice) into every language concurrently and mux all tracks into one container
+target_languages_spec = os.environ.get('TARGET_LANGUAGES', '')
+# Skip stages an earlier run of the same job finished (PIPELINE_RESUME=0 starts over)
+resume_runs = os.environ.get('PIPELINE_RESUME', '1') != '0'
+# Invoke the Lambdas with InvocationType='Event' and read their results from S3
+async_invoke = os.environ.get('ASYNC_INVOKE') == '1'
+# PIPELINE_INCREMENTAL=1: apply edits to telugu_text.txt to the finished outputs,
+# translating and synthesizing only the changed lines
+incremental_mode = os.environ.get('PIPELINE_INCREMENTAL') == '1'
+result_poll_interval = 1.0
+# Lambda's 15 minute limit plus a margin; a result older than this will never come
+result_timeout = float(os.environ.get('LAMBDA_RESULT_TIMEOUT', 960))
+# Transcript notifications: a queue spec (see pipeline.work_queue.open_queue), "stack"
+# for the stack's TranscriptQueue, or "off" to rely on polling alone
+transcript_queue_spec = os.environ.get('TRANSCRIPT_QUEUE', 'stack')
 
 ####################################
 # Utility functions
@@ -50,21 +100,13 @@ myapp = "myapplication"
 
 
 def retrieve_audio_bucket():
-    bucket = None
-    s3 = boto3.client('s3')
-
-    # Get a list of all bucket names
-    buckets = s3.list_buckets()
-    bucket_names = [bucket['Name'] for bucket in buckets['Buckets']]
-
-    # Define a regular expression pattern for your bucket name
-    pattern = re.compile(r'^telugutoenglishtranscrip-transcribebucket')
-
-    # For each bucket name, check if it matches the regular expression
-    for bucket_name in bucket_names:
-        if pattern.match(bucket_name):
-            print(f'The bucket you are looking for is: {bucket_name}')
-            break
+    if os.environ.get('AUDIO_BUCKET_NAME'):
+        return os.environ['AUDIO_BUCKET_NAME']
+    try:
+        bucket_name = get_discovery().audio_bucket()
+    except discovery.DiscoveryError as error:
+        raise PipelineError(f"No audio bucket found: {error}") from error
+    logging.info(f'The bucket you are looking for is: {bucket_name}')
     return bucket_name
 
 
@@ -76,83 +118,179 @@ def convert_time_to_hh_mm_ss(seconds):
     return f'{hours:02d}:{minutes:02d}:{seconds:02d}'
 
 def align_sentences(items, step_size):
-    aligned_sentences = []
-    current_sentence = []
-    curline_len = 0
-    current_time = 0.0
-    start_time = 0.00
-    for item in items:
-        if 'start_time' in item:
-            item_start_time = float(item['start_time'])
-            # if start_time is None:
-            #    start_time = item_start_time  # start time of the current_sentence
-            if item_start_time - start_time > step_size or curline_len > MAXLINE_LEN:
-                # aligned_sentences.append((start_time, " ".join(current_sentence)))
-                aligned_sentences.append({"time": start_time, "line": " ".join(current_sentence)})
-                current_sentence = []
-                curline_len = 0
-                start_time = item_start_time
-            current_time = item_start_time
-        if item['type'] == 'pronunciation':
-            if 'alternatives' in item and item['alternatives'][0]['confidence'] > CONFIDENCE:
-                current_sentence.append(item['alternatives'][0]['content'])
-                curline_len += len(item['alternatives'][0]['content']) + 1
-        elif item['type'] == 'punctuation':
-            if current_sentence and item['alternatives'][0]['confidence'] > CONFIDENCE:  # check if current_sentence is not empty
-                current_sentence[-1] += item['alternatives'][0]['content']
-                curline_len += len(item['alternatives'][0]['content']) + 1
-    if current_sentence:
-        # aligned_sentences.append((start_time, " ".join(current_sentence)))
-        aligned_sentences.append({"time": start_time, "line": " ".join(current_sentence)})
-    return aligned_sentences
-
-
-def get_transcription_job(job_name):
-    # Create a transcribe client
-    transcribe = boto3.client("transcribe")
+    # items: Transcribe result items or an alignment.ItemTable built from them
+    table = items if isinstance(items, alignment.ItemTable) else alignment.ItemTable.from_items(items)
+    return alignment.align_table(table, step_size, MAXLINE_LEN, CONFIDENCE)
 
-    if job_name is None:
-        print("No transcription job to get status for")
-        return None, None
 
+_waiter = None
+_listener = None
+_waiter_lock = threading.Lock()
+
+
+def transcript_queue():
+    # The queue of S3 notifications for finished transcripts, None without one
+    if transcript_queue_spec == 'off':
+        return None
+    from pipeline import work_queue
+    if transcript_queue_spec != 'stack':
+        return work_queue.open_queue(transcript_queue_spec)
+    try:
+        return work_queue.SQSQueue(get_discovery().transcript_queue_url())
+    except discovery.DiscoveryError as error:
+        logging.info(f"No transcript queue, polling Transcribe only: {error}")
+        return None
+
+
+def get_transcription_waiter():
+    # One waiter (and one Transcribe client) shared by every job in the process
+    global _waiter
+    with _waiter_lock:
+        if _waiter is None:
+            _waiter = TranscriptionWaiter(aws_clients.get_client("transcribe"))
+            listen_for_transcripts(_waiter)
+        return _waiter
+
+
+def set_transcription_waiter(waiter, listen=False):
+    # Replace the shared waiter (e.g. one running on a simulated clock)
+    global _waiter
+    with _waiter_lock:
+        _waiter = waiter
+        listen_for_transcripts(waiter if listen else None)
+
+
+def listen_for_transcripts(waiter):
+    # Completion notifications wake the waiter before its next poll (called with _waiter_lock held)
+    global _listener
+    if _listener is not None:
+        _listener.close()
+        _listener = None
+    queue = transcript_queue() if waiter is not None else None
+    if queue is not None:
+        _listener = NotificationListener(queue, waiter).start()
+
+_discovery = None
+_discovery_lock = threading.Lock()
+
+
+def get_discovery():
+    # Stack outputs from SSM, cached under ./cache/discovery/ (see pipeline.discovery)
+    global _discovery
+    with _discovery_lock:
+        if _discovery is None:
+            _discovery = discovery.StackDiscovery(myapp, cachedir)
+        return _discovery
+
+
+def set_discovery(stack_discovery):
+    # Replace the shared discovery (e.g. one caching somewhere other than ./cache/)
+    global _discovery
+    with _discovery_lock:
+        _discovery = stack_discovery
+
+
+def get_media_duration(path):
+    # Duration in seconds according to ffprobe, None if it cannot be determined
+    ffprobe_cmd = [
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        path
+    ]
     try:
-        response = transcribe.get_transcription_job(TranscriptionJobName=job_name)
-        transcript_uri = response['TranscriptionJob']['Transcript']['TranscriptFileUri']
-        return response['TranscriptionJob']['TranscriptionJobStatus'], transcript_uri
-    except BotoCoreError as error:
-        print(f"Error getting transcription job status: {error}")
-        return None, None
-
-def transcribe_job(job_name, src_text):
+        output = subprocess.run(ffprobe_cmd, check=True, capture_output=True, text=True).stdout
+        return float(output.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+
+def s3_location(uri):
+    # (bucket, key) for s3:// and path-style S3 https URIs, None otherwise
+    parsed = urlparse(uri)
+    if parsed.scheme == 's3':
+        return parsed.netloc, parsed.path.lstrip('/')
+    if parsed.scheme == 'https' and parsed.netloc.startswith('s3') and parsed.netloc.endswith('amazonaws.com'):
+        bucket, _, key = parsed.path.lstrip('/').partition('/')
+        return bucket, unquote(key)
+    return None
+
+
+def fetch_transcript_chunks(transcript_uri, chunk_size=alignment.READ_SIZE):
+    # Transcripts written to our own output bucket are not public, read them through S3
+    location = s3_location(transcript_uri)
+    if location:
+        response = aws_clients.get_client('s3').get_object(Bucket=location[0], Key=location[1])
+        yield from response['Body'].iter_chunks(chunk_size)
+    else:
+        with requests.get(transcript_uri, stream=True) as response:
+            response.raise_for_status()
+            yield from response.iter_content(chunk_size)
+
+
+def fetch_transcript_items(transcript_uri):
+    # Only results.items is parsed; the transcript text and speaker labels are skipped
+    return list(alignment.iter_transcript_items(fetch_transcript_chunks(transcript_uri)))
+
+
+def write_transcript(result, src_text, time_map=None):
+    # Align the Transcribe items (result JSON or an ItemTable) into timecoded lines and save them
+    if isinstance(result, alignment.ItemTable):
+        table = result.remap(time_map)  # back onto the original video timeline
+    else:
+        items = result['results']['items']
+        if time_map:
+            items = time_map.remap_items(items)
+        table = alignment.ItemTable.from_items(items)
+    lines = align_sentences(table, STEP_SIZE)
+    with open(src_text, 'w') as f:
+        for item_line in lines:
+            time_in_hh_mm_ss = convert_time_to_hh_mm_ss(int(item_line["time"]))
+            f.write(f'{time_in_hh_mm_ss}: {item_line["line"]}\n')
+    logging.info(f'Transcript has been saved to {src_text}')
+    return src_text
+
+
+def transcribe_job(job_name, src_text, media_duration=None, waiter=None, audio_digest=None, time_map=None,
+                   ws=None):
     # Wait for transcription to complete (Transcription already started by a lambda)
-    while True:
-        jobstatus, transcript_uri = get_transcription_job(job_name)
-        if jobstatus in ['COMPLETED', 'FAILED']:
-            break
-        time.sleep(10)
+    if job_name is None:
+        raise PipelineError("No transcription job to wait for")
+    waiter = waiter or get_transcription_waiter()
+    waiter.add(job_name, media_duration)
+    with tracing.span('transcribe_wait', job_name=job_name):
+        jobstatus, transcript_uri = waiter.wait([job_name])[job_name]
 
     # 3b. Processing the transcription job result
     if jobstatus == 'COMPLETED':
         logging.info(f"Transcription completed, extracting {src_text}...")
-        response = requests.get(transcript_uri)
-        result = json.loads(response.text)
-        items = result['results']['items']
-        lines = align_sentences(items, STEP_SIZE)
-        with open(src_text, 'w') as f:
-            for item_line in lines:
-                time_in_hh_mm_ss = convert_time_to_hh_mm_ss(int(item_line["time"]))
-                f.write(f'{time_in_hh_mm_ss}: {item_line["line"]}\n')
-        logging.info(f'Transcript has been saved to {src_text}')
+        with tracing.span('transcript_fetch') as span:
+            chunks = fetch_transcript_chunks(transcript_uri)
+            cache = get_stage_cache()
+            if cache and audio_digest:
+                # The raw bytes are kept for the cache; the parsed document is never built
+                raw = b''.join(chunks)
+                cache.put(stage_cache.TRANSCRIPTS, stage_cache.transcript_key(audio_digest), raw)
+                chunks = [raw]
+            table = alignment.ItemTable.from_chunks(chunks)
+            span.add(items=len(table.start))
+        with tracing.span('transcript_align'):
+            write_transcript(table, src_text, time_map)
     elif jobstatus == 'FAILED':
         logging.info("Transcription failed")
+        if ws and audio_digest:
+            # A retried stage must start a new job rather than wait on this one again
+            load_checkpoint(ws).discard(transcription_step(audio_digest))
+        raise PipelineError(f"Transcription job {job_name} failed")
     else:
         logging.info("Transcription still in progress")
+        raise PipelineError(f"Timed out waiting for transcription job {job_name}")
 
     return src_text
 
 
 def remove_timecode(input_file):
-    output_file = re.sub(r'\..*', '_no_tc.txt', input_file)
+    output_file = os.path.splitext(input_file)[0] + '_no_tc.txt'
     with open(input_file, 'r') as file:
         lines = file.readlines()
 
@@ -167,13 +305,12 @@ def remove_timecode(input_file):
 # ffmpeg -i telugu_video -c:v copy -map 0:v -c:a copy -map 0:a output_video.mp4 -c:a copy -map 0:a telugu_audio.mp3
 # ffmpeg -i audio_video.mp4 -c:v copy -an video_only.mp4 -vn -c:a libmp3lame -q:a 2 audio_only.mp3
 def split_video_audio(input_path, video_path, audio_path):
-    # Run FFmpeg command to split video and audio
+    # Run FFmpeg command to split video and audio (audio only when video_path is None)
     # ffmpeg -i audio_video.mp4 -c:v copy -an video_only.mp4 -vn -c:a libmp3lame -q:a 2 audio_only.mp3
-    ffmpeg_cmd = [
-        'ffmpeg',
-        '-i', input_path,
-        '-c:v', 'copy',
-        '-an', video_path,
+    ffmpeg_cmd = ['ffmpeg', '-y', '-nostdin', '-i', input_path]
+    if video_path:
+        ffmpeg_cmd += ['-c:v', 'copy', '-an', video_path]
+    ffmpeg_cmd += [
         '-vn',
         '-c:a', 'libmp3lame',
         '-map', '0:a',
@@ -181,13 +318,15 @@ def split_video_audio(input_path, video_path, audio_path):
         audio_path
     ]
 
-    subprocess.run(ffmpeg_cmd, check=True)
+    with tracing.span('split_video_audio', input=input_path) as span:
+        subprocess.run(ffmpeg_cmd, check=True)
+        span.add(bytes=(os.path.getsize(video_path) if video_path else 0) + os.path.getsize(audio_path))
 
 # Combinee
 def combine_video_audio(video_path, audio_path, output_path, offset = None):
     # Run FFmpeg command to combine video and audio
     ffmpeg_cmd = [
-        'ffmpeg',
+        'ffmpeg', '-y', '-nostdin',
         '-i', video_path,
         '-i', audio_path,
         '-c:v', 'copy',
@@ -199,140 +338,787 @@ def combine_video_audio(video_path, audio_path, output_path, offset = None):
         output_path
     ]
 
-    subprocess.run(ffmpeg_cmd, check=True)
+    with tracing.span('combine_video_audio', output=output_path) as span:
+        subprocess.run(ffmpeg_cmd, check=True)
+        span.add(bytes=os.path.getsize(output_path))
+
+
+def cut_media(input_path, start, duration, output_path):
+    # Copy [start, start + duration) seconds of every stream (live mode's replayed windows)
+    ffmpeg_cmd = [
+        'ffmpeg', '-y', '-nostdin',
+        '-ss', f"{start:.3f}",
+        '-t', f"{duration:.3f}",
+        '-i', input_path,
+        '-map', '0',
+        '-c', 'copy',
+        output_path
+    ]
+
+    with tracing.span('cut_media', output=output_path) as span:
+        subprocess.run(ffmpeg_cmd, check=True)
+        span.add(bytes=os.path.getsize(output_path))
+
+
+def upload_file(path, bucket_name, key):
+    with tracing.span('upload', key=key) as span:
+        aws_clients.get_client('s3').upload_file(path, bucket_name, key)
+        span.add(bytes=os.path.getsize(path))
+
+
+def download_file(bucket_name, key, path):
+    with tracing.span('download', key=key) as span:
+        aws_clients.get_client('s3').download_file(bucket_name, key, path)
+        span.add(bytes=os.path.getsize(path))
 
 def get_lambda_function_name(app_name, function_id):
-    ssm_client = boto3.client('ssm')
-    
-    param_name = f"/{app_name}/{function_id}FunctionName"
-    
     try:
-        response = ssm_client.get_parameter(
-            Name=param_name,
-            WithDecryption=True
-        )
-    except (BotoCoreError, ClientError) as error:
-        print(error)
-        raise error
-    else:
-        return response['Parameter']['Value']
+        return get_discovery().function_name(function_id)
+    except discovery.DiscoveryError as error:
+        raise PipelineError(str(error)) from error
 
 
 ####################################
 # End of Utility functions
 ####################################
 
-s3_client = boto3.client('s3')
-lambda_client = boto3.client('lambda')
+# Workspace the single-video run has always used (./mediadir, ./output)
+default_workspace = Workspace(job_id_for(input_video_path), input_video_path, dir, outputdir)
+
+
+def traced_stage(name):
+    # One span per stage call, tagged with the job id of its Workspace argument
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            ws = next((arg for arg in args if isinstance(arg, Workspace)), None)
+            with tracing.span(name, job=ws.job_id if ws else None):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class PipelineError(RuntimeError):
+    def __init__(self, message, exit_code=1):
+        super().__init__(message)
+        self.exit_code = exit_code
+
+
+def _invoke(function_name, request, invocation_type):
+    return aws_clients.get_client('lambda').invoke(
+        FunctionName=function_name,
+        InvocationType=invocation_type,
+        Payload=request
+    )
+
+
+def invoke_lambda(function_id, event, asynchronous=False):
+    # RequestResponse returns the handler's result; Event returns None once Lambda queued the event
+    invocation_type = 'Event' if asynchronous else 'RequestResponse'
+    with tracing.span(f'invoke.{function_id}', invocation_type=invocation_type) as span:
+        function_name = get_lambda_function_name(myapp, function_id)
+        request = json.dumps(event)
+        try:
+            response = _invoke(function_name, request, invocation_type)
+        except ClientError as error:
+            if error.response['Error']['Code'] != 'ResourceNotFoundException':
+                raise
+            # The stack was redeployed since the names were cached: rediscover once
+            logging.info(f"{function_name} not found, refreshing stack outputs")
+            get_discovery().invalidate()
+            function_name = get_lambda_function_name(myapp, function_id)
+            response = _invoke(function_name, request, invocation_type)
+
+        if asynchronous:
+            span.add(bytes=len(request))
+            if response['StatusCode'] != 202:
+                raise PipelineError(f"{function_id} did not accept the event: {response['StatusCode']}")
+            return None
+
+        # Check if the response indicates completion
+        payload = response['Payload'].read().decode('utf-8')
+        span.add(bytes=len(request) + len(payload))
+    resp = json.loads(payload)  # Convert the JSON string to a Python object
+    if response['StatusCode'] != 200 or 'FunctionError' in response:
+        logging.error(f"Received error: {response['StatusCode']}: {resp}")
+        raise PipelineError(f"{function_id} failed: {resp}")
+    return resp
+
 
+def wait_for_result(bucket_name, result_key, function_id, invoked_at):
+    # Poll for the record async_results.writes_result leaves in S3
+    s3 = aws_clients.get_client('s3')
+    interval = result_poll_interval
+    with tracing.span(f'await.{function_id}'):
+        while True:
+            try:
+                body = s3.get_object(Bucket=bucket_name, Key=result_key)['Body'].read()
+                break
+            except ClientError as error:
+                if error.response['Error']['Code'] not in ('NoSuchKey', '404'):
+                    raise
+            if time.time() - invoked_at > result_timeout:
+                raise PipelineError(f"{function_id} wrote no result to {result_key} "
+                                    f"within {result_timeout:.0f}s")
+            time.sleep(interval)
+            interval = min(interval * 2, 10.0)
+    record = json.loads(body)
+    if record['status'] != 'ok':
+        raise PipelineError(f"{function_id} failed: {record['error']}")
+    return record['result']
 
-def process_audio_bucket(bucket_name):
-    # Split multimedia into video and audio only
-    split_video_audio(input_video_path, video_only, audio_only)
 
-    # get the S3 bucket
+def wait_for_speech_task(task_id):
+    # Poll a Polly speech synthesis task until its audio is in S3
+    polly = aws_clients.get_client('polly')
+    interval = result_poll_interval
+    started = time.time()
+    with tracing.span('await.speech_task', task_id=task_id):
+        while True:
+            task = polly.get_speech_synthesis_task(TaskId=task_id)['SynthesisTask']
+            if task['TaskStatus'] == 'completed':
+                return task
+            if task['TaskStatus'] == 'failed':
+                raise PipelineError(f"Speech synthesis task {task_id} failed: {task.get('TaskStatusReason')}",
+                                    exit_code=2)
+            if time.time() - started > result_timeout:
+                raise PipelineError(f"Speech synthesis task {task_id} did not finish within {result_timeout:.0f}s",
+                                    exit_code=2)
+            time.sleep(interval)
+            interval = min(interval * 2, 10.0)
 
-    # Upload the video file to the S3 bucket
-    s3_client.upload_file(audio_only, bucket_name, audio_only)
 
-    logging.info(f"Audio upload of {input_video_path} completed.")
+def call_lambda(function_id, event, ws, step):
+    """invoke_lambda for one step of ws's job, recorded in its checkpoint.
 
+    A retried stage gets the recorded result back instead of invoking again. In
+    async mode the S3 key of a pending invocation is recorded too, so a driver
+    that crashed while waiting picks the result up on resume.
+    """
+    ckpt = load_checkpoint(ws)
+    if not async_invoke:
+        return ckpt.memo(step, lambda: invoke_lambda(function_id, event))
+    if ckpt.get(step) is not None:
+        return ckpt.get(step)
+
+    pending_step = f"{step}:pending"
+    pending = ckpt.get(pending_step)
+    if pending is None or time.time() - pending['invoked_at'] > result_timeout:
+        result_key = ws.key(f"{function_id}-{uuid.uuid4().hex[:12]}.result.json")
+        invoke_lambda(function_id, dict(event, result_key=result_key), asynchronous=True)
+        pending = {'result_key': result_key, 'invoked_at': time.time()}
+        ckpt.put(pending_step, pending)
+    else:
+        logging.info(f"{ws.job_id}: waiting on {function_id} invoked by an earlier run")
+
+    try:
+        result = wait_for_result(event['bucket'], pending['result_key'], function_id, pending['invoked_at'])
+    except PipelineError:
+        ckpt.discard(pending_step)
+        raise
+    if result is not None:
+        ckpt.put(step, result)
+    ckpt.discard(pending_step)
+    return result
+
+
+def extract_stage(ws):
+    # Split multimedia into video and audio only (CPU bound, runs in a process pool in batch mode)
+    ws.makedirs()
+    if streaming_extract_mode:
+        return ws  # audio is streamed to S3 by transcribe_streamed_stage
+    # Subtitles and multi-language tracks are muxed into the original container,
+    # so only the audio is extracted
+    video_only = None if output_mode == 'subtitles' or target_languages_spec else ws.video_only
+    if preprocess_codec:
+        time_map = preprocess.split_for_transcription(
+            ws.input_video_path, video_only, local_audio(ws), preprocess_codec, preprocess_vad,
+            duration=get_media_duration(ws.input_video_path))
+        time_map.save(ws.time_map_path)
+        return ws
+    split_video_audio(ws.input_video_path, video_only, ws.audio_only)
+    return ws
+
+
+def audio_media_format():
+    return preprocess.CODECS[preprocess_codec][1] if preprocess_codec else 'mp3'
+
+
+def local_audio(ws):
+    # Extracted audio file of a workspace (format depends on preprocessing)
+    return ws.audio_file(audio_media_format())
+
+
+def load_time_map(ws):
+    if preprocess_codec and os.path.exists(ws.time_map_path):
+        return preprocess.TimeMap.load(ws.time_map_path)
+    return None
+
+
+def get_stage_cache():
+    # Local stage cache (./cache/ by default, see stage_cache.from_env); None when disabled
+    return stage_cache.shared(cachedir)
+
+
+def start_transcription(bucket_name, ws, media_key, audio_digest, media_format='mp3'):
     event = {
         "bucket": bucket_name,
-        "media": audio_only,
-        "transcript_file": telugu_text,
-        "dir": dir,
-        "src_lang": "te-IN",
-        "dst_lang": "en-US",
+        "media": media_key,
+        "media_format": media_format,
+        "audio_sha256": audio_digest,
+        "job_name": f"tel2eng-{ws.job_id}-{int(time.time())}",
+        "transcript_file": ws.src_text,
+        "dir": ws.media_dir,
+        "src_lang": src_lang,
+        "dst_lang": dst_lang,
     }
 
     # Invoke the transcribe_audio Lambda function for telugu text availability
-    function_name = get_lambda_function_name(myapp, "TranscriptionLambda")
-    response = lambda_client.invoke(
-        FunctionName=function_name,
-        InvocationType='RequestResponse',
-        Payload=json.dumps(event)
-    )
+    return call_lambda("TranscriptionLambda", event, ws, transcription_step(audio_digest))
 
-    # Check if the response indicates completion
-    payload = response['Payload'].read().decode('utf-8')
-    resp = json.loads(payload)  # Convert the JSON string to a Python object
-    if response['StatusCode'] == 200:
 
-        # Get the transcript file for the target language
-        job_name = resp
-        transcript_file =  transcribe_job(job_name, telugu_text)
-    else: 
-        logging.error(f"Received error: {response['StatusCode']}: {resp}")
-        sys.exit(1)
+def transcription_step(audio_digest):
+    return f"transcription_job:{audio_digest}"
+
+
+def cached_transcript(ws, audio_digest):
+    cache = get_stage_cache()
+    cached = cache.get(stage_cache.TRANSCRIPTS, stage_cache.transcript_key(audio_digest)) if cache else None
+    if cached is None:
+        return None
+    logging.info(f"Transcript cache hit for {ws.input_video_path}")
+    return write_transcript(alignment.ItemTable.from_chunks([cached]), ws.src_text, load_time_map(ws))
+
 
-    # Next do the translation (telugu) to (english)
-    telugu_file = transcript_file
+def transcribe_streamed_stage(bucket_name, ws):
+    # Stream-copy (or encode) the audio into a content-addressed S3 object, skipped when present
+    plan = streaming_extract.plan_extraction(ws.input_video_path)
+    audio_digest = streaming_extract.audio_digest(stage_cache.file_digest(ws.input_video_path), plan)
+    transcript_file = cached_transcript(ws, audio_digest)
+    if transcript_file:
+        return transcript_file
 
+    media_key = streaming_extract.media_key(audio_digest, plan)
+    streaming_extract.extract_to_s3(ws.input_video_path, aws_clients.get_client('s3'), bucket_name,
+                                    media_key, plan)
+    job_name = start_transcription(bucket_name, ws, media_key, audio_digest, plan.media_format)
+    return transcribe_job(job_name, ws.src_text, media_duration=get_media_duration(ws.input_video_path),
+                          audio_digest=audio_digest, ws=ws)
+
+
+@traced_stage('transcribe')
+def transcribe_stage(bucket_name, ws):
+    if streaming_extract_mode:
+        return transcribe_streamed_stage(bucket_name, ws)
+
+    audio_digest = stage_cache.file_digest(local_audio(ws))
+    transcript_file = cached_transcript(ws, audio_digest)
+    if transcript_file:
+        return transcript_file
+
+    duration = get_media_duration(local_audio(ws))
+    if transcribe_chunks > 1 and duration and duration >= 2 * transcribe_min_chunk:
+        return transcribe_chunked_stage(bucket_name, ws, audio_digest, duration)
+
+    # Upload the audio file to the S3 bucket under the job's own prefix
+    audio_key = ws.key(local_audio(ws))
+    upload_file(local_audio(ws), bucket_name, audio_key)
+
+    logging.info(f"Audio upload of {ws.input_video_path} completed.")
+
+    job_name = start_transcription(bucket_name, ws, audio_key, audio_digest, audio_media_format())
+
+    # Get the transcript file for the source language
+    return transcribe_job(job_name, ws.src_text, media_duration=duration, audio_digest=audio_digest,
+                          time_map=load_time_map(ws), ws=ws)
+
+
+def transcribe_chunked_stage(bucket_name, ws, audio_digest, duration):
+    # Cut the audio at silences and run one transcription job per chunk in parallel
+    silences = chunked.detect_silences(local_audio(ws), duration=duration)
+    cuts = chunked.choose_cut_points(silences, duration, transcribe_chunks, transcribe_min_chunk)
+    pieces = chunked.split_audio(local_audio(ws), cuts, ws.media_dir)
+    bounds = [offset for offset, _ in pieces[1:]] + [duration]
+    logging.info(f"Transcribing {ws.input_video_path} as {len(pieces)} chunks")
+
+    digests = [stage_cache.file_digest(chunk_path) for _, chunk_path in pieces]
+    ckpt = load_checkpoint(ws)
+
+    def start(index, piece):
+        offset, chunk_path = piece
+        chunk_key = ws.key(chunk_path)
+        if ckpt.get(transcription_step(digests[index])) is None:
+            upload_file(chunk_path, bucket_name, chunk_key)
+        event = {
+            "bucket": bucket_name,
+            "media": chunk_key,
+            "media_format": audio_media_format(),
+            "audio_sha256": digests[index],
+            "job_name": f"tel2eng-{ws.job_id}-{int(time.time())}-c{index:03d}",
+            "src_lang": src_lang,
+            "dst_lang": dst_lang,
+        }
+        return call_lambda("TranscriptionLambda", event, ws, transcription_step(digests[index]))
+
+    with ThreadPoolExecutor(max_workers=len(pieces)) as pool:
+        job_names = list(pool.map(tracing.propagate(start), range(len(pieces)), pieces))
+
+    waiter = get_transcription_waiter()
+    for job_name, (offset, _), end in zip(job_names, pieces, bounds):
+        waiter.add(job_name, end - offset)
+    with tracing.span('transcribe_wait', jobs=len(job_names)):
+        statuses = waiter.wait(job_names)
+
+    chunk_results = []
+    for job_name, (offset, _), digest in zip(job_names, pieces, digests):
+        jobstatus, transcript_uri = statuses[job_name]
+        if jobstatus == 'FAILED':
+            ckpt.discard(transcription_step(digest))
+        if jobstatus != 'COMPLETED':
+            raise PipelineError(f"Transcription job {job_name} did not complete: {jobstatus}")
+        chunk_results.append((offset, fetch_transcript_items(transcript_uri)))
+
+    result = {'results': {'items': chunked.merge_chunk_items(chunk_results)}}
+    cache = get_stage_cache()
+    if cache:
+        cache.put(stage_cache.TRANSCRIPTS, stage_cache.transcript_key(audio_digest), json.dumps(result))
+    return write_transcript(result, ws.src_text, load_time_map(ws))
+
+
+def index_transcripts(ws, transcripts):
+    # Add {language: transcript file} to the search index (see transcript_index.from_env);
+    # the run's outputs do not depend on it, so a failure only warns
+    index = transcript_index.from_env(indexdir)
+    if index is None:
+        return
+    try:
+        with tracing.span('index_transcripts', job=ws.job_id) as span:
+            span.add(lines=index.add(ws.job_id, transcripts, source=ws.input_video_path,
+                                     duration=get_media_duration(ws.input_video_path)))
+    except (OSError, ValueError) as error:
+        logging.warning(f"{ws.job_id}: transcripts not indexed: {error}")
+
+
+@traced_stage('translate')
+def translate_stage(bucket_name, ws, transcript_file):
+    translate_to(bucket_name, ws, transcript_file, ws.dst_text)
+    # What the later stages are built from, for incremental re-runs after an edit
+    incremental.save_record(ws.line_record_path, transcript_file, ws.dst_text)
+    index_transcripts(ws, {src_lang: transcript_file, dst_lang: ws.dst_text})
+    return ws.dst_text
+
+
+def translate_to(bucket_name, ws, transcript_file, dst_text, target=None, src_key=None, exact_memory=False):
+    # Translate transcript_file into dst_text: English by default, else target's language.
+    # src_key is the transcript's S3 key when the caller already uploaded it; exact_memory
+    # keeps the translation memory from answering with a near-identical sentence.
+    cache = get_stage_cache()
+    with open(transcript_file, 'r') as f:
+        src_content = f.read()
+    key = stage_cache.translation_key(src_content, src_lang, target.translate_code if target else dst_lang)
+    cached = cache.get(stage_cache.TRANSLATIONS, key) if cache else None
+    if cached is not None:
+        logging.info(f"Translation cache hit for {dst_text}")
+        with open(dst_text, 'wb') as f:
+            f.write(cached)
+        return dst_text
+
+    dst_key = ws.key(dst_text)
+    if src_key is None:
+        src_key = ws.key(transcript_file)
+        upload_file(transcript_file, bucket_name, src_key)
     event = {
         "bucket": bucket_name,
-        "src_text": telugu_text,
-        "dst_text": english_text,
-        "dir": dir,
-        "src_lang": "te-IN",
-        "dst_lang": "en-US",
+        "src_text": src_key,
+        "dst_text": dst_key,
+        "dir": ws.media_dir,
+        "src_lang": src_lang,
+        "dst_lang": dst_lang,
     }
+    if target:
+        event["target_language_code"] = target.translate_code
+    if exact_memory:
+        event["translation_memory"] = "exact"
 
     # Invoke the translate_text Lambda function for telugu to English text
-    function_name = get_lambda_function_name(myapp, "TranslateLambda")
-    response = lambda_client.invoke(
-        FunctionName=function_name,
-        InvocationType='RequestResponse',
-        Payload=json.dumps(event)
-    )
+    call_lambda("TranslateLambda", event, ws, f"translate:{key}")
+    download_file(bucket_name, dst_key, dst_text)
+    if cache:
+        with open(dst_text, 'rb') as f:
+            cache.put(stage_cache.TRANSLATIONS, key, f.read())
+    return dst_text
 
-    # Check if the response indicates completion
-    payload = response['Payload'].read().decode('utf-8')
-    resp = json.loads(payload)  # Convert the JSON string to a Python object
-    pprint(response)
-    if response['StatusCode'] != 200:
-        logging.error(f"Received error: {response['StatusCode']}: {resp}")
-        sys.exit(1)
+
+def target_languages():
+    # Targets of a multi-language run, [] for the usual single English output
+    try:
+        return languages.parse_targets(target_languages_spec)
+    except ValueError as error:
+        raise PipelineError(str(error)) from error
+
+
+def dubbed_targets(targets):
+    return [] if output_mode == 'subtitles' else [target for target in targets if target.voice]
+
+
+@traced_stage('localize')
+def localize_stage(bucket_name, ws):
+    """Translate the one transcript into every target language concurrently; write
+    subtitles for each and a dubbed track for those Polly has a voice for."""
+    targets = target_languages()
+    dubbed = dubbed_targets(targets)
+    src_key = ws.key(ws.src_text)
+    upload_file(ws.src_text, bucket_name, src_key)
+    duration = get_media_duration(ws.input_video_path)
+    polly = aws_clients.get_client('polly')
+
+    def localize(target):
+        with tracing.span('localize_language', language=target.code):
+            text = translate_to(bucket_name, ws, ws.src_text, ws.language_file(target.code, 'text.txt'),
+                                target, src_key)
+            subtitles.write_subtitles(text, ws.language_file(target.code, 'text.srt'),
+                                      ws.language_file(target.code, 'text.vtt'), duration)
+            if target in dubbed:
+                synthesis.synthesize_timeline(text, ws.language_file(target.code, 'audio.wav'), duration, polly,
+                                              voice=target.voice, max_workers=synthesis_workers,
+                                              cache=get_stage_cache())
+
+    with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+        list(pool.map(tracing.propagate(localize), targets))
+    index_transcripts(ws, dict({src_lang: ws.src_text},
+                               **{target.code: ws.language_file(target.code, 'text.txt') for target in targets}))
+    logging.info(f"Localized {ws.input_video_path} into {', '.join(t.code for t in targets)} "
+                 f"({len(dubbed)} dubbed)")
+    return [target.code for target in targets]
+
+
+def synthesize_timeline_stage(ws):
+    # Synthesize each aligned sentence concurrently and place it at its timecode
+    polly = aws_clients.get_client('polly')
+    duration = get_media_duration(ws.input_video_path)
+    with tracing.span('synthesize_timeline') as span:
+        synthesis.synthesize_timeline(ws.dst_text, ws.track_path, duration, polly, voice=synth_voice,
+                                      max_workers=synthesis_workers, cache=get_stage_cache())
+        span.add(bytes=os.path.getsize(ws.track_path))
+    logging.info("Audio synthesis completed.")
+    return ws.track_path
+
+
+@traced_stage('synthesize')
+def synthesize_stage(bucket_name, ws):
+    if synthesis_mode == 'timeline':
+        return synthesize_timeline_stage(ws)
 
     # Now trigger the synthesis
-    synth_file = remove_timecode(english_text)
+    cache = get_stage_cache()
+    synth_file = remove_timecode(ws.dst_text)
+    with open(synth_file, 'r') as f:
+        key = stage_cache.speech_key(f.read(), synth_voice, 'mp3')
+    cached = cache.get(stage_cache.SPEECH, key) if cache else None
+    if cached is not None:
+        logging.info(f"Speech cache hit for {synth_file}")
+        with open(ws.audio_path, 'wb') as f:
+            f.write(cached)
+        return ws.audio_path
+
+    synth_key = ws.key(synth_file)
     event = {
         "bucket": bucket_name,
-        "synth_file": synth_file,
+        "synth_file": synth_key,
     }
 
     # Upload file to be synthesized
-    s3_client.upload_file(synth_file, bucket_name, os.basename(synth_file))
+    upload_file(synth_file, bucket_name, synth_key)
 
-    # Poll the synthesize_video Lambda function for audio stream availability
-    function_name = get_lambda_function_name(myapp, "SynthesizeLambda")
-    response = lambda_client.invoke(
-        FunctionName=function_name,
-        InvocationType='RequestResponse',
-        Payload=json.dumps(event)
-    )
+    # Invoke the synthesize_speech Lambda function for audio stream availability
+    result = call_lambda("SynthesizeLambda", event, ws, f"synthesize:{key}")
+    if not result or result[0] is None:
+        load_checkpoint(ws).discard(f"synthesize:{key}")
+        logging.error(f"Error occurred: {result and result[1]}")
+        raise PipelineError(f"SynthesizeLambda failed: {result}", exit_code=2)
 
-    # Check if the response indicates completion
-    if response['StatusCode'] == 200:
-        payload = response['Payload'].read().decode('utf-8')
-        result = json.loads(payload)
-        if result[0] is None:
-            logging.error(f"Error occurred: {result[1]}")
-            sys.exit(2)
-
-    # jobId = response['SynthesisTask']['TaskId']
-    outputUri = response['SynthesisTask']['OutputUri']
-    # if 'status' in response_payload and response_payload['status'] == 'completed':
-    # English text is available, download it
-    s3_client.download_file(bucket_name, os.path.basename(outputUri), audio_path)
+    if len(result) > 2:
+        # Text too long for one request: Polly is still writing the audio of a synthesis task
+        try:
+            wait_for_speech_task(result[2])
+        except PipelineError:
+            load_checkpoint(ws).discard(f"synthesize:{key}")
+            raise
+
+    # English audio is available, download it
+    download_file(bucket_name, result[0], ws.audio_path)
+    if cache:
+        with open(ws.audio_path, 'rb') as f:
+            cache.put(stage_cache.SPEECH, key, f.read())
     logging.info("Audio synthesis completed.")
+    return ws.audio_path
 
 
-    combine_video_audio(video_only, audio_path, output_video_path, offset = english_text)
+def aws_stages(bucket_name, ws):
+    run_stages(bucket_name, ws, aws_stage_names())
+    cache = get_stage_cache()
+    if cache:
+        logging.info(f"Stage cache: {cache.stats()}")
+    logging.info(f"Rate limits: {ratelimit.stats()}")
+    return ws
 
-    logging.info("English video creation completed.")
 
+@traced_stage('subtitles')
+def subtitles_stage(ws):
+    # SRT and WebVTT from the translated lines; no Polly, no remove_timecode
+    cue_list = subtitles.write_subtitles(ws.dst_text, ws.srt_path, ws.vtt_path,
+                                         get_media_duration(ws.input_video_path))
+    logging.info(f"Wrote {len(cue_list)} subtitle cues to {ws.srt_path} and {ws.vtt_path}")
+    return ws.srt_path
 
-bucket_name = retrieve_audio_bucket()
-process_audio_bucket(bucket_name)
 
+@traced_stage('mux')
+def mux_stage(ws):
+    targets = target_languages()
+    if targets:
+        return mux_multilingual(ws, targets)
+    if output_mode == 'subtitles':
+        output = ws.subtitled_video_path(subtitles.output_container(ws.input_video_path))
+        with tracing.span('mux_subtitles', output=output) as span:
+            subtitles.mux_subtitles(ws.input_video_path, ws.srt_path, output)
+            span.add(bytes=os.path.getsize(output))
+        logging.info(f"Subtitled video creation completed: {output}")
+        return output
+
+    audio = ws.track_path if synthesis_mode == 'timeline' else ws.audio_path
+    # combine_video_audio only takes the video stream of its first input, so the
+    # original container works as well as video_only.mp4
+    video = ws.input_video_path if streaming_extract_mode else ws.video_only
+    combine_video_audio(video, audio, ws.output_video_path, offset = ws.dst_text)
+
+    logging.info(f"English video creation completed: {ws.output_video_path}")
+    return ws.output_video_path
+
+
+####################################
+# Stage state machine
+####################################
+STAGES = ('extract', 'transcribe', 'translate', 'synthesize', 'mux')
+SUBTITLE_STAGES = ('extract', 'transcribe', 'translate', 'subtitles', 'mux')
+MULTILINGUAL_STAGES = ('extract', 'transcribe', 'localize', 'mux')
+
+
+def active_stages():
+    if target_languages_spec:
+        return MULTILINGUAL_STAGES
+    return SUBTITLE_STAGES if output_mode == 'subtitles' else STAGES
+
+
+def aws_stage_names():
+    # Everything between extract and mux (batch mode runs them on the AWS thread pool)
+    return active_stages()[1:-1]
+
+
+def check_streaming_extract():
+    # Streamed audio goes straight to S3: there is no local file to preprocess or cut into chunks
+    if streaming_extract_mode and (preprocess_codec or transcribe_chunks > 1):
+        raise PipelineError("STREAMING_EXTRACT=1 cannot be combined with PREPROCESS_AUDIO or TRANSCRIBE_CHUNKS > 1")
+
+
+def run_stage(stage, bucket_name, ws):
+    # Run one stage by name; returns its output file (None for extract)
+    check_streaming_extract()
+    if stage == 'extract':
+        extract_stage(ws)
+        return None
+    if stage == 'transcribe':
+        return transcribe_stage(bucket_name, ws)
+    if stage == 'translate':
+        return translate_stage(bucket_name, ws, ws.src_text)
+    if stage == 'synthesize':
+        return synthesize_stage(bucket_name, ws)
+    if stage == 'subtitles':
+        return subtitles_stage(ws)
+    if stage == 'localize':
+        return localize_stage(bucket_name, ws)
+    return mux_stage(ws)
+
+
+def stage_files(stage, ws, result):
+    # Files a finished stage leaves behind; it runs again when one of them is gone
+    if stage == 'extract':
+        if streaming_extract_mode:
+            return []
+        if output_mode == 'subtitles' or target_languages_spec:
+            return [local_audio(ws)]
+        return [ws.video_only, local_audio(ws)]
+    if stage == 'subtitles':
+        return [ws.srt_path, ws.vtt_path]
+    if stage == 'localize':
+        targets = target_languages()
+        return ([ws.language_file(t.code, name) for t in targets for name in ('text.txt', 'text.srt', 'text.vtt')]
+                + [ws.language_file(t.code, 'audio.wav') for t in dubbed_targets(targets)])
+    return [result]
+
+
+def run_settings():
+    # Settings that change stage outputs; a checkpoint written under others is ignored
+    return {
+        'output_mode': output_mode,
+        'synthesis_mode': synthesis_mode,
+        'preprocess': [preprocess_codec, preprocess_vad],
+        'streaming_extract': streaming_extract_mode,
+        'transcribe_chunks': transcribe_chunks,
+        'languages': [src_lang, dst_lang],
+        'targets': target_languages_spec,
+        'voice': synth_voice,
+    }
+
+
+def checkpoint_path(ws):
+    return os.path.join(ws.output_dir, checkpoint.CHECKPOINT_FILE)
+
+
+_checkpoints = {}
+_checkpoints_lock = threading.Lock()
+
+
+def load_checkpoint(ws, reload=False):
+    # The job's checkpoint, shared by everything in this process that works on ws
+    path = checkpoint_path(ws)
+    with _checkpoints_lock:
+        ckpt = None if reload else _checkpoints.get(path)
+        if ckpt is None:
+            ckpt = checkpoint.Checkpoint(path, checkpoint.fingerprint(ws.input_video_path, run_settings()))
+            _checkpoints[path] = ckpt
+        return ckpt
+
+
+def run_stages(bucket_name, ws, stages=None):
+    """Run stages in order, skipping those an earlier run of the job finished.
+
+    A stage that runs again invalidates every later stage. A failing stage
+    raises; its checkpoint keeps the steps it already completed for the next
+    attempt. Returns the result of the last stage.
+    """
+    stages = stages or active_stages()
+    ws.makedirs()
+    # Reload: in batch mode other processes ran the earlier stages
+    ckpt = load_checkpoint(ws, reload=True)
+    if not resume_runs and stages[0] == 'extract':
+        ckpt.clear()
+    result = None
+    for stage in stages:
+        if ckpt.done(stage):
+            logging.info(f"{ws.job_id}: {stage} finished in an earlier run, skipping")
+            result = ckpt.result(stage)
+            continue
+        order = active_stages()
+        ckpt.invalidate(order[order.index(stage) + 1:])
+        ckpt.start(stage)
+        try:
+            result = run_stage(stage, bucket_name, ws)
+        except Exception as error:
+            ckpt.fail(stage, error)
+            raise
+        ckpt.complete(stage, result, stage_files(stage, ws, result))
+    return result
+
+
+def mux_multilingual(ws, targets):
+    # Every language's track and subtitles into a copy of the original container, one ffmpeg pass
+    output = ws.multilingual_video_path(subtitles.output_container(ws.input_video_path))
+    audio_tracks = [(ws.language_file(t.code, 'audio.wav'), t.iso639_2) for t in dubbed_targets(targets)]
+    subtitle_tracks = [(ws.language_file(t.code, 'text.srt'), t.iso639_2) for t in targets]
+    has_audio = streaming_extract.probe_audio_codec(ws.input_video_path) is not None
+    with tracing.span('combine_multilingual', output=output, languages=len(targets)) as span:
+        multitrack.mux(ws.input_video_path, audio_tracks, subtitle_tracks, output,
+                       languages.iso639_2(src_lang) if has_audio else None)
+        span.add(bytes=os.path.getsize(output))
+    logging.info(f"Multi-language video creation completed: {output}")
+    return output
+
+
+def translate_edited_lines(bucket_name, ws, lines):
+    # Translations of just these lines, through the TranslateLambda as usual
+    with open(ws.edited_lines, 'w') as f:
+        f.write(format_lines(lines))
+    translate_to(bucket_name, ws, ws.edited_lines, ws.edited_translation, exact_memory=True)
+    with open(ws.edited_translation, 'r') as f:
+        translated = [text for timecode, text in parse_lines(f.read()) if timecode is not None]
+    if len(translated) != len(lines):
+        raise PipelineError(f"Translated {len(translated)} lines for {len(lines)} edited ones")
+    return translated
+
+
+def rerun_edited(bucket_name, ws=None):
+    """Bring a finished run up to date with an edited transcript.
+
+    Lines of ws.src_text are matched to the line record of the last run by
+    timecode and text. Only the unmatched lines are translated, only the
+    track slots that changed are synthesized and spliced into the existing
+    track, then the video is muxed again.
+    """
+    ws = ws or default_workspace
+    if target_languages_spec or (output_mode != 'subtitles' and synthesis_mode != 'timeline'):
+        raise PipelineError("Incremental re-runs need SYNTHESIS_MODE=timeline or OUTPUT_MODE=subtitles "
+                            "and a single target language")
+    record = incremental.load_record(ws.line_record_path)
+    audio_stage, base = ('subtitles', ws.srt_path) if output_mode == 'subtitles' else ('synthesize', ws.track_path)
+    if record is None or not os.path.exists(base):
+        raise PipelineError(f"{ws.job_id} has no finished run to update, run the whole pipeline first")
+
+    with open(ws.src_text, 'r') as f:
+        edited = parse_lines(f.read())
+    changes = incremental.diff(record, edited)
+    ckpt = load_checkpoint(ws)
+    if not changes.changed and not changes.removed and ckpt.done('mux'):
+        logging.info(f"{ws.job_id}: transcript unchanged since the last run")
+        return ckpt.result('mux')
+
+    with tracing.span('incremental', job=ws.job_id, changed=len(changes.changed), removed=changes.removed):
+        translated = []
+        if changes.changed:
+            translated = translate_edited_lines(bucket_name, ws, [edited[i] for i in changes.changed])
+        old_lines = [(timecode, translation) for timecode, _, translation in record]
+        new_lines = incremental.merge(edited, changes.translations, translated)
+        with open(ws.dst_text, 'w') as f:
+            f.write(format_lines(new_lines))
+
+        if output_mode == 'subtitles':
+            subtitles_stage(ws)
+        else:
+            duration = get_media_duration(ws.input_video_path)
+            silence, slots = incremental.slot_changes(old_lines, new_lines, duration)
+            with tracing.span('synthesize_splice', slots=len(slots)):
+                clips = synthesis.render_slots(slots, aws_clients.get_client('polly'), synth_voice,
+                                               synthesis_workers, get_stage_cache())
+                synthesis.splice_track(ws.track_path, clips, silence)
+        output = mux_stage(ws)
+
+    incremental.save_record(ws.line_record_path, ws.src_text, ws.dst_text)
+    index_transcripts(ws, {src_lang: ws.src_text, dst_lang: ws.dst_text})
+    # The outputs match the edited transcript now; a later resumed run keeps them
+    for stage, result in (('translate', ws.dst_text), (audio_stage, base), ('mux', output)):
+        ckpt.complete(stage, result, stage_files(stage, ws, result))
+    logging.info(f"{ws.job_id}: re-ran {len(changes.changed)} edited lines "
+                 f"({changes.removed} removed) into {output}")
+    return output
+
+
+def process_audio_bucket(bucket_name, ws=None):
+    ws = ws or default_workspace
+    with tracing.span('pipeline', job=ws.job_id):
+        return run_stages(bucket_name, ws)
+
+
+def configure_logging():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+if __name__ == "__main__":
+    configure_logging()
+    try:
+        bucket_name = retrieve_audio_bucket()
+        if incremental_mode:
+            rerun_edited(bucket_name)
+        else:
+            process_audio_bucket(bucket_name)
+    except PipelineError as error:
+        logging.error(error)
+        sys.exit(error.exit_code)